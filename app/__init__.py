@@ -64,6 +64,8 @@ def create_app():
     if not _is_flask_migration():
         _register_blueprints(app)
         _register_sms_routes(app)
+        _load_tokenizer(app)
+        _start_llm_warmup(app)
     else:
         app.logger.info("Skipping route registration during migration")
     
@@ -114,6 +116,9 @@ def _configure_app(app):
         'pool_pre_ping': True
     }
     
+    # Redis settings (webhook dedupe, caches)
+    app.config['REDIS_URL'] = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    
     # JWT settings  
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', app.config['SECRET_KEY'])
     
@@ -143,6 +148,9 @@ def _init_extensions(app):
         CORS(app)
         app.logger.info("✅ CORS initialized")
         
+        # Optional - features that use Redis fall back when it is unreachable
+        init_redis(app)
+        
     except Exception as e:
         app.logger.error(f"❌ Extension initialization failed: {e}")
         # Don't raise during migrations - let them complete
@@ -198,6 +206,19 @@ def _register_sms_routes(app):
     except Exception as e:
         app.logger.warning(f"Failed to register SMS routes: {e}")
 
+def _load_tokenizer(app):
+    """Load the LLM model's tokenizer for prompt budgeting; an explicitly set one that fails stops startup"""
+    from app.utils.prompt_builder import load_tokenizer
+    load_tokenizer()
+
+def _start_llm_warmup(app):
+    """Preload the LLM models in the background so the first reply does not pay the load"""
+    try:
+        from app.services.llm_warmup import warm_up_in_background
+        warm_up_in_background()
+    except Exception as e:
+        app.logger.warning(f"LLM warm-up not started: {e}")
+
 # Simple health check for testing
 def health_check():
     """Simple health check for testing app creation"""
@@ -2,11 +2,16 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.user import User
 from app.extensions import db
+from app.services.phone_routing import invalidate_user_routes
+from app.services.response_cache import get_response_cache
 from datetime import datetime
 import json
 
 profile_bp = Blueprint('profile', __name__)
 
+# Profile fields that change how replies are generated
+AI_PROMPT_FIELDS = ('ai_personality', 'ai_instructions', 'ai_model', 'ai_temperature', 'ai_max_tokens')
+
 @profile_bp.route('', methods=['GET'])
 @jwt_required()
 def get_user_profile():
@@ -93,6 +98,12 @@ def update_user_profile():
       
         
         db.session.commit()
+        if 'ai_enabled' in data:
+            # The cached phone route carries the flag; stop (or resume) replies right away
+            invalidate_user_routes(user)
+        if any(field in data for field in AI_PROMPT_FIELDS):
+            # Cached replies were generated with the old AI settings
+            get_response_cache().invalidate_user(user.id)
         
         return jsonify({
             'success': True,
@@ -262,6 +273,12 @@ def update_ai_settings():
         
        
         db.session.commit()
+        if 'enabled' in data:
+            # The cached phone route carries the flag; stop (or resume) replies right away
+            invalidate_user_routes(user)
+        if any(field in data for field in ('personality', 'instructions', 'model', 'temperature', 'max_tokens')):
+            # Cached replies were generated with the old AI settings
+            get_response_cache().invalidate_user(user.id)
         
         return jsonify({
             'success': True,
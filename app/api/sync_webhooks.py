@@ -3,7 +3,8 @@ from datetime import datetime
 import logging
 
 from app.services import get_messaging_service, get_signalwire_service
-from app.models import Message, User
+from app.services.phone_routing import resolve_phone_route
+from app.services.status_buffer import buffer_status_callback
 from app.extensions import db
 
 webhooks_bp = Blueprint('webhooks', __name__)
@@ -70,24 +71,8 @@ def handle_status_webhook():
         if not message_sid or not status:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Update message status in database
-        message = Message.query.filter_by(signalwire_message_sid=message_sid).first()
-        
-        if message:
-            message.signalwire_status = status
-            message.updated_at = datetime.utcnow()
-            
-            if status == 'delivered':
-                message.delivered_at = datetime.utcnow()
-            elif status == 'failed':
-                message.signalwire_error_code = error_code
-                message.signalwire_error_message = error_message
-            
-            db.session.commit()
-            
-            current_app.logger.info(f"Updated message {message_sid} status to {status}")
-        else:
-            current_app.logger.warning(f"Message not found for SID: {message_sid}")
+        # Buffered and applied in bulk by the flush_status_callbacks beat task
+        buffer_status_callback(message_sid, status, error_code, error_message)
         
         return jsonify({'success': True}), 200
         
@@ -111,7 +96,7 @@ def handle_voice_webhook():
         call_status = request.form.get('CallStatus')
         
         # Find user by phone number
-        user = User.query.filter_by(signalwire_phone_number=to_number).first()
+        user = resolve_phone_route(to_number)
         
         if not user:
             # Return busy signal for unknown numbers
@@ -0,0 +1,166 @@
+# app/asgi.py
+"""
+ASGI front end for AssisText
+The SMS webhook, status callback, SMS health and metrics endpoints run as
+native coroutines on the server's event loop; every other request is handed
+to the Flask app through the WSGI bridge, which runs it on a worker thread.
+The native handlers run their blocking SQLAlchemy and Redis work on worker
+threads too (asyncio.to_thread in the SMS service, a background writer for
+metrics), so one slow query only holds up its own request.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app.utils.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+
+logger = logging.getLogger(__name__)
+
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+Response = Tuple[int, str, bytes]
+
+
+class AssisTextASGI:
+    """Routes LLM-bound SMS endpoints to coroutines and everything else to Flask"""
+
+    def __init__(self, flask_app, sms_service=None):
+        from app.services.sms_conversation_service import SMSConversationService
+
+        self.flask_app = flask_app
+        self.sms_service = sms_service or SMSConversationService()
+        self.wsgi_app = WsgiToAsgi(flask_app)
+
+        self.routes: List[Tuple[str, Any, Callable[..., Awaitable[Response]]]] = [
+            ('POST', re.compile(r'^/api/sms/webhook/user/(?P<user_id>\d+)$'), self.sms_webhook),
+            ('POST', re.compile(r'^/api/sms/status/user/(?P<user_id>\d+)$'), self.status_callback),
+            ('GET', re.compile(r'^/api/sms/health$'), self.health),
+            ('GET', re.compile(r'^/api/sms/metrics$'), self.metrics),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        if scope['type'] == 'http':
+            route = self._match(scope['method'], scope['path'])
+            if route:
+                handler, params = route
+                await self._dispatch(handler, params, scope, receive, send)
+                return
+
+        await self.wsgi_app(scope, receive, send)
+
+    # =========================================================================
+    # NATIVE HANDLERS
+    # =========================================================================
+
+    async def sms_webhook(self, data: Dict[str, Any], user_id: str) -> Response:
+        if self.sms_service.webhook_mode == 'queued':
+            result = await self.sms_service.accept_incoming_sms_webhook(data)
+            if result['success']:
+                return 200, 'text/xml', EMPTY_TWIML.encode()
+        else:
+            result = await self.sms_service.handle_incoming_sms_webhook(data)
+            if result.get('duplicate'):
+                return 200, 'text/xml', EMPTY_TWIML.encode()
+
+        return _json_response(result, 200 if result['success'] else 400)
+
+    async def status_callback(self, data: Dict[str, Any], user_id: str) -> Response:
+        result = await self.sms_service.handle_status_callback(data)
+        return _json_response(result, 200 if result['success'] else 400)
+
+    async def health(self, data: Dict[str, Any]) -> Response:
+        health_status = await self.sms_service.health_check()
+        status_code = 200 if health_status['overall_status'] == 'healthy' else 503
+        return _json_response(health_status, status_code)
+
+    async def metrics(self, data: Dict[str, Any]) -> Response:
+        # Reads the shared Redis hash - keep the blocking call off the event loop
+        text = await asyncio.get_running_loop().run_in_executor(None, render_prometheus)
+        return 200, PROMETHEUS_CONTENT_TYPE, text.encode()
+
+    # =========================================================================
+    # PLUMBING
+    # =========================================================================
+
+    def _match(self, method: str, path: str) -> Optional[Tuple[Callable, Dict[str, str]]]:
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match and method == route_method:
+                return handler, match.groupdict()
+        return None
+
+    async def _dispatch(self, handler, params, scope, receive, send) -> None:
+        try:
+            body = await _read_body(receive)
+            data = _parse_body(scope, body)
+
+            # Each ASGI request runs in its own task, so this app context (and
+            # the SQLAlchemy session scoped to it) is private to the request
+            with self.flask_app.app_context():
+                status, content_type, payload = await handler(data, **params)
+
+        except Exception as e:
+            logger.error(f"ASGI handler {handler.__name__} failed: {str(e)}", exc_info=True)
+            status, content_type, payload = _json_response({'success': False, 'error': str(e)}, 500)
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', content_type.encode()),
+                (b'content-length', str(len(payload)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                logger.info("ASGI application startup complete")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.sms_service.cleanup()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _read_body(receive) -> bytes:
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+def _parse_body(scope, body: bytes) -> Dict[str, Any]:
+    headers = dict(scope.get('headers') or [])
+    content_type = headers.get(b'content-type', b'').decode().lower()
+
+    if not body:
+        return {}
+    if 'application/json' in content_type:
+        return json.loads(body) or {}
+    # SignalWire posts webhooks form-encoded
+    return dict(parse_qsl(body.decode(), keep_blank_values=True))
+
+
+def _json_response(data: Dict[str, Any], status: int) -> Response:
+    return status, 'application/json', json.dumps(data, default=str).encode()
+
+
+def create_asgi_app(flask_app) -> AssisTextASGI:
+    """Wrap a Flask app created by create_app() for ASGI servers"""
+    return AssisTextASGI(flask_app)
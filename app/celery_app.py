@@ -54,6 +54,7 @@ celery_config = {
     'include': [
         'app.tasks.email_tasks',
         'app.tasks.trial_tasks', 
+        'app.tasks.sms_tasks',
         'app.tasks.background_tasks'  # Include if available
     ],
     
@@ -66,6 +67,10 @@ celery_config = {
     'task_routes': {
         'app.tasks.email_tasks.*': {'queue': 'email_notifications'},
         'app.tasks.trial_tasks.*': {'queue': 'trial_management'},
+        'app.tasks.sms_tasks.summarize_conversation': {'queue': 'sms_summaries'},
+        'app.tasks.sms_tasks.flush_status_callbacks': {'queue': 'sms_maintenance'},
+        'app.tasks.sms_tasks.keep_llm_warm': {'queue': 'sms_maintenance'},
+        'app.tasks.sms_tasks.*': {'queue': 'sms_replies'},
         'app.tasks.background_tasks.*': {'queue': 'background_processing'},
     },
     
@@ -213,6 +218,13 @@ def worker_ready_handler(sender=None, **kwargs):
     # Register tasks and schedules
     task_registration_success = register_tasks_and_schedules()
     
+    # Load the LLM models before the first reply task needs them
+    try:
+        from app.services.llm_warmup import warm_up_in_background
+        warm_up_in_background()
+    except Exception as e:
+        logger.warning(f"⚠️ LLM warm-up not started: {e}")
+    
     if task_registration_success:
         logger.info("✅ Celery worker fully initialized and ready")
     else:
@@ -326,11 +338,18 @@ if __name__ == '__main__':
     if task_success:
         logger.info("✅ Starting Celery worker with all tasks registered")
         # Start the worker
+        # Convenience worker for development. In production run each sms_replies.N
+        # partition on its own --concurrency=1 worker to keep conversations ordered,
+        # plus one worker for -Q sms_summaries,sms_maintenance
+        from app.tasks.sms_tasks import sms_reply_queues
+        queues = ['default', 'email_notifications', 'trial_management', 'sms_replies',
+                  *sms_reply_queues(), 'sms_summaries', 'sms_maintenance',
+                  'background_processing']
         celery_app.start([
             'worker',
             '--loglevel=info',
             '--concurrency=4',
-            '--queues=default,email_notifications,trial_management,background_processing'
+            f"--queues={','.join(queues)}"
         ])
     else:
         logger.error("❌ Failed to register tasks - starting basic worker")
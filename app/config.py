@@ -36,9 +36,11 @@ class Config:
     OLLAMA_SERVER_URL = os.environ.get('OLLAMA_SERVER_URL', 'http://localhost:11434')
     OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'dolphin-mistral:7b')
     OLLAMA_TIMEOUT = float(os.environ.get('OLLAMA_TIMEOUT', '30.0'))
+    OLLAMA_STREAMING = os.environ.get('OLLAMA_STREAMING', 'false').lower() == 'true'
     
     # Webhook settings
     WEBHOOK_BASE_URL = os.environ.get('WEBHOOK_BASE_URL', 'https://your-app.com')
+    SMS_WEBHOOK_MODE = os.environ.get('SMS_WEBHOOK_MODE', 'inline')  # inline, queued
     
     # Stripe settings
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
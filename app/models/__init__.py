@@ -52,6 +52,10 @@ class User(db.Model):
     signalwire_phone_number = db.Column(db.String(20))
     signalwire_phone_number_sid = db.Column(db.String(100))
     
+    # AI Settings
+    ai_enabled = db.Column(db.Boolean, default=True)  # auto-reply to inbound SMS
+    llm_cache_enabled = db.Column(db.Boolean, default=True)  # reuse replies to repeated short messages
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -64,6 +68,7 @@ class User(db.Model):
     messages = db.relationship('Message', back_populates='user', lazy='dynamic')
     usage_records = db.relationship('UsageRecord', back_populates='user', lazy='dynamic')
     payment_methods = db.relationship('PaymentMethod', back_populates='user', lazy='dynamic')
+    message_templates = db.relationship('MessageTemplate', back_populates='user', lazy='dynamic')
     
     def __init__(self, username, email, password, **kwargs):
         self.username = username
@@ -361,6 +366,11 @@ class Client(db.Model):
     ai_personality = db.Column(db.String(50), default='professional')
     custom_ai_prompt = db.Column(db.Text)
     
+    # Rolling conversation summary (app.services.conversation_summary)
+    conversation_summary = db.Column(db.Text)
+    summary_message_count = db.Column(db.Integer, default=0)  # oldest N messages the summary covers
+    summary_updated_at = db.Column(db.DateTime)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -393,7 +403,9 @@ class Client(db.Model):
                 'total_messages': self.total_messages,
                 'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
                 'last_message_preview': self.last_message_preview,
-                'unread_count': self.unread_count
+                'unread_count': self.unread_count,
+                'conversation_summary': self.conversation_summary,
+                'summary_updated_at': self.summary_updated_at.isoformat() if self.summary_updated_at else None
             })
         
         return data
@@ -424,6 +436,11 @@ class Message(db.Model):
     ai_confidence_score = db.Column(db.Float)
     human_reviewed = db.Column(db.Boolean, default=False)
     
+    # Analytics
+    intent_category = db.Column(db.String(50))  # set by app.services.intent_classifier
+    processing_time = db.Column(db.Float)  # seconds from generation start to reply text
+    message_metadata = db.Column(JSONB, default={})  # reply source, LLM tier/host and timings
+    
     # SignalWire Integration
     signalwire_message_sid = db.Column(db.String(100), unique=True)
     signalwire_status = db.Column(db.String(20))  # queued, sending, sent, delivered, failed
@@ -463,6 +480,7 @@ class Message(db.Model):
             'ai_generated': self.ai_generated,
             'signalwire_status': self.signalwire_status,
             'media_count': self.media_count,
+            'intent_category': self.intent_category,
             'created_at': self.created_at.isoformat(),
             'sent_at': self.sent_at.isoformat() if self.sent_at else None,
             'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None
@@ -472,11 +490,63 @@ class Message(db.Model):
             data.update({
                 'ai_model': self.ai_model,
                 'ai_confidence_score': self.ai_confidence_score,
-                'human_reviewed': self.human_reviewed
+                'human_reviewed': self.human_reviewed,
+                'processing_time': self.processing_time,
+                'message_metadata': self.message_metadata
             })
         
         return data
 
+class MessageTemplate(db.Model):
+    """Message templates for quick responses"""
+    __tablename__ = 'message_templates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Template Details
+    name = db.Column(db.String(100), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    description = db.Column(db.Text)
+    category = db.Column(db.String(50))  # intent it answers automatically: greeting, acknowledgement, help
+    
+    # Usage
+    usage_count = db.Column(db.Integer, default=0)
+    last_used_at = db.Column(db.DateTime)
+    
+    # Status
+    is_active = db.Column(db.Boolean, default=True)
+    is_default = db.Column(db.Boolean, default=False)
+    
+    # Variables/Placeholders
+    variables = db.Column(JSONB)  # {name: description} for template variables
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User', back_populates='message_templates')
+    
+    __table_args__ = (
+        Index('ix_message_templates_user_category', 'user_id', 'category'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'content': self.content,
+            'description': self.description,
+            'category': self.category,
+            'usage_count': self.usage_count,
+            'is_active': self.is_active,
+            'is_default': self.is_default,
+            'variables': self.variables or {},
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None
+        }
+
 # =============================================================================
 # USAGE TRACKING MODELS
 # =============================================================================
@@ -15,6 +15,53 @@ from app.models import (
 )
 
 
+# Per-unit prices for metered usage
+UNIT_COSTS = {
+    'sms_sent': 0.01,    # $0.01 per SMS
+    'sms_received': 0.005,  # $0.005 per received SMS
+    'ai_response': 0.02   # $0.02 per AI response
+}
+
+
+def build_usage_record(user_id: int, metric_type: str, quantity: int = 1,
+                       resource_id: str = None, resource_type: str = None,
+                       subscription: Optional[Subscription] = None) -> UsageRecord:
+    """
+    Build (but do not add) a usage record for the subscription's billing period
+    Falls back to the calendar month when there is no active period
+    """
+    now = datetime.utcnow()
+    if subscription and subscription.current_period_start:
+        billing_start = subscription.current_period_start
+        billing_end = subscription.current_period_end
+    else:
+        # Default to monthly period
+        billing_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if billing_start.month == 12:
+            billing_end = billing_start.replace(year=billing_start.year + 1, month=1)
+        else:
+            billing_end = billing_start.replace(month=billing_start.month + 1)
+    
+    usage_record = UsageRecord(
+        user_id=user_id,
+        subscription_id=subscription.id if subscription else None,
+        metric_type=metric_type,
+        quantity=quantity,
+        resource_id=resource_id,
+        resource_type=resource_type,
+        billing_period_start=billing_start,
+        billing_period_end=billing_end
+    )
+    
+    # Calculate cost based on metric type (if applicable)
+    unit_cost = UNIT_COSTS.get(metric_type)
+    if unit_cost:
+        usage_record.unit_cost = Decimal(str(unit_cost))
+        usage_record.total_cost = Decimal(str(unit_cost)) * quantity
+    
+    return usage_record
+
+
 class StripeConfig:
     """Stripe configuration management"""
     
@@ -440,9 +487,11 @@ class BillingService:
     # =============================================================================
     
     def track_usage(self, user_id: int, metric_type: str, quantity: int = 1, 
-                   resource_id: str = None, resource_type: str = None) -> Dict[str, Any]:
+                   resource_id: str = None, resource_type: str = None,
+                   commit: bool = True) -> Dict[str, Any]:
         """
         Track usage for billing purposes
+        With commit=False the record joins the caller's transaction instead
         """
         try:
             user = User.query.get(user_id)
@@ -451,39 +500,16 @@ class BillingService:
             
             subscription = Subscription.query.filter_by(user_id=user_id).first()
             
-            # Calculate billing period
-            now = datetime.utcnow()
-            if subscription and subscription.current_period_start:
-                billing_start = subscription.current_period_start
-                billing_end = subscription.current_period_end
-            else:
-                # Default to monthly period
-                billing_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                if billing_start.month == 12:
-                    billing_end = billing_start.replace(year=billing_start.year + 1, month=1)
-                else:
-                    billing_end = billing_start.replace(month=billing_start.month + 1)
-            
-            # Create usage record
-            usage_record = UsageRecord(
-                user_id=user_id,
-                subscription_id=subscription.id if subscription else None,
-                metric_type=metric_type,
-                quantity=quantity,
+            usage_record = build_usage_record(
+                user_id, metric_type, quantity,
                 resource_id=resource_id,
                 resource_type=resource_type,
-                billing_period_start=billing_start,
-                billing_period_end=billing_end
+                subscription=subscription
             )
             
-            # Calculate cost based on metric type (if applicable)
-            unit_cost = self._get_unit_cost(metric_type)
-            if unit_cost:
-                usage_record.unit_cost = Decimal(str(unit_cost))
-                usage_record.total_cost = Decimal(str(unit_cost)) * quantity
-            
             db.session.add(usage_record)
-            db.session.commit()
+            if commit:
+                db.session.commit()
             
             return {
                 'success': True,
@@ -491,7 +517,8 @@ class BillingService:
             }
             
         except Exception as e:
-            db.session.rollback()
+            if commit:
+                db.session.rollback()
             self.logger.error(f"Track usage error: {str(e)}")
             return {'success': False, 'error': 'Failed to track usage'}
     
@@ -705,12 +732,7 @@ class BillingService:
     
     def _get_unit_cost(self, metric_type: str) -> Optional[float]:
         """Get unit cost for metric type"""
-        costs = {
-            'sms_sent': 0.01,    # $0.01 per SMS
-            'sms_received': 0.005,  # $0.005 per received SMS
-            'ai_response': 0.02   # $0.02 per AI response
-        }
-        return costs.get(metric_type)
+        return UNIT_COSTS.get(metric_type)
     
     def _get_current_period_usage(self, user_id: int, subscription: Subscription) -> Dict[str, int]:
         """Get usage for current billing period"""
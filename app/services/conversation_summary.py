@@ -0,0 +1,143 @@
+# app/services/conversation_summary.py
+"""
+Rolling conversation summaries
+Long client threads get a compact running summary so the reply prompt can
+carry "summary + recent turns" instead of an ever-growing history. Every
+CONVERSATION_SUMMARY_EVERY messages a low-priority Celery task folds the
+messages since the last update into the summary, leaving the newest
+CONVERSATION_SUMMARY_KEEP_RECENT out - the prompt sends those verbatim.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.extensions import db, get_redis
+from app.utils.llm_client import LLMError, get_llm_client
+from app.utils.prompt_builder import get_prompt_builder
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PENDING_KEY_PREFIX = 'summary:pending:'
+
+SUMMARY_EVERY = int(os.getenv('CONVERSATION_SUMMARY_EVERY', '20'))
+SUMMARY_KEEP_RECENT = int(os.getenv('CONVERSATION_SUMMARY_KEEP_RECENT', '6'))
+
+
+def summaries_enabled() -> bool:
+    return SUMMARY_EVERY > 0
+
+
+def summary_due(total_messages: Optional[int], summary_message_count: Optional[int]) -> bool:
+    """True once CONVERSATION_SUMMARY_EVERY messages older than the recent window are unsummarized"""
+    if not summaries_enabled():
+        return False
+    unsummarized = (total_messages or 0) - (summary_message_count or 0) - SUMMARY_KEEP_RECENT
+    return unsummarized >= SUMMARY_EVERY
+
+
+def schedule_summary(client_id: int) -> bool:
+    """Queue a summary update for a client unless one is already pending"""
+    redis_client = get_redis()
+    try:
+        if redis_client is not None and not redis_client.set(
+                f"{SUMMARY_PENDING_KEY_PREFIX}{client_id}", 1, nx=True, ex=600):
+            return False
+
+        from app.tasks.sms_tasks import summarize_conversation, SMS_SUMMARY_QUEUE
+        summarize_conversation.apply_async(args=[client_id], queue=SMS_SUMMARY_QUEUE)
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to schedule summary for client {client_id}: {e}")
+        return False
+
+
+def clear_summary_pending(client_id: int) -> None:
+    redis_client = get_redis()
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(f"{SUMMARY_PENDING_KEY_PREFIX}{client_id}")
+    except Exception as e:
+        logger.debug(f"Failed to clear pending summary flag for client {client_id}: {e}")
+
+
+class ConversationSummaryService:
+    """Folds older messages of a client conversation into its running summary"""
+
+    def __init__(self):
+        self.llm = get_llm_client()
+        # The summary is background work - the fallback model is cheaper if there is one
+        self.model = (os.getenv('CONVERSATION_SUMMARY_MODEL') or self.llm.config.fallback_model
+                      or self.llm.model)
+        self.max_tokens = int(os.getenv('CONVERSATION_SUMMARY_MAX_TOKENS', '200'))
+        # Bounds one update's prompt when a thread has a large unsummarized backlog
+        self.max_batch = int(os.getenv('CONVERSATION_SUMMARY_MAX_BATCH', str(max(SUMMARY_EVERY, 1) * 3)))
+        self.logger = logging.getLogger(__name__)
+
+    def update_summary(self, client_id: int) -> Dict[str, Any]:
+        from app.models import Client, Message
+
+        client = Client.query.get(client_id)
+        if not client:
+            return {'success': False, 'error': 'Client not found'}
+
+        covered = client.summary_message_count or 0
+        total = Message.query.filter_by(client_id=client_id).count()
+        end = total - SUMMARY_KEEP_RECENT
+        if end - covered < SUMMARY_EVERY:
+            return {'success': True, 'updated': False}
+
+        messages = Message.query.filter_by(client_id=client_id)\
+            .order_by(Message.created_at, Message.id)\
+            .offset(covered)\
+            .limit(min(end - covered, self.max_batch))\
+            .all()
+
+        prompt = self._build_summary_prompt(client.conversation_summary, messages)
+        try:
+            result = self.llm.generate(prompt, model=self.model, options={
+                "temperature": 0.2,
+                "num_predict": self.max_tokens
+            })
+        except LLMError as e:
+            self.logger.error(f"Summary generation failed for client {client_id}: {e}")
+            return {'success': False, 'error': str(e)}
+
+        summary = (result.get('response') or '').strip()
+        if not summary:
+            return {'success': False, 'error': 'Empty summary'}
+
+        # Only apply if no other worker moved the summary on meanwhile
+        if client.summary_message_count is None:
+            unchanged = Client.summary_message_count.is_(None)
+        else:
+            unchanged = Client.summary_message_count == client.summary_message_count
+        updated = Client.query.filter(Client.id == client_id, unchanged)\
+            .update({
+                'conversation_summary': summary,
+                'summary_message_count': covered + len(messages),
+                'summary_updated_at': datetime.utcnow()
+            }, synchronize_session=False)
+        db.session.commit()
+
+        self.logger.info(f"📝 Summarized {len(messages)} messages for client {client_id}")
+        return {'success': True, 'updated': bool(updated), 'summarized': len(messages),
+                'remaining': max(0, end - covered - len(messages))}
+
+    def _build_summary_prompt(self, previous: Optional[str], messages: List[Any]) -> str:
+        builder = get_prompt_builder()
+        lines = []
+        for msg in messages:
+            speaker = 'Customer' if msg.direction == 'inbound' else 'Business'
+            lines.append(f"{speaker}: {builder.fit_message(msg.body or '')}")
+
+        return f"""Maintain a running summary of an SMS conversation between a business and a customer.
+
+{f"Summary so far:{chr(10)}{previous}{chr(10)}{chr(10)}" if previous else ""}New messages:
+{chr(10).join(lines)}
+
+Write the updated summary in at most 5 short sentences. Keep names, dates, appointments, prices, open questions and anything promised. Leave out greetings and small talk.
+
+Updated summary:"""
@@ -0,0 +1,215 @@
+# app/services/intent_classifier.py
+"""
+Fast-path intent classification for inbound SMS
+Runs before the LLM and decides how a message is answered:
+
+  template  reply with the user's MessageTemplate for the intent
+  suppress  send nothing (carrier keywords, bare acknowledgements)
+  llm       generate a reply as usual
+
+Carrier keywords (STOP, HELP, START...) are matched exactly. Short
+greetings and acknowledgements are recognised by nearest-neighbour cosine
+similarity over hashed n-grams of the examples below; anything longer, anything
+with a question mark and anything the model is unsure about goes to the LLM.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+# Carrier-reserved keywords - the carrier/SignalWire handles the compliance reply
+KEYWORD_INTENTS = {
+    'opt_out': {'stop', 'stopall', 'unsubscribe', 'cancel', 'end', 'quit', 'optout', 'revoke'},
+    'opt_in': {'start', 'unstop', 'subscribe', 'optin'},
+    'help': {'help', 'info'},
+}
+
+INTENT_EXAMPLES = {
+    'acknowledgement': [
+        'ok', 'okay', 'k', 'kk', 'ok thanks', 'ok thank you', 'thanks', 'thank you', 'thank you so much',
+        'thx', 'ty', 'tysm', 'got it', 'got it thanks', 'sounds good', 'perfect', 'great', 'great thanks',
+        'cool', 'awesome', 'will do', 'noted', 'appreciate it', 'sure thing', 'alright', 'all good',
+    ],
+    'greeting': [
+        'hi', 'hello', 'hey', 'hey there', 'hi there', 'hello there', 'good morning', 'good afternoon',
+        'good evening', 'morning', 'hiya', 'howdy', 'yo', 'greetings', 'hi how are you', 'hello how are you',
+    ],
+}
+
+# What each intent does when the user has no template for it
+DEFAULT_ROUTES = {
+    'opt_out': 'suppress',
+    'opt_in': 'suppress',
+    'help': 'llm',
+    'acknowledgement': 'suppress',
+    'greeting': 'llm',
+    'question': 'llm',
+    'other': 'llm',
+}
+
+# Template categories read per user: the intents above, plus the reply sent while the LLM is down
+TEMPLATE_CATEGORIES = list(DEFAULT_ROUTES) + ['fallback']
+
+FEATURE_BUCKETS = 1 << 18
+_WORD = re.compile(r'[a-z0-9]+')
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+@dataclass
+class IntentResult:
+    intent: str
+    confidence: float
+    method: str  # keyword, model, rule
+
+
+@dataclass
+class IntentDecision:
+    intent: str
+    route: str  # template, suppress, llm
+    confidence: float
+    template_id: Optional[int] = None
+    reply: Optional[str] = None
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ' '.join(_WORD.findall(text))
+
+
+def _features(normalized: str) -> Dict[int, float]:
+    """Hashed word unigrams/bigrams and character trigrams, L2-normalized"""
+    words = normalized.split()
+    grams = list(words) + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {normalized} "
+    grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    vector: Dict[int, float] = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode()) % FEATURE_BUCKETS
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+
+def _cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class IntentClassifier:
+    """Keyword rules plus a nearest-neighbour model over hashed n-grams"""
+
+    def __init__(self):
+        self.enabled = os.getenv('INTENT_FAST_PATH_ENABLED', 'true').lower() == 'true'
+        self.min_similarity = float(os.getenv('INTENT_MIN_SIMILARITY', '0.6'))
+        # Longer texts carry real content even when they start with "thanks"
+        self.max_chars = int(os.getenv('INTENT_MAX_CHARS', '40'))
+        # Template edits are picked up when a user's cached set expires
+        self.template_ttl = float(os.getenv('INTENT_TEMPLATE_CACHE_SECONDS', '60'))
+
+        self.examples = [(intent, _features(_normalize(example)))
+                         for intent, examples in INTENT_EXAMPLES.items() for example in examples]
+        self._templates: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def classify(self, text: str) -> IntentResult:
+        normalized = _normalize(text)
+        if not normalized:
+            return IntentResult('other', 0.0, 'rule')
+
+        for intent, keywords in KEYWORD_INTENTS.items():
+            if normalized in keywords:
+                return IntentResult(intent, 1.0, 'keyword')
+
+        if '?' in (text or '') or len(normalized) > self.max_chars:
+            return IntentResult('question' if '?' in (text or '') else 'other', 0.0, 'rule')
+
+        vector = _features(normalized)
+        best_intent, best_score = 'other', 0.0
+        for intent, example in self.examples:
+            score = _cosine(vector, example)
+            if score > best_score:
+                best_intent, best_score = intent, score
+
+        if best_score < self.min_similarity:
+            return IntentResult('other', best_score, 'model')
+        return IntentResult(best_intent, best_score, 'model')
+
+    def decide(self, text: str, user: Any) -> IntentDecision:
+        """Classify a message and pick how to answer it for this user"""
+        result = self.classify(text)
+        if not self.enabled:
+            decision = IntentDecision(result.intent, 'llm', result.confidence)
+        else:
+            template = self._template_for(user.id, result.intent) if result.intent not in ('question', 'other') else None
+            if template:
+                decision = IntentDecision(result.intent, 'template', result.confidence,
+                                          template_id=template['id'], reply=self._render(template, user))
+            else:
+                decision = IntentDecision(result.intent, DEFAULT_ROUTES.get(result.intent, 'llm'), result.confidence)
+
+        incr('intent_routes_total', labels={'intent': decision.intent, 'route': decision.route})
+        return decision
+
+    def template_reply(self, user: Any, category: str) -> Optional[str]:
+        """The user's rendered template for a category, if they have one"""
+        template = self._template_for(user.id, category)
+        return self._render(template, user) if template else None
+
+    def _template_for(self, user_id: int, intent: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cached = self._templates.get(user_id)
+        if cached is None or cached[0] <= time.monotonic():
+            templates = self._load_templates(user_id)
+            with self._lock:
+                self._templates[user_id] = (time.monotonic() + self.template_ttl, templates)
+        else:
+            templates = cached[1]
+        return templates.get(intent)
+
+    def _load_templates(self, user_id: int) -> Dict[str, Dict[str, Any]]:
+        """Active templates by category; the default one wins when a category has several"""
+        from app.models import MessageTemplate
+
+        rows = MessageTemplate.query.filter(
+            MessageTemplate.user_id == user_id,
+            MessageTemplate.is_active.is_(True),
+            MessageTemplate.category.in_(TEMPLATE_CATEGORIES)
+        ).order_by(MessageTemplate.is_default.desc(), MessageTemplate.id).all()
+
+        templates: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            templates.setdefault(row.category, {'id': row.id, 'content': row.content})
+        return templates
+
+    @staticmethod
+    def _render(template: Dict[str, Any], user: Any) -> str:
+        values = {
+            'first_name': getattr(user, 'first_name', None) or '',
+            'username': getattr(user, 'username', None) or '',
+        }
+        # Only plain {name} placeholders are filled (unknown ones render empty); anything else
+        # in a user-written template - literal braces, {first_name.title}, {first_name[0]} -
+        # is sent as written. str.format would raise on or evaluate those
+        return _PLACEHOLDER.sub(lambda m: values.get(m.group(1), ''), template['content']).strip()
+
+
+# Per-process classifier
+_classifier = IntentClassifier()
+
+
+def get_intent_classifier() -> IntentClassifier:
+    return _classifier
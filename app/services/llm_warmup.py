@@ -0,0 +1,156 @@
+# app/services/llm_warmup.py
+"""
+LLM model warm-up and keep-alive
+Ollama unloads a model after its keep_alive expires (5 minutes by default),
+and the next request pays a multi-second cold load. Workers preload the
+configured models on every host when they start, and a beat task pings them
+with an explicit keep_alive during business hours so the first customer of
+the morning does not wait for the load. Outside business hours the models
+are left to unload.
+
+Loads found on real requests are counted as llm_cold_loads_total with
+trigger="request"; the ones warm-up and keep-alive absorb have
+trigger="warmup" / "keepalive".
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from app.extensions import get_redis
+from app.utils.llm_client import COLD_LOAD_SECONDS, get_llm_client
+from app.utils.metrics import incr
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+logger = logging.getLogger(__name__)
+
+WARMUP_LOCK_PREFIX = 'llm:warmup:'
+
+KEEP_ALIVE = os.getenv('LLM_KEEP_ALIVE', '15m')
+KEEPALIVE_INTERVAL = float(os.getenv('LLM_KEEPALIVE_INTERVAL', '240'))  # seconds, under the default 5m expiry
+
+
+def _parse_range(spec: str) -> Optional[Set[int]]:
+    """'7-21' -> {7..20}, '0-4,6' -> {0,1,2,3,4,6}; empty means no restriction"""
+    if not spec.strip():
+        return None
+    values: Set[int] = set()
+    for part in spec.split(','):
+        if '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+            values.update(range(start, end))
+        else:
+            values.add(int(part))
+    return values
+
+
+def warmup_models() -> List[str]:
+    """The primary and fallback models, plus any listed in LLM_WARMUP_MODELS"""
+    config = get_llm_client().config
+    models = [config.model]
+    if config.fallback_model:
+        models.append(config.fallback_model)
+    models += [m.strip() for m in os.getenv('LLM_WARMUP_MODELS', '').split(',') if m.strip()]
+    return list(dict.fromkeys(models))
+
+
+class LLMWarmupService:
+    """Preloads models on every LLM host and keeps them resident during business hours"""
+
+    def __init__(self):
+        self.llm = get_llm_client()
+        self.keep_alive = KEEP_ALIVE
+        self.timeout = float(os.getenv('LLM_WARMUP_TIMEOUT', '120'))  # a cold 7B load can take a while
+        # Hours are end-exclusive ('7-21' pings from 07:00 to 20:59); days are Monday=0
+        self.hours = _parse_range(os.getenv('LLM_KEEPALIVE_HOURS', '7-21'))
+        self.days = _parse_range(os.getenv('LLM_KEEPALIVE_DAYS', '0-7'))
+        self.timezone = os.getenv('LLM_KEEPALIVE_TIMEZONE', 'UTC')
+        self.logger = logging.getLogger(__name__)
+
+    def in_business_hours(self, now: Optional[datetime] = None) -> bool:
+        if now is None:
+            tz = None
+            if ZoneInfo is not None:
+                try:
+                    tz = ZoneInfo(self.timezone)
+                except Exception:
+                    self.logger.warning(f"Unknown LLM_KEEPALIVE_TIMEZONE {self.timezone}, using UTC")
+            now = datetime.now(tz) if tz else datetime.utcnow()
+        if self.days is not None and now.weekday() not in self.days:
+            return False
+        return self.hours is None or now.hour in self.hours
+
+    def warm_up(self, trigger: str = 'warmup') -> Dict[str, Any]:
+        """Load every warm-up model on every host that serves it"""
+        results = []
+        for backend in self.llm.router.backends:
+            for model in warmup_models():
+                if not backend.has_model(model):
+                    continue
+                if not self._claim(backend.url, model):
+                    # Another worker pinged this host/model moments ago
+                    continue
+                results.append(self._load(backend.url, model, trigger))
+
+        loaded = [r for r in results if r['success']]
+        cold = [r for r in loaded if r['cold']]
+        if results:
+            self.logger.info(f"🔥 LLM {trigger}: {len(loaded)}/{len(results)} model loads ok, {len(cold)} cold")
+        return {'success': len(loaded) == len(results), 'results': results}
+
+    def keep_alive_tick(self) -> Dict[str, Any]:
+        """Beat task body: ping during business hours, let models unload otherwise"""
+        if not self.in_business_hours():
+            return {'success': True, 'skipped': 'outside business hours'}
+        return self.warm_up(trigger='keepalive')
+
+    def _load(self, host: str, model: str, trigger: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            result = self.llm.preload(model, host, keep_alive=self.keep_alive, timeout=self.timeout)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Failed to load {model} on {host}: {e}")
+            return {'success': False, 'host': host, 'model': model, 'error': str(e)}
+
+        # An empty-prompt load may not report load_duration; the wall time is then the load
+        seconds = result.get('load_duration', 0) / 1e9 or (time.monotonic() - started)
+        cold = seconds >= COLD_LOAD_SECONDS
+        if cold:
+            incr('llm_cold_loads_total', labels={'model': model, 'host': host, 'trigger': trigger})
+            self.logger.info(f"Loaded {model} on {host} in {seconds:.1f}s ({trigger})")
+        return {'success': True, 'host': host, 'model': model, 'cold': cold, 'seconds': round(seconds, 2)}
+
+    def _claim(self, host: str, model: str) -> bool:
+        """One ping per host/model per half interval across all workers"""
+        redis_client = get_redis()
+        if redis_client is None:
+            return True
+        try:
+            return bool(redis_client.set(f"{WARMUP_LOCK_PREFIX}{host}:{model}", 1, nx=True,
+                                         ex=max(1, int(KEEPALIVE_INTERVAL / 2))))
+        except Exception as e:
+            self.logger.debug(f"Warm-up lock unavailable, pinging anyway: {e}")
+            return True
+
+
+def warm_up_in_background(trigger: str = 'warmup') -> Optional[threading.Thread]:
+    """Start a warm-up without holding up process startup; LLM_WARMUP_ON_STARTUP=false disables"""
+    if os.getenv('LLM_WARMUP_ON_STARTUP', 'true').lower() != 'true':
+        return None
+
+    def run():
+        try:
+            LLMWarmupService().warm_up(trigger)
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name='llm-warmup', daemon=True)
+    thread.start()
+    return thread
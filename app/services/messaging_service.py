@@ -1,13 +1,17 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from sqlalchemy import desc, func
+from sqlalchemy.exc import IntegrityError
 from flask import current_app
 
 from app.extensions import db
 from app.models import User, Client, Message
 from app.services.signalwire_service import SignalWireService
 from app.services.usage_service import UsageService
-from app.utils.ai_client import get_ai_response
+from app.utils.llm_client import get_ai_response
+from app.utils.idempotency import claim_message_sid, release_message_sid, message_sid_exists
+from app.services.phone_routing import resolve_phone_route
+from app.services.conversation_summary import SUMMARY_KEEP_RECENT, summary_due, schedule_summary
 
 
 class MessagingService:
@@ -22,23 +26,29 @@ class MessagingService:
         """
         Process incoming SMS from SignalWire webhook
         """
+        message_sid = webhook_data.get('MessageSid')
+        if not claim_message_sid(message_sid):
+            self.logger.info(f"Duplicate webhook for {message_sid}, already processed")
+            return {'success': True, 'duplicate': True}
+        
         try:
             # Extract webhook data
-            message_sid = webhook_data.get('MessageSid')
             from_number = webhook_data.get('From')
             to_number = webhook_data.get('To')
             body = webhook_data.get('Body', '').strip()
             
-            # Find user by phone number
-            user = User.query.filter_by(signalwire_phone_number=to_number).first()
+            # Find user by phone number (cached route, no DB hit when warm)
+            user = resolve_phone_route(to_number)
             if not user:
                 self.logger.warning(f"No user found for phone number: {to_number}")
+                # Let a retry through once the number is provisioned
+                release_message_sid(message_sid)
                 return {'success': False, 'error': 'No user found for this number'}
             
             # Find or create client
             client = self._get_or_create_client(user.id, from_number)
             
-            # Store incoming message
+            # Store incoming message - everything below commits as one transaction
             message = Message(
                 user_id=user.id,
                 client_id=client.id,
@@ -71,7 +81,7 @@ class MessagingService:
             
             # Generate AI response if enabled
             ai_response = None
-            if client.ai_enabled and body:
+            if user.ai_enabled and client.ai_enabled and body:
                 ai_response = self._generate_ai_response(user, client, body)
                 
                 if ai_response:
@@ -82,7 +92,8 @@ class MessagingService:
                         content=ai_response['content'],
                         ai_generated=True,
                         ai_model=ai_response.get('model'),
-                        ai_confidence=ai_response.get('confidence')
+                        ai_confidence=ai_response.get('confidence'),
+                        commit=False
                     )
                     
                     if response_result['success']:
@@ -90,21 +101,38 @@ class MessagingService:
             
             db.session.commit()
             
+            if summary_due(client.total_messages, client.summary_message_count):
+                schedule_summary(client.id)
+            
             return {
                 'success': True,
                 'message_id': message.id,
                 'ai_response_sent': ai_response is not None
             }
             
+        except IntegrityError as e:
+            db.session.rollback()
+            
+            # Unique signalwire_message_sid - a concurrent retry stored it first
+            if message_sid and message_sid_exists(message_sid):
+                self.logger.info(f"Duplicate webhook for {message_sid}, already stored")
+                return {'success': True, 'duplicate': True}
+            
+            release_message_sid(message_sid)
+            self.logger.error(f"Incoming SMS integrity error: {str(e)}")
+            return {'success': False, 'error': 'Failed to process incoming SMS'}
+            
         except Exception as e:
             db.session.rollback()
+            release_message_sid(message_sid)
             self.logger.error(f"Incoming SMS processing error: {str(e)}")
             return {'success': False, 'error': 'Failed to process incoming SMS'}
     
     def send_message(self, user_id: int, recipient_number: str, content: str, 
-                    ai_generated: bool = False, **kwargs) -> Dict[str, Any]:
+                    ai_generated: bool = False, commit: bool = True, **kwargs) -> Dict[str, Any]:
         """
         Send SMS message via SignalWire
+        With commit=False the outbound message joins the caller's transaction
         """
         try:
             user = User.query.get(user_id)
@@ -148,6 +176,7 @@ class MessagingService:
             )
             
             db.session.add(message)
+            db.session.flush()
             
             # Update client stats
             client.total_messages += 1
@@ -172,7 +201,8 @@ class MessagingService:
                     resource_type='ai_response'
                 )
             
-            db.session.commit()
+            if commit:
+                db.session.commit()
             
             return {
                 'success': True,
@@ -181,7 +211,8 @@ class MessagingService:
             }
             
         except Exception as e:
-            db.session.rollback()
+            if commit:
+                db.session.rollback()
             self.logger.error(f"Send message error: {str(e)}")
             return {'success': False, 'error': 'Failed to send message'}
     
@@ -299,10 +330,15 @@ class MessagingService:
     def _generate_ai_response(self, user: User, client: Client, message_body: str) -> Optional[Dict[str, Any]]:
         """Generate AI response for incoming message"""
         try:
-            # Get conversation context (last 5 messages)
+            # Get conversation context - get_ai_response trims it to the prompt token budget.
+            # Turns covered by the rolling summary are not read again
+            history_limit = 20
+            if client.conversation_summary:
+                unsummarized = (client.total_messages or 0) - (client.summary_message_count or 0)
+                history_limit = min(history_limit, max(unsummarized, SUMMARY_KEEP_RECENT))
             context_messages = Message.query.filter_by(client_id=client.id)\
                 .order_by(desc(Message.created_at))\
-                .limit(5)\
+                .limit(history_limit)\
                 .all()
             
             context = []
@@ -323,7 +359,10 @@ class MessagingService:
             ai_response = get_ai_response(
                 messages=context,
                 personality=client.ai_personality,
-                custom_prompt=client.custom_ai_prompt
+                custom_prompt=client.custom_ai_prompt,
+                user_id=user.id,
+                cache_enabled=user.llm_cache_enabled is not False,
+                summary=client.conversation_summary
             )
             
             return ai_response
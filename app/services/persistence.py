@@ -0,0 +1,334 @@
+# app/services/persistence.py
+"""
+Conversation turn persistence
+A turn writes a message row, bumps the client's conversation counters and
+records billable usage. UnitOfWork collects those writes and commits them in
+one transaction; WriteBehindBuffer group-commits the units of concurrent
+turns so a burst of replies shares one transaction and multi-row INSERTs.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClientDelta:
+    """Counter changes for one (user, phone number) client"""
+    user_id: int
+    phone_number: str
+    messages: int = 0
+    unread: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
+
+
+class PendingMessage:
+    """A message row waiting for its unit of work to be applied"""
+
+    def __init__(self, client_phone: str, fields: Dict[str, Any]):
+        self.client_phone = client_phone
+        self.fields = fields
+        self.instance = None
+
+    @property
+    def id(self) -> Optional[int]:
+        return self.instance.id if self.instance is not None else None
+
+
+@dataclass
+class UsageEntry:
+    user_id: int
+    metric_type: str
+    quantity: int = 1
+    resource_type: str = 'message'
+    message: Optional[PendingMessage] = None
+
+
+class UnitOfWork:
+    """Collects the writes of one conversation turn and commits them together"""
+
+    def __init__(self):
+        self.messages: List[PendingMessage] = []
+        self.client_deltas: Dict[Tuple[int, str], ClientDelta] = {}
+        self.usage: List[UsageEntry] = []
+
+    def add_message(self, client_phone: str, **fields) -> PendingMessage:
+        """
+        Queue a Message row and the matching client counter update
+        client_phone is the other party's number; client_id is filled in on apply
+        """
+        pending = PendingMessage(client_phone, fields)
+        self.messages.append(pending)
+
+        body = fields.get('body') or ''
+        self.bump_client(
+            fields['user_id'], client_phone,
+            messages=1,
+            unread=1 if fields.get('direction') == 'inbound' else 0,
+            last_message_at=fields.get('created_at') or datetime.utcnow(),
+            last_message_preview=body[:200]
+        )
+        return pending
+
+    def bump_client(self, user_id: int, phone_number: str, messages: int = 0, unread: int = 0,
+                    last_message_at: datetime = None, last_message_preview: str = None) -> None:
+        key = (user_id, phone_number)
+        delta = self.client_deltas.setdefault(key, ClientDelta(user_id, phone_number))
+        delta.messages += messages
+        delta.unread += unread
+        if last_message_at and (delta.last_message_at is None or last_message_at >= delta.last_message_at):
+            delta.last_message_at = last_message_at
+            delta.last_message_preview = last_message_preview
+
+    def track_usage(self, user_id: int, metric_type: str, quantity: int = 1,
+                    message: PendingMessage = None, resource_type: str = 'message') -> None:
+        self.usage.append(UsageEntry(user_id, metric_type, quantity, resource_type, message))
+
+    def commit(self) -> List[Any]:
+        """Apply and commit this unit in the current session; returns the Message instances"""
+        try:
+            summaries_due = apply_units([self])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        _schedule_summaries(summaries_due)
+        return [pending.instance for pending in self.messages]
+
+
+def apply_units(units: List[UnitOfWork]) -> Set[int]:
+    """
+    Stage the writes of several units in the current transaction
+    Client upserts run in key order so concurrent batches cannot deadlock.
+    Returns the IDs of clients whose conversation summary is due; schedule
+    them with _schedule_summaries() once the transaction has committed
+    """
+    from app.services.conversation_summary import summary_due
+
+    from app.models import Message
+    from app.services.billing_service import build_usage_record
+
+    # Merge counter updates for clients touched by more than one unit
+    merged = UnitOfWork()
+    for unit in units:
+        for delta in unit.client_deltas.values():
+            merged.bump_client(delta.user_id, delta.phone_number, delta.messages, delta.unread,
+                               delta.last_message_at, delta.last_message_preview)
+
+    client_ids = {}
+    summaries_due: Set[int] = set()
+    for key in sorted(merged.client_deltas):
+        client_id, total_messages, summary_message_count = _upsert_client(merged.client_deltas[key])
+        client_ids[key] = client_id
+        if summary_due(total_messages, summary_message_count):
+            summaries_due.add(client_id)
+
+    pending_messages = [pending for unit in units for pending in unit.messages]
+    for pending in pending_messages:
+        pending.instance = Message(
+            client_id=client_ids[(pending.fields['user_id'], pending.client_phone)],
+            **pending.fields
+        )
+    # One flush for the whole batch - SQLAlchemy sends these as multi-row INSERTs
+    db.session.add_all([pending.instance for pending in pending_messages])
+    db.session.flush()
+
+    subscriptions: Dict[int, Any] = {}
+    records = []
+    for unit in units:
+        for entry in unit.usage:
+            if entry.user_id not in subscriptions:
+                subscriptions[entry.user_id] = _get_subscription(entry.user_id)
+            records.append(build_usage_record(
+                user_id=entry.user_id,
+                metric_type=entry.metric_type,
+                quantity=entry.quantity,
+                resource_id=str(entry.message.id) if entry.message else None,
+                resource_type=entry.resource_type,
+                subscription=subscriptions[entry.user_id]
+            ))
+    db.session.add_all(records)
+    return summaries_due
+
+
+def _schedule_summaries(client_ids: Set[int]) -> None:
+    from app.services.conversation_summary import schedule_summary
+
+    for client_id in sorted(client_ids):
+        schedule_summary(client_id)
+
+
+def _upsert_client(delta: ClientDelta) -> Tuple[int, int, Optional[int]]:
+    """
+    Create the client or bump its counters in one statement
+    Returns its ID, new total_messages and summary_message_count
+    """
+    from app.models import Client
+
+    clients = Client.__table__
+    now = datetime.utcnow()
+
+    stmt = pg_insert(clients).values(
+        user_id=delta.user_id,
+        phone_number=delta.phone_number,
+        name=f"Client {delta.phone_number[-4:]}",
+        total_messages=delta.messages,
+        unread_count=delta.unread,
+        last_message_at=delta.last_message_at,
+        last_message_preview=delta.last_message_preview,
+        created_at=now,
+        updated_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint='unique_user_client_phone',
+        set_={
+            'total_messages': func.coalesce(clients.c.total_messages, 0) + stmt.excluded.total_messages,
+            'unread_count': func.coalesce(clients.c.unread_count, 0) + stmt.excluded.unread_count,
+            'last_message_at': func.greatest(clients.c.last_message_at, stmt.excluded.last_message_at),
+            'last_message_preview': case(
+                (stmt.excluded.last_message_at >= func.coalesce(clients.c.last_message_at,
+                                                                stmt.excluded.last_message_at),
+                 stmt.excluded.last_message_preview),
+                else_=clients.c.last_message_preview
+            ),
+            'updated_at': now
+        }
+    ).returning(clients.c.id, clients.c.total_messages, clients.c.summary_message_count)
+
+    return tuple(db.session.execute(stmt).one())
+
+
+def _get_subscription(user_id: int) -> Any:
+    from app.models import Subscription
+    return Subscription.query.filter_by(user_id=user_id).first()
+
+
+class WriteBehindBuffer:
+    """
+    Group commit for conversation turns
+    Units submitted within PERSISTENCE_FLUSH_MS of each other (up to
+    PERSISTENCE_MAX_BATCH) are committed by a background thread in one
+    transaction. Callers that need read-your-writes wait on the returned future.
+    """
+
+    def __init__(self, max_batch: int = None, flush_ms: float = None):
+        self.max_batch = max_batch or int(os.getenv('PERSISTENCE_MAX_BATCH', '50'))
+        self.max_delay = (flush_ms if flush_ms is not None
+                          else float(os.getenv('PERSISTENCE_FLUSH_MS', '20'))) / 1000.0
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def submit(self, unit: UnitOfWork, app=None) -> Future:
+        """Queue a unit for the next group commit"""
+        app = app or current_app._get_current_object()
+        future: Future = Future()
+        self._ensure_thread()
+        self._queue.put((app, unit, future))
+        return future
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush whatever is queued and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive() or self._pid != os.getpid():
+                return
+            self._queue.put(None)
+            self._thread = None
+        thread.join(timeout=timeout)
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            # A forked worker inherits the object but not the thread
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch: List[Tuple[Any, UnitOfWork, Future]]) -> None:
+        by_app: Dict[Any, List[Tuple[UnitOfWork, Future]]] = {}
+        for app, unit, future in batch:
+            by_app.setdefault(app, []).append((unit, future))
+
+        for app, items in by_app.items():
+            with app.app_context():
+                try:
+                    summaries_due = apply_units([unit for unit, _ in items])
+                    db.session.commit()
+                    for _, future in items:
+                        future.set_result(True)
+                    _schedule_summaries(summaries_due)
+                    logger.debug(f"Group-committed {len(items)} conversation turns")
+                    continue
+                except Exception as e:
+                    db.session.rollback()
+                    if len(items) == 1:
+                        items[0][1].set_exception(e)
+                        logger.error(f"Failed to persist conversation turn: {e}")
+                        continue
+                    logger.warning(f"Group commit of {len(items)} turns failed, retrying individually: {e}")
+
+                # One bad turn must not lose the others
+                for unit, future in items:
+                    try:
+                        unit.commit()
+                        future.set_result(True)
+                    except Exception as e:
+                        logger.error(f"Failed to persist conversation turn: {e}")
+                        future.set_exception(e)
+
+
+# Per-process write-behind buffer
+_write_behind = WriteBehindBuffer()
+atexit.register(_write_behind.stop)
+
+
+def get_write_behind_buffer() -> WriteBehindBuffer:
+    return _write_behind
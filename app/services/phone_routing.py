@@ -0,0 +1,233 @@
+# app/services/phone_routing.py
+"""
+Phone number -> tenant routing table
+Every inbound SMS and call needs the user behind the destination number. The
+resolved route is cached in-process and in Redis so the webhook path does not
+query signalwire_phone_numbers and users for every message.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+
+from app.extensions import get_redis
+from app.utils.validators import normalize_phone_number
+
+logger = logging.getLogger(__name__)
+
+ROUTE_KEY_PREFIX = 'sms:route:'
+ROUTE_SID_KEY_PREFIX = 'sms:route:sid:'
+
+
+@dataclass
+class PhoneRoute:
+    """Everything the inbound path needs to reply on behalf of a user"""
+    user_id: int
+    phone_number: str
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    ai_enabled: bool = True
+    llm_cache_enabled: bool = True
+    subproject_sid: Optional[str] = None
+    phone_number_sid: Optional[str] = None
+
+    @property
+    def id(self) -> int:
+        # Lets a route stand in for the User object in the reply path
+        return self.user_id
+
+
+class PhoneRoutingTable:
+    """Two-tier (process + Redis) cache of phone number routes"""
+
+    def __init__(self):
+        # Local entries are not invalidated across processes, so keep them short-lived
+        self.local_ttl = float(os.getenv('PHONE_ROUTE_LOCAL_TTL', '30'))
+        self.redis_ttl = int(os.getenv('PHONE_ROUTE_REDIS_TTL', '3600'))
+
+        self._local: Dict[str, Tuple[float, Optional[PhoneRoute]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, phone_number: str) -> Optional[PhoneRoute]:
+        """Get the route for a destination number, loading it from the DB on a miss"""
+        number = normalize_phone_number(phone_number)
+        if not number:
+            return None
+
+        cached = self._get_local(number)
+        if cached is not None:
+            return cached[1]
+
+        route = self._get_redis(number)
+        if route is None:
+            route = self._load_from_db(number)
+            if route:
+                self._set_redis(route)
+
+        # Misses are cached locally too so unknown numbers do not hammer the DB
+        self._set_local(number, route)
+        return route
+
+    def invalidate(self, phone_number: str = None, phone_number_sid: str = None) -> None:
+        """Drop a cached route after a number is bought, released or suspended"""
+        number = normalize_phone_number(phone_number) if phone_number else None
+        redis_client = get_redis()
+
+        if not number and phone_number_sid:
+            number = self._number_for_sid(phone_number_sid, redis_client)
+
+        with self._lock:
+            if number:
+                self._local.pop(number, None)
+            if phone_number_sid:
+                for key, (_, route) in list(self._local.items()):
+                    if route and route.phone_number_sid == phone_number_sid:
+                        self._local.pop(key, None)
+
+        if redis_client is not None:
+            try:
+                keys = []
+                if number:
+                    keys.append(f"{ROUTE_KEY_PREFIX}{number}")
+                if phone_number_sid:
+                    keys.append(f"{ROUTE_SID_KEY_PREFIX}{phone_number_sid}")
+                if keys:
+                    redis_client.delete(*keys)
+            except Exception as e:
+                logger.warning(f"Failed to invalidate phone route {number or phone_number_sid}: {e}")
+
+        logger.info(f"Invalidated phone route {number or phone_number_sid}")
+
+    def invalidate_user(self, user: Any) -> None:
+        """Drop every route of a user - the routes carry their ai_enabled / llm_cache_enabled / is_active flags"""
+        from app.models import SignalWirePhoneNumber
+
+        numbers = {row.phone_number for row in SignalWirePhoneNumber.query.filter_by(user_id=user.id).all()}
+        if getattr(user, 'signalwire_phone_number', None):
+            numbers.add(user.signalwire_phone_number)
+
+        with self._lock:
+            for key, (_, route) in list(self._local.items()):
+                if route and route.user_id == user.id:
+                    self._local.pop(key, None)
+
+        for number in numbers:
+            self.invalidate(phone_number=number)
+
+    # =========================================================================
+    # CACHE TIERS
+    # =========================================================================
+
+    def _get_local(self, number: str) -> Optional[Tuple[float, Optional[PhoneRoute]]]:
+        with self._lock:
+            entry = self._local.get(number)
+            if entry and entry[0] > time.monotonic():
+                return entry
+            self._local.pop(number, None)
+            return None
+
+    def _set_local(self, number: str, route: Optional[PhoneRoute]) -> None:
+        with self._lock:
+            self._local[number] = (time.monotonic() + self.local_ttl, route)
+
+    def _get_redis(self, number: str) -> Optional[PhoneRoute]:
+        redis_client = get_redis()
+        if redis_client is None:
+            return None
+
+        try:
+            raw = redis_client.get(f"{ROUTE_KEY_PREFIX}{number}")
+            return PhoneRoute(**json.loads(raw)) if raw else None
+        except Exception as e:
+            logger.warning(f"Failed to read phone route for {number}: {e}")
+            return None
+
+    def _set_redis(self, route: PhoneRoute) -> None:
+        redis_client = get_redis()
+        if redis_client is None:
+            return
+
+        try:
+            pipe = redis_client.pipeline()
+            pipe.set(f"{ROUTE_KEY_PREFIX}{route.phone_number}", json.dumps(asdict(route)), ex=self.redis_ttl)
+            if route.phone_number_sid:
+                pipe.set(f"{ROUTE_SID_KEY_PREFIX}{route.phone_number_sid}", route.phone_number, ex=self.redis_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache phone route for {route.phone_number}: {e}")
+
+    def _number_for_sid(self, phone_number_sid: str, redis_client: Any) -> Optional[str]:
+        if redis_client is not None:
+            try:
+                number = redis_client.get(f"{ROUTE_SID_KEY_PREFIX}{phone_number_sid}")
+                if number:
+                    return number
+            except Exception as e:
+                logger.warning(f"Failed to look up phone route for SID {phone_number_sid}: {e}")
+
+        with self._lock:
+            for key, (_, route) in self._local.items():
+                if route and route.phone_number_sid == phone_number_sid:
+                    return key
+        return None
+
+    def _load_from_db(self, number: str) -> Optional[PhoneRoute]:
+        from app.models import User, SignalWirePhoneNumber
+
+        sw_phone = SignalWirePhoneNumber.query.filter_by(
+            phone_number=number,
+            status='active'
+        ).first()
+
+        if sw_phone:
+            user = User.query.get(sw_phone.user_id)
+            subproject_sid = sw_phone.subproject_id
+            phone_number_sid = sw_phone.phone_number_sid
+        else:
+            user = User.query.filter_by(signalwire_phone_number=number).first()
+            subproject_sid = user.signalwire_subproject_id if user else None
+            phone_number_sid = user.signalwire_phone_number_sid if user else None
+
+        if not user or not user.is_active:
+            return None
+
+        return PhoneRoute(
+            user_id=user.id,
+            phone_number=number,
+            username=user.username,
+            first_name=user.first_name,
+            ai_enabled=bool(user.ai_enabled) if user.ai_enabled is not None else True,
+            llm_cache_enabled=user.llm_cache_enabled is not False,
+            subproject_sid=subproject_sid,
+            phone_number_sid=phone_number_sid
+        )
+
+
+# Per-process routing table
+_routing_table = PhoneRoutingTable()
+
+
+def get_phone_routing_table() -> PhoneRoutingTable:
+    return _routing_table
+
+
+def resolve_phone_route(phone_number: str) -> Optional[PhoneRoute]:
+    """Resolve the user behind a destination number"""
+    return _routing_table.resolve(phone_number)
+
+
+def invalidate_phone_route(phone_number: str = None, phone_number_sid: str = None) -> None:
+    """Invalidate the cached route for a number (by E.164 number or SignalWire SID)"""
+    _routing_table.invalidate(phone_number=phone_number, phone_number_sid=phone_number_sid)
+
+
+def invalidate_user_routes(user: Any) -> None:
+    """
+    Invalidate all of a user's routes after their AI, cache or active flags change
+    Call after the commit, so the next resolve cannot re-cache the old values
+    """
+    _routing_table.invalidate_user(user)
@@ -0,0 +1,190 @@
+# app/services/response_cache.py
+"""
+LLM response cache
+Short inbound texts repeat a lot ("what are your hours", "thanks"). Replies
+are cached per user under the normalized message text plus a fingerprint of
+everything else that shapes the prompt, so a repeat skips the generation.
+
+Tiers: a small in-process LRU in front of Redis. In Redis every entry has a
+TTL and each user's entries are tracked in a sorted set by last use, trimmed
+to RESPONSE_CACHE_MAX_PER_USER (least recently used first).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.extensions import get_redis
+from app.utils.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'llm:cache:'
+CACHE_LRU_KEY_PREFIX = 'llm:cache:lru:'
+
+# Replies to these depend entirely on what was said before
+CONTEXT_DEPENDENT = {'yes', 'y', 'yeah', 'yep', 'no', 'n', 'nope', 'sure', 'maybe', 'why', 'what', 'how'}
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_message(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a message"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = _NON_WORD.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+class ResponseCache:
+    """Two-tier (process LRU + Redis) cache of LLM replies"""
+
+    def __init__(self):
+        self.enabled = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+        self.ttl = int(os.getenv('RESPONSE_CACHE_TTL', '86400'))
+        self.max_chars = int(os.getenv('RESPONSE_CACHE_MAX_CHARS', '80'))
+        self.max_per_user = int(os.getenv('RESPONSE_CACHE_MAX_PER_USER', '200'))
+        self.local_size = int(os.getenv('RESPONSE_CACHE_LOCAL_SIZE', '512'))
+        self.local_ttl = float(os.getenv('RESPONSE_CACHE_LOCAL_TTL', '60'))
+
+        self._local: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, user_id: Any, message: str, persona: str) -> Optional[str]:
+        """
+        Cache key for a message, or None if it should not be cached
+        persona fingerprints the model, personality and custom prompt
+        """
+        if not self.enabled or user_id is None:
+            return None
+
+        normalized = normalize_message(message)
+        if not normalized or len(normalized) > self.max_chars or normalized in CONTEXT_DEPENDENT:
+            return None
+
+        digest = hashlib.sha256(f"{normalized}\x1f{persona}".encode()).hexdigest()[:32]
+        return f"{CACHE_KEY_PREFIX}{user_id}:{digest}"
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not key:
+            return None
+
+        entry = self._get_local(key)
+        if entry is None:
+            entry = self._get_redis(key)
+            if entry is not None:
+                self._set_local(key, entry)
+
+        if entry is None:
+            incr('llm_cache_misses_total')
+            return None
+
+        incr('llm_cache_hits_total')
+        # LLM time this hit saved
+        incr('llm_cache_saved_seconds_total', round(entry.get('processing_time') or 0, 3))
+        return entry
+
+    def set(self, key: Optional[str], response: str, tokens_used: int = 0,
+            processing_time: float = 0.0) -> None:
+        if not key or not response:
+            return
+
+        entry = {'response': response, 'tokens_used': tokens_used, 'processing_time': processing_time}
+        self._set_local(key, entry)
+
+        redis_client = get_redis()
+        if redis_client is None:
+            return
+
+        lru_key = self._lru_key(key)
+        try:
+            pipe = redis_client.pipeline()
+            pipe.set(key, json.dumps(entry), ex=self.ttl)
+            pipe.zadd(lru_key, {key: time.time()})
+            pipe.expire(lru_key, self.ttl)
+            pipe.zcard(lru_key)
+            size = pipe.execute()[-1]
+
+            if size > self.max_per_user:
+                evicted = redis_client.zpopmin(lru_key, size - self.max_per_user)
+                if evicted:
+                    redis_client.delete(*[member for member, _ in evicted])
+                    incr('llm_cache_evictions_total', len(evicted))
+        except Exception as e:
+            logger.warning(f"Failed to cache LLM response: {e}")
+
+    def invalidate_user(self, user_id: Any) -> None:
+        """Drop a user's cached replies, e.g. after their prompt settings change"""
+        prefix = f"{CACHE_KEY_PREFIX}{user_id}:"
+        with self._lock:
+            for key in [k for k in self._local if k.startswith(prefix)]:
+                self._local.pop(key, None)
+
+        redis_client = get_redis()
+        if redis_client is None:
+            return
+        try:
+            lru_key = f"{CACHE_LRU_KEY_PREFIX}{user_id}"
+            keys = redis_client.zrange(lru_key, 0, -1)
+            redis_client.delete(lru_key, *keys)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate LLM cache for user {user_id}: {e}")
+
+    # =========================================================================
+    # CACHE TIERS
+    # =========================================================================
+
+    @staticmethod
+    def _lru_key(key: str) -> str:
+        user_id = key[len(CACHE_KEY_PREFIX):].split(':', 1)[0]
+        return f"{CACHE_LRU_KEY_PREFIX}{user_id}"
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                self._local.pop(key, None)
+                return None
+            self._local.move_to_end(key)
+            return entry
+
+    def _set_local(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, entry)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _get_redis(self, key: str) -> Optional[Dict[str, Any]]:
+        redis_client = get_redis()
+        if redis_client is None:
+            return None
+
+        try:
+            raw = redis_client.get(key)
+            if raw is None:
+                return None
+            # Touch for LRU ordering
+            redis_client.zadd(self._lru_key(key), {key: time.time()})
+            return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Failed to read LLM cache: {e}")
+            return None
+
+
+# Per-process cache
+_response_cache = ResponseCache()
+
+
+def get_response_cache() -> ResponseCache:
+    return _response_cache
@@ -1,17 +1,33 @@
 # app/services/sms_conversation_service.py - FINAL FIXED VERSION
 import os
+import re
 import asyncio
 import logging
 import json
-import httpx
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 from flask import current_app
 from sqlalchemy.exc import IntegrityError
 import signalwire
 
+from app.utils.conversation_lock import conversation_lock
+from app.utils.idempotency import claim_message_sid, release_message_sid
+from app.services.phone_routing import resolve_phone_route, invalidate_phone_route
+from app.services.persistence import UnitOfWork, get_write_behind_buffer
+from app.services.conversation_summary import SUMMARY_KEEP_RECENT
+from app.services.intent_classifier import get_intent_classifier
+from app.services.response_cache import get_response_cache
+from app.services.status_buffer import buffer_status_callback
+from app.utils.llm_client import LLMCircuitOpen, LLMError, get_llm_client
+from app.utils.llm_context import load_context, save_context
+from app.utils.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from app.utils.prompt_builder import CHARS_PER_TOKEN, get_prompt_builder
+from app.utils.sms_debounce import debounce_window, join_burst, is_latest_in_burst, drain_burst
+from app.utils.sms_segments import count_segments, fit_prefix, segment_char_budget, to_gsm, truncate_to_segments
+
 try:
     from signalwire.relay.consumer import Consumer
 except ImportError:
@@ -26,6 +42,50 @@ class SMSMessage:
     timestamp: datetime
     user_id: Optional[int] = None
     subproject_id: Optional[str] = None
+    deadline: Optional[float] = None  # time.time() by which the reply should be sent
+    deferrals: int = 0  # times the reply was put back on the queue while the LLM was down
+    
+    def to_payload(self) -> Dict[str, Any]:
+        """Serialize for handing off to the reply worker queue"""
+        return {
+            'from_number': self.from_number,
+            'to_number': self.to_number,
+            'body': self.body,
+            'message_id': self.message_id,
+            'timestamp': self.timestamp.isoformat(),
+            'user_id': self.user_id,
+            'subproject_id': self.subproject_id,
+            'deadline': self.deadline,
+            'deferrals': self.deferrals
+        }
+    
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> 'SMSMessage':
+        data = dict(payload)
+        data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+        return cls(**data)
+
+# Where a streamed reply may be cut: sentence-ending punctuation or a newline
+SENTENCE_BOUNDARY = re.compile(r'[.!?](?=\s)|\n')
+
+def _first_segment_end(text: str, limit: int = 160, min_chars: int = 20) -> Optional[int]:
+    """
+    End offset of a streamed reply's first SMS segment, or None to keep reading
+    Cuts at the first sentence boundary past min_chars; once the text outgrows
+    one segment, at the last boundary (or word break) that still fits
+    """
+    fitting = [m.end() for m in SENTENCE_BOUNDARY.finditer(text) if m.end() <= limit]
+    
+    if len(text) > limit:
+        if fitting and fitting[-1] >= min_chars:
+            return fitting[-1]
+        cut = text.rfind(' ', 0, limit)
+        return cut if cut > 0 else limit
+    
+    for end in fitting:
+        if end >= min_chars:
+            return end
+    return None
 
 @dataclass
 class LLMResponse:
@@ -33,6 +93,9 @@ class LLMResponse:
     confidence: float
     tokens_used: int
     processing_time: float
+    model: Optional[str] = None  # set when a fallback model answered
+    source: str = 'llm'  # 'template' from the intent fast path, 'degraded' while the LLM is down
+    metadata: Optional[Dict[str, Any]] = None  # stored on Message.message_metadata
 
 class SMSConversationService:
     def __init__(self):
@@ -42,14 +105,54 @@ class SMSConversationService:
             signalwire_space_url=os.getenv('SIGNALWIRE_SPACE_URL')
         )
         
-        self.ollama_base_url = os.getenv('OLLAMA_SERVER_URL', 'http://internal-llm-server:11434')
-        self.ollama_model = os.getenv('OLLAMA_MODEL', 'dolphin-mistral:7b')
-        self.ollama_timeout = float(os.getenv('OLLAMA_TIMEOUT', '30.0'))
+        # Shared pooled client - base URL, model and pool limits come from app.utils.llm_client
+        self.llm = get_llm_client()
+        self.ollama_base_url = self.llm.base_url
+        self.ollama_model = self.llm.model
+        self.ollama_timeout = self.llm.config.timeout
+        
+        # Stream tokens and send the first sentence as its own SMS while the rest generates
+        self.ollama_streaming = os.getenv('OLLAMA_STREAMING', 'false').lower() == 'true'
+        self.stream_first_segment_chars = int(os.getenv('SMS_FIRST_SEGMENT_CHARS', '160'))
+        
+        # Replies are billed per segment: 160 GSM-7 characters, but 70 once a single character
+        # forces UCS-2. Lookalikes (smart quotes, dashes, ellipses) are swapped for GSM ones;
+        # SMS_GSM_ONLY also drops what has no equivalent, such as emoji. The prompt asks for
+        # SMS_TARGET_SEGMENTS, generation stops near SMS_MAX_SEGMENTS and the reply is cut there
+        self.gsm_only = os.getenv('SMS_GSM_ONLY', 'false').lower() == 'true'
+        self.target_segments = int(os.getenv('SMS_TARGET_SEGMENTS', '1'))
+        self.max_segments = int(os.getenv('SMS_MAX_SEGMENTS', '3'))
+        self.ollama_options = dict(
+            self.OLLAMA_OPTIONS,
+            num_predict=min(self.OLLAMA_OPTIONS['num_predict'],
+                            -(-segment_char_budget(self.max_segments) // CHARS_PER_TOKEN) + 8)
+        )
+        
+        # Latency budget from webhook receipt to reply; the LLM call gets whatever is left
+        self.reply_sla_seconds = float(os.getenv('SMS_REPLY_SLA_SECONDS', '20'))
+        
+        # Replies to repeated short messages are served from cache instead of the LLM
+        self.response_cache = get_response_cache()
+        
+        # Keywords, greetings and acknowledgements are answered from templates or not at all
+        self.intent_classifier = get_intent_classifier()
         
-        self.http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(self.ollama_timeout),
-            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+        # While the LLM circuit breaker is open: 'fallback' sends the user's fallback template
+        # (or LLM_DEGRADED_REPLY) at once, 'defer' re-queues the reply until the breaker recovers
+        self.degraded_mode = os.getenv('LLM_DEGRADED_MODE', 'fallback').lower()
+        self.degraded_reply = os.getenv(
+            'LLM_DEGRADED_REPLY', "Thanks for your message! We'll get back to you shortly."
         )
+        self.max_deferrals = int(os.getenv('LLM_DEGRADED_MAX_DEFERRALS', '3'))
+        
+        # History is packed into LLM_PROMPT_TOKEN_BUDGET instead of a fixed message count;
+        # this only bounds how many candidates are read
+        self.prompt_builder = get_prompt_builder()
+        self.history_fetch_limit = int(os.getenv('LLM_HISTORY_MAX_MESSAGES', '20'))
+        
+        # 'inline' generates the reply inside the webhook request, 'queued' acknowledges
+        # immediately and leaves the LLM call and outbound send to the Celery worker pool
+        self.webhook_mode = os.getenv('SMS_WEBHOOK_MODE', 'inline').lower()
         
         self.logger = logging.getLogger(__name__)
         self.relay_consumer = None
@@ -61,58 +164,261 @@ class SMSConversationService:
         return db, User, Message, SignalWireSubproject, SignalWirePhoneNumber
     
     async def handle_incoming_sms_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+        sms = self._parse_webhook_sms(webhook_data)
+        if not await asyncio.to_thread(claim_message_sid, sms.message_id):
+            return self._duplicate_result(sms)
+        
         try:
-            db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
-            
-            sms = self._parse_webhook_sms(webhook_data)
             self.logger.info(f"Incoming SMS from {sms.from_number}: {sms.body[:50]}...")
             
             user = await self._find_user_by_phone_number(sms.to_number)
             if not user:
+                # Let SignalWire's retry through once the number is provisioned or the route cache catches up
+                await asyncio.to_thread(release_message_sid, sms.message_id)
                 return {'success': False, 'error': f'No user found for number {sms.to_number}'}
             
             sms.user_id = user.id
             incoming_message = await self._save_incoming_message(sms, user)
-            llm_response = await self._generate_llm_response(sms, user, incoming_message)
-            response_result = await self._send_sms_response(sms, llm_response, user)
-            await self._save_outgoing_message(sms, llm_response, user, response_result)
+            if incoming_message is None:
+                return self._duplicate_result(sms)
+            
+            burst_seq = (await asyncio.to_thread(join_burst, user.id, sms.from_number, incoming_message.id)
+                         if user.ai_enabled else None)
+            if burst_seq is not None:
+                # Give the sender a moment to finish a multi-part thought
+                await asyncio.sleep(debounce_window())
+            
+            return await self._reply_to_sms(sms, user, incoming_message, burst_seq)
+            
+        except Exception as e:
+            await asyncio.to_thread(release_message_sid, sms.message_id)
+            self.logger.error(f"SMS handling failed: {str(e)}", exc_info=True)
+            return {'success': False, 'error': str(e)}
+    
+    async def accept_incoming_sms_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and store an inbound SMS, then enqueue the reply for the worker pool"""
+        sms = self._parse_webhook_sms(webhook_data)
+        if not await asyncio.to_thread(claim_message_sid, sms.message_id):
+            return self._duplicate_result(sms)
+        
+        try:
+            self.logger.info(f"Accepting SMS from {sms.from_number}: {sms.body[:50]}...")
+            
+            user = await self._find_user_by_phone_number(sms.to_number)
+            if not user:
+                # Let SignalWire's retry through once the number is provisioned or the route cache catches up
+                await asyncio.to_thread(release_message_sid, sms.message_id)
+                return {'success': False, 'error': f'No user found for number {sms.to_number}'}
+            
+            sms.user_id = user.id
+            incoming_message = await self._save_incoming_message(sms, user)
+            if incoming_message is None:
+                return self._duplicate_result(sms)
+            
+            if not user.ai_enabled:
+                return {'success': True, 'message_id': incoming_message.id, 'response_sent': False}
+            
+            burst_seq = await asyncio.to_thread(join_burst, user.id, sms.from_number, incoming_message.id)
+            
+            try:
+                from app.tasks.sms_tasks import enqueue_sms_reply
+                task_id = await asyncio.to_thread(
+                    enqueue_sms_reply, sms.to_payload(), incoming_message.id,
+                    burst_seq=burst_seq,
+                    countdown=debounce_window() if burst_seq is not None else None
+                )
+            except Exception as e:
+                # Broker unavailable - the message is already stored, so reply inline
+                # rather than leaving the sender without an answer
+                self.logger.error(f"Failed to enqueue SMS reply, replying inline: {str(e)}")
+                return await self._reply_to_sms(sms, user, incoming_message, burst_seq)
             
             return {
                 'success': True,
                 'message_id': incoming_message.id,
-                'response_sent': response_result.get('success', False),
-                'tokens_used': llm_response.tokens_used
+                'queued': True,
+                'task_id': task_id
             }
             
         except Exception as e:
-            self.logger.error(f"SMS handling failed: {str(e)}", exc_info=True)
+            await asyncio.to_thread(release_message_sid, sms.message_id)
+            self.logger.error(f"SMS accept failed: {str(e)}", exc_info=True)
             return {'success': False, 'error': str(e)}
     
+    async def _coalesce_burst(self, sms: SMSMessage, user: Any, incoming_message: Any,
+                              burst_seq: Optional[int]) -> Optional[tuple]:
+        """
+        Merge a debounced burst into one SMS to answer
+        Returns (sms, answered message IDs), or None if another attempt answers this message
+        """
+        if burst_seq is None:
+            return sms, [incoming_message.id]
+        
+        if not await asyncio.to_thread(is_latest_in_burst, user.id, sms.from_number, burst_seq):
+            return None
+        
+        message_ids = await asyncio.to_thread(drain_burst, user.id, sms.from_number)
+        if message_ids is None:
+            return sms, [incoming_message.id]
+        if not message_ids:
+            return None
+        
+        db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
+        messages = await asyncio.to_thread(
+            Message.query.filter(Message.id.in_(message_ids)).order_by(Message.created_at, Message.id).all
+        )
+        
+        if len(messages) > 1:
+            self.logger.info(f"Coalesced {len(messages)} messages from {sms.from_number} into one reply")
+            sms = replace(sms, body='\n'.join(msg.body for msg in messages if msg.body))
+        
+        return sms, message_ids
+    
+    def _duplicate_result(self, sms: SMSMessage) -> Dict[str, Any]:
+        self.logger.info(f"Duplicate webhook for {sms.message_id}, already processed")
+        return {'success': True, 'duplicate': True, 'message_sid': sms.message_id}
+    
+    async def process_queued_sms_reply(self, sms_payload: Dict[str, Any], incoming_message_id: int,
+                                       burst_seq: Optional[int] = None) -> Dict[str, Any]:
+        """Generate and send the reply for a message accepted by accept_incoming_sms_webhook"""
+        db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
+        
+        sms = SMSMessage.from_payload(sms_payload)
+        user = await self._find_user_by_phone_number(sms.to_number)
+        if not user:
+            return {'success': False, 'error': f'No user found for number {sms.to_number}'}
+        
+        incoming_message = await asyncio.to_thread(Message.query.get, incoming_message_id)
+        if incoming_message is None:
+            # Deleted, or not visible yet - retrying the task would not find it either
+            self.logger.warning(f"Queued reply for missing message {incoming_message_id}, skipping")
+            return {'success': False, 'error': 'message not found'}
+        return await self._reply_to_sms(sms, user, incoming_message, burst_seq)
+    
+    async def handle_status_callback(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply a SignalWire delivery status callback to the stored outbound message"""
+        try:
+            message_sid = webhook_data.get('MessageSid')
+            status = webhook_data.get('MessageStatus') or webhook_data.get('SmsStatus')
+            
+            if not message_sid or not status:
+                return {'success': False, 'error': 'Missing required fields'}
+            
+            # Applied in bulk (and rank-guarded against out-of-order callbacks)
+            # by the flush_status_callbacks beat task
+            buffered = await asyncio.to_thread(
+                buffer_status_callback, message_sid, status,
+                webhook_data.get('ErrorCode'),
+                webhook_data.get('ErrorMessage')
+            )
+            return {'success': True, 'buffered': buffered}
+            
+        except Exception as e:
+            self.logger.error(f"Status callback failed: {str(e)}", exc_info=True)
+            return {'success': False, 'error': str(e)}
+    
+    async def _reply_to_sms(self, sms: SMSMessage, user: Any, incoming_message: Any,
+                            burst_seq: Optional[int] = None) -> Dict[str, Any]:
+        if not user.ai_enabled:
+            return {'success': True, 'message_id': incoming_message.id, 'response_sent': False}
+        
+        # Hold the conversation lock from history read to reply save, so a second
+        # text from the same sender - on any worker - sees this reply in its context
+        async with conversation_lock(user.id, sms.from_number):
+            if not self.llm.breaker.available():
+                # Deferred before the burst is drained, so the retry coalesces it as usual
+                deferred = await asyncio.to_thread(self._defer_reply, sms, incoming_message, burst_seq)
+                if deferred:
+                    return deferred
+            
+            burst = await self._coalesce_burst(sms, user, incoming_message, burst_seq)
+            if burst is None:
+                self.logger.info(f"Message {incoming_message.id} coalesced into a later reply")
+                return {'success': True, 'message_id': incoming_message.id,
+                        'response_sent': False, 'coalesced': True}
+            
+            sms, answered_ids = burst
+            # Template lookups hit the DB on a cache miss
+            decision = await asyncio.to_thread(self.intent_classifier.decide, sms.body, user)
+            if decision.route == 'suppress':
+                self.logger.info(f"🔇 No reply to {decision.intent} message {incoming_message.id}")
+                return {'success': True, 'message_id': incoming_message.id,
+                        'response_sent': False, 'intent': decision.intent}
+            
+            if decision.route == 'template':
+                llm_response = LLMResponse(
+                    response_text=decision.reply,
+                    confidence=decision.confidence,
+                    tokens_used=0,
+                    processing_time=0.0,
+                    source='template',
+                    metadata={'template_id': decision.template_id}
+                )
+                response_result = await self._send_sms_response(sms, llm_response, user)
+            elif not self.llm.breaker.available():
+                llm_response = await asyncio.to_thread(self._degraded_response, user, datetime.utcnow())
+                response_result = await self._send_sms_response(sms, llm_response, user)
+            elif self.ollama_streaming:
+                llm_response, response_result = await self._stream_llm_reply(
+                    sms, user, incoming_message, answered_ids
+                )
+            else:
+                llm_response = await self._generate_llm_response(sms, user, incoming_message, answered_ids)
+                response_result = await self._send_sms_response(sms, llm_response, user)
+            
+            try:
+                await self._save_outgoing_message(sms, llm_response, user, response_result)
+            except Exception as e:
+                # The reply has already gone out; surfacing this as a failure would make
+                # callers retry and send it twice
+                self.logger.error(f"Failed to store outgoing message: {str(e)}", exc_info=True)
+        
+        return {
+            'success': True,
+            'message_id': incoming_message.id,
+            'response_sent': response_result.get('success', False),
+            'tokens_used': llm_response.tokens_used,
+            'intent': decision.intent
+        }
+    
     # FIXED: Remove User type hint that was causing the error
     async def _generate_llm_response(self, sms: SMSMessage, user: Any, 
-                                   incoming_message: Any) -> LLMResponse:
+                                   incoming_message: Any,
+                                   answered_ids: Optional[List[int]] = None) -> LLMResponse:
         start_time = datetime.utcnow()
+        cache_key, cached = await asyncio.to_thread(self._cached_llm_response, sms, user, start_time)
+        if cached:
+            return cached
         
         try:
-            conversation_history = await self._get_conversation_history(
-                user.id, sms.from_number, limit=10
-            )
-            
-            prompt = self._build_llm_prompt(sms, user, conversation_history)
-            ollama_response = await self._call_ollama_api(prompt, user.id)
+            prompt, context, full_prompt = await self._prepare_prompt(sms, user, incoming_message, answered_ids)
+            ollama_response = await self._call_ollama_api(prompt, user.id, context=context,
+                                                          deadline=sms.deadline, full_prompt=full_prompt)
             processing_time = (datetime.utcnow() - start_time).total_seconds()
+            model = ollama_response.get('model') or self.ollama_model
             
             response_text = ollama_response.get('response', '').strip()
             response_text = self._clean_response_for_sms(response_text)
             estimated_tokens = ollama_response.get('eval_count', 0) + ollama_response.get('prompt_eval_count', 0)
+            if model == self.ollama_model:
+                # Fallback-model replies are not cached in place of the primary's
+                await asyncio.to_thread(self.response_cache.set, cache_key, response_text,
+                                        estimated_tokens, processing_time)
+            if response_text:
+                await asyncio.to_thread(save_context, user.id, sms.from_number, model,
+                                        ollama_response.get('context'), response_text)
             
             return LLMResponse(
                 response_text=response_text or "I'm having trouble processing your message right now.",
                 confidence=0.9,
                 tokens_used=estimated_tokens,
-                processing_time=processing_time
+                processing_time=processing_time,
+                model=model,
+                metadata=self._llm_metadata(ollama_response, context)
             )
             
+        except LLMCircuitOpen:
+            return await asyncio.to_thread(self._degraded_response, user, start_time)
         except Exception as e:
             self.logger.error(f"Ollama LLM generation failed: {str(e)}", exc_info=True)
             processing_time = (datetime.utcnow() - start_time).total_seconds()
@@ -121,74 +427,292 @@ class SMSConversationService:
                 response_text="I'm having trouble right now. Please try again in a moment.",
                 confidence=0.0,
                 tokens_used=0,
-                processing_time=processing_time
+                processing_time=processing_time,
+                metadata={'error': str(e)}
             )
     
-    async def _call_ollama_api(self, prompt: str, user_id: int) -> Dict[str, Any]:
+    @staticmethod
+    def _llm_metadata(result: Dict[str, Any], context: Optional[List[int]]) -> Dict[str, Any]:
+        """What answered and where the time went, for the reply's message_metadata"""
+        return {
+            'tier': result.get('tier'),
+            'host': result.get('host'),
+            'context_reused': bool(context),
+            'timings': result.get('timings')
+        }
+    
+    async def _prepare_prompt(self, sms: SMSMessage, user: Any, incoming_message: Any,
+                              answered_ids: Optional[List[int]] = None) -> tuple:
+        """
+        (prompt, context, full_prompt) for this turn
+        With a usable stored Ollama context only the new message is sent;
+        otherwise context is None and the prompt carries the full history.
+        full_prompt always carries the history, for a fallback model that
+        cannot use the primary's context
+        """
+        # Older turns of a long thread come from the rolling summary; only the
+        # messages it does not cover yet are read as history
+        summary, unsummarized = await self._get_conversation_summary(user.id, sms.from_number)
+        history_limit = self.history_fetch_limit
+        if summary:
+            history_limit = min(history_limit, max(unsummarized, SUMMARY_KEEP_RECENT))
+        
+        # The messages being answered are already stored; keep them out of the
+        # history so they only appear once, as the current message
+        conversation_history = await self._get_conversation_history(
+            user.id, sms.from_number, limit=history_limit,
+            exclude_ids=answered_ids or [incoming_message.id]
+        )
+        
+        last = conversation_history[-1] if conversation_history else None
+        last_reply = last.body if last is not None and last.direction == 'outbound' else None
+        full_prompt = self._build_llm_prompt(sms, user, conversation_history, summary)
+        context = await asyncio.to_thread(load_context, user.id, sms.from_number, self.ollama_model, last_reply)
+        if context:
+            self.logger.info(f"Reusing {len(context)}-token context for {sms.from_number}")
+            return self._build_followup_prompt(sms), context, full_prompt
+        
+        return full_prompt, None, full_prompt
+    
+    def _cached_llm_response(self, sms: SMSMessage, user: Any, start_time: datetime) -> tuple:
+        """(cache key, LLMResponse on a hit); the key is None when the reply is not cacheable"""
+        if not getattr(user, 'llm_cache_enabled', True):
+            return None, None
+        
+        # Everything else _build_llm_prompt varies on, apart from the history
+        user_name = user.first_name or user.username or "the user"
+        cache_key = self.response_cache.key_for(user.id, sms.body, f"sms|{self.ollama_model}|{user_name}")
+        cached = self.response_cache.get(cache_key)
+        if not cached:
+            return cache_key, None
+        
+        self.logger.info(f"Serving cached reply to {sms.from_number} for user {user.id}")
+        return cache_key, LLMResponse(
+            response_text=cached['response'],
+            confidence=0.9,
+            tokens_used=0,
+            processing_time=(datetime.utcnow() - start_time).total_seconds(),
+            metadata={'cached': True}
+        )
+    
+    def _defer_reply(self, sms: SMSMessage, incoming_message: Any,
+                     burst_seq: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Re-queue the reply until the breaker lets calls through; None to answer now instead"""
+        if self.degraded_mode != 'defer' or sms.deferrals >= self.max_deferrals:
+            return None
+        
+        countdown = max(self.llm.breaker.retry_after(), 5.0)
+        # The original deadline has passed by the time the retry runs; it gets a fresh budget
+        deferred = replace(sms, deferrals=sms.deferrals + 1,
+                           deadline=time.time() + countdown + self.reply_sla_seconds)
         try:
-            payload = {
-                "model": self.ollama_model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "top_p": 0.9,
-                    "num_predict": 150,
-                    "stop": ["\n\n", "User:", "Assistant:", "Human:"]
-                }
-            }
+            from app.tasks.sms_tasks import enqueue_sms_reply
+            task_id = enqueue_sms_reply(deferred.to_payload(), incoming_message.id,
+                                        burst_seq=burst_seq, countdown=countdown)
+        except Exception as e:
+            self.logger.error(f"Failed to defer SMS reply, sending the fallback reply: {str(e)}")
+            return None
+        
+        self.logger.warning(f"⏸️ LLM circuit open - reply to message {incoming_message.id} "
+                            f"deferred {countdown:.0f}s (attempt {deferred.deferrals})")
+        return {'success': True, 'message_id': incoming_message.id, 'response_sent': False,
+                'deferred': True, 'task_id': task_id}
+    
+    def _degraded_response(self, user: Any, start_time: datetime) -> LLMResponse:
+        """The user's fallback template, or LLM_DEGRADED_REPLY, sent while the LLM circuit is open"""
+        self.logger.warning(f"⚡ LLM circuit open - sending the fallback reply for user {user.id}")
+        try:
+            text = self.intent_classifier.template_reply(user, 'fallback')
+        except Exception as e:
+            self.logger.error(f"Failed to load fallback template for user {user.id}: {str(e)}")
+            text = None
+        return LLMResponse(
+            response_text=text or self.degraded_reply,
+            confidence=0.0,
+            tokens_used=0,
+            processing_time=(datetime.utcnow() - start_time).total_seconds(),
+            source='degraded'
+        )
+    
+    async def _stream_llm_reply(self, sms: SMSMessage, user: Any, incoming_message: Any,
+                                answered_ids: Optional[List[int]] = None) -> tuple:
+        """
+        Stream the generation and send the first sentence as soon as it is complete
+        The remainder goes out as a second SMS when generation finishes; the
+        returned LLMResponse carries the full text, and the send result lists
+        both sends under 'parts' so each is stored and billed with its own SID
+        """
+        start_time = datetime.utcnow()
+        raw_text = ''
+        first_cut = None
+        first_text = None
+        first_result = None
+        first_segment_seconds = None
+        context = None
+        stats: Dict[str, Any] = {}
+        
+        cache_key, cached = await asyncio.to_thread(self._cached_llm_response, sms, user, start_time)
+        if cached:
+            return cached, await self._send_sms_response(sms, cached, user)
+        
+        try:
+            prompt, context, full_prompt = await self._prepare_prompt(sms, user, incoming_message, answered_ids)
             
+            async for chunk in self._stream_ollama_api(prompt, user.id, context=context,
+                                                       deadline=sms.deadline, full_prompt=full_prompt):
+                raw_text += chunk.get('response', '')
+                if chunk.get('done'):
+                    stats = chunk
+                    break
+                
+                if first_cut is None:
+                    # What fits in one segment depends on the encoding the text so far needs
+                    sms_text = self._sms_text(raw_text)
+                    limit = min(self.stream_first_segment_chars, fit_prefix(sms_text, 1))
+                    cut = _first_segment_end(sms_text, limit=limit)
+                    if cut is not None:
+                        first_cut = cut
+                        first_text = self._clean_response_for_sms(sms_text[:cut])
+                        first_result = await self._send_sms_text(sms, first_text, user)
+                        first_segment_seconds = (datetime.utcnow() - start_time).total_seconds()
+                        self.logger.info(f"First segment sent after {first_segment_seconds:.2f}s ({cut} chars)")
+        
+        except Exception as e:
+            if first_result is None and isinstance(e, LLMCircuitOpen):
+                llm_response = await asyncio.to_thread(self._degraded_response, user, start_time)
+                return llm_response, await self._send_sms_response(sms, llm_response, user)
+            self.logger.error(f"Ollama streaming generation failed: {str(e)}", exc_info=True)
+            if first_result is None:
+                llm_response = LLMResponse(
+                    response_text="I'm having trouble right now. Please try again in a moment.",
+                    confidence=0.0,
+                    tokens_used=0,
+                    processing_time=(datetime.utcnow() - start_time).total_seconds(),
+                    metadata={'error': str(e)}
+                )
+                return llm_response, await self._send_sms_response(sms, llm_response, user)
+            # The first segment is out; keep what was generated rather than apologising
+        
+        processing_time = (datetime.utcnow() - start_time).total_seconds()
+        full_text = self._clean_response_for_sms(raw_text)
+        llm_response = LLMResponse(
+            response_text=full_text or "I'm having trouble processing your message right now.",
+            confidence=0.9 if full_text else 0.0,
+            tokens_used=stats.get('eval_count', 0) + stats.get('prompt_eval_count', 0),
+            processing_time=processing_time,
+            model=stats.get('model') or self.ollama_model,
+            metadata=dict(self._llm_metadata(stats, context), first_segment_seconds=first_segment_seconds)
+        )
+        # Only complete generations are worth replaying, and only the primary model's
+        if stats.get('done') and llm_response.model == self.ollama_model:
+            await asyncio.to_thread(self.response_cache.set, cache_key, full_text,
+                                    llm_response.tokens_used, processing_time)
+        
+        async def save_stream_context(last_part: str) -> None:
+            # Matched by _prepare_prompt against the newest outbound row, i.e. the last part stored
+            if stats.get('done') and last_part:
+                await asyncio.to_thread(save_context, user.id, sms.from_number, llm_response.model,
+                                        stats.get('context'), last_part)
+        
+        if first_result is None:
+            # Short reply - the whole thing fits in the one message
+            await save_stream_context(full_text)
+            return llm_response, await self._send_sms_response(sms, llm_response, user)
+        
+        # first_cut is an offset into the GSM-substituted text; both parts together stay
+        # within SMS_MAX_SEGMENTS
+        rest_segments = self.max_segments - count_segments(first_text)
+        remainder = ''
+        if rest_segments > 0:
+            remainder = self._clean_response_for_sms(self._sms_text(raw_text)[first_cut:], rest_segments)
+        if not remainder:
+            await save_stream_context(first_text)
+            return llm_response, first_result
+        
+        await save_stream_context(remainder)
+        rest_result = await self._send_sms_text(sms, remainder, user)
+        if not rest_result.get('success'):
+            self.logger.warning(f"Failed to send reply remainder to {sms.from_number}")
+        else:
+            self.logger.info(f"Sent reply remainder: {rest_result.get('message_sid')}")
+        
+        # Two SMS went out; each is stored as its own row so its status callbacks match
+        return llm_response, dict(first_result, parts=[(first_text, first_result), (remainder, rest_result)])
+    
+    # Generation settings shared by the streaming and non-streaming calls; num_predict is
+    # further capped by SMS_MAX_SEGMENTS in self.ollama_options
+    OLLAMA_OPTIONS = {
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "num_predict": 150,
+        "stop": ["\n\n", "User:", "Assistant:", "Human:"]
+    }
+    
+    async def _stream_ollama_api(self, prompt: str, user_id: int, context: Optional[List[int]] = None,
+                                 deadline: Optional[float] = None, full_prompt: Optional[str] = None):
+        """
+        Yield Ollama's NDJSON chunks; the last one has done=True, the token counts,
+        context and the tier/model/host that answered
+        """
+        self.logger.info(f"Streaming from Ollama at {self.ollama_base_url} for user {user_id}")
+        
+        async for chunk in self.llm.astream_hedged(prompt, options=self.ollama_options, deadline=deadline,
+                                                   hedge_prompt=full_prompt, context=context):
+            yield chunk
+    
+    async def _call_ollama_api(self, prompt: str, user_id: int, context: Optional[List[int]] = None,
+                               deadline: Optional[float] = None, full_prompt: Optional[str] = None) -> Dict[str, Any]:
+        try:
             self.logger.info(f"Calling Ollama at {self.ollama_base_url} for user {user_id}")
             
-            response = await self.http_client.post(
-                f"{self.ollama_base_url}/api/generate",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Ollama API error: {response.status_code} - {response.text}")
-            
-            result = response.json()
+            # Streamed under the hood so a primary that produces no token can be hedged
+            result = await self.llm.agenerate_hedged(prompt, options=self.ollama_options, deadline=deadline,
+                                                     hedge_prompt=full_prompt, context=context)
             
+            timings = result.get('timings') or {}
             self.logger.info(f"Ollama response received: {len(result.get('response', ''))} chars, "
-                           f"{result.get('eval_count', 0)} tokens")
+                           f"{result.get('eval_count', 0)} tokens at {timings.get('tokens_per_second')} tok/s "
+                           f"({result.get('tier')} tier, {result.get('model')} on {result.get('host')}; "
+                           f"queue {timings.get('queue_wait_seconds')}s, "
+                           f"prompt eval {timings.get('prompt_eval_seconds')}s, eval {timings.get('eval_seconds')}s)")
             
             return result
             
-        except httpx.TimeoutException:
-            self.logger.error(f"Ollama request timeout after {self.ollama_timeout}s")
-            raise Exception("LLM server timeout")
-        except httpx.ConnectError:
-            self.logger.error(f"Cannot connect to Ollama server at {self.ollama_base_url}")
-            raise Exception("LLM server unavailable")
-        except Exception as e:
+        except LLMError as e:
             self.logger.error(f"Ollama API call failed: {str(e)}")
             raise
     
-    def _clean_response_for_sms(self, response: str) -> str:
+    def _clean_response_for_sms(self, response: str, max_segments: Optional[int] = None) -> str:
         if not response:
             return ""
         
         response = response.replace("Assistant:", "").replace("AI:", "").strip()
         response = ' '.join(response.split())
         
-        if len(response) > 1500:
-            response = response[:1500] + "..."
-        
         response = ''.join(char for char in response if ord(char) >= 32 or char in '\n\r\t')
-        return response.strip()
+        response = self._sms_text(response)
+        return truncate_to_segments(response.strip(), self.max_segments if max_segments is None else max_segments)
+    
+    def _sms_text(self, text: str) -> str:
+        """text with non-GSM lookalikes replaced so the reply stays in 160-character segments"""
+        return to_gsm(text, drop_unencodable=self.gsm_only)
     
     async def _send_sms_response(self, original_sms: SMSMessage, llm_response: LLMResponse, user: Any) -> Dict[str, Any]:
+        return await self._send_sms_text(original_sms, llm_response.response_text, user)
+    
+    async def _send_sms_text(self, original_sms: SMSMessage, text: str, user: Any) -> Dict[str, Any]:
         try:
-            user_phone = await self._get_user_signalwire_number(user.id)
-            if not user_phone:
+            # Reply from the number the customer texted - it is the user's routed number
+            from_number = original_sms.to_number or getattr(user, 'phone_number', None)
+            if not from_number:
                 return {'success': False, 'error': 'No phone number configured for user'}
             
-            message = self.signalwire_client.messages.create(
-                from_=user_phone.phone_number,
+            # The REST client is blocking; keep it off the shared event loop
+            message = await asyncio.to_thread(
+                self.signalwire_client.messages.create,
+                from_=from_number,
                 to=original_sms.from_number,
-                body=llm_response.response_text[:1600]
+                body=text[:1600]
             )
             
             self.logger.info(f"Sent SMS response: {message.sid}")
@@ -320,44 +844,65 @@ class SMSConversationService:
     
     # Database operations with lazy imports
     async def _save_incoming_message(self, sms: SMSMessage, user: Any) -> Any:
-        db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
-        
-        message = Message(
+        # Committed before any reply is generated: the row is the receipt for queued
+        # mode and its unique MessageSid is the dedupe backstop
+        unit = UnitOfWork()
+        pending = unit.add_message(
+            sms.from_number,
             user_id=user.id,
             from_number=sms.from_number,
             to_number=sms.to_number,
             body=sms.body,
             direction='inbound',
-            provider='signalwire',
-            provider_message_id=sms.message_id,
-            status='received',
-            received_at=sms.timestamp
+            signalwire_message_sid=sms.message_id or None,
+            signalwire_status='received',
+            intent_category=self.intent_classifier.classify(sms.body).intent,
+            created_at=sms.timestamp
         )
+        unit.track_usage(user.id, 'sms_received', message=pending)
         
-        db.session.add(message)
-        db.session.commit()
-        return message
+        try:
+            await asyncio.to_thread(unit.commit)
+        except IntegrityError:
+            # Unique signalwire_message_sid - a concurrent retry stored it first
+            return None
+        return pending.instance
     
-    async def _save_outgoing_message(self, original_sms: SMSMessage, llm_response: LLMResponse, user: Any, send_result: Dict[str, Any]) -> Any:
-        db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
-        
-        message = Message(
-            user_id=user.id,
-            from_number=original_sms.to_number,
-            to_number=original_sms.from_number,
-            body=llm_response.response_text,
-            direction='outbound',
-            provider='signalwire',
-            provider_message_id=send_result.get('message_sid'),
-            status='sent' if send_result.get('success') else 'failed',
-            sent_at=send_result.get('sent_at', datetime.utcnow()),
-            tokens_used=llm_response.tokens_used,
-            processing_time=llm_response.processing_time
-        )
+    async def _save_outgoing_message(self, original_sms: SMSMessage, llm_response: LLMResponse, user: Any, send_result: Dict[str, Any]) -> None:
+        # Reply row, client counters and usage go out as one unit, group-committed
+        # with other replies finishing at the same time
+        unit = UnitOfWork()
+        # A streamed reply is sent as two SMS ('parts'); each gets its own row, SID and sms_sent
+        parts = send_result.get('parts') or [(llm_response.response_text, send_result)]
+        for index, (body, part_result) in enumerate(parts):
+            metadata = {'source': llm_response.source, **(llm_response.metadata or {})}
+            if len(parts) > 1:
+                metadata.update(part=index + 1, parts=len(parts))
+            pending = unit.add_message(
+                original_sms.from_number,
+                user_id=user.id,
+                from_number=original_sms.to_number,
+                to_number=original_sms.from_number,
+                body=body,
+                direction='outbound',
+                ai_generated=llm_response.source == 'llm',
+                ai_model=(llm_response.model or self.ollama_model) if llm_response.source == 'llm' else None,
+                ai_confidence_score=llm_response.confidence,
+                processing_time=llm_response.processing_time,
+                message_metadata=metadata,
+                signalwire_message_sid=part_result.get('message_sid'),
+                signalwire_status='sent' if part_result.get('success') else 'failed',
+                sent_at=part_result.get('sent_at', datetime.utcnow())
+            )
+            if part_result.get('success'):
+                unit.track_usage(user.id, 'sms_sent', message=pending)
+            if index == 0 and llm_response.source == 'llm' and llm_response.confidence > 0:
+                # One AI response however many SMS it took; canned fallback and template
+                # replies are not billed as AI responses
+                unit.track_usage(user.id, 'ai_response', message=pending, resource_type='ai_response')
         
-        db.session.add(message)
-        db.session.commit()
-        return message
+        # Wait for the commit so the next message in this conversation sees the reply
+        await asyncio.wrap_future(get_write_behind_buffer().submit(unit))
     
     async def _save_user_signalwire_config(self, user: Any, subproject: Dict[str, Any], phone_number: Dict[str, Any]) -> None:
         db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
@@ -382,6 +927,7 @@ class SMSConversationService:
         db.session.add(sw_phone)
         
         db.session.commit()
+        invalidate_phone_route(phone_number['phone_number'], phone_number['sid'])
     
     # Utility methods
     def _parse_webhook_sms(self, webhook_data: Dict[str, Any]) -> SMSMessage:
@@ -390,58 +936,71 @@ class SMSConversationService:
             to_number=webhook_data.get('To', ''),
             body=webhook_data.get('Body', ''),
             message_id=webhook_data.get('MessageSid', ''),
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            deadline=time.time() + self.reply_sla_seconds if self.reply_sla_seconds > 0 else None
         )
     
     async def _find_user_by_phone_number(self, phone_number: str) -> Optional[Any]:
-        db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
-        
-        sw_phone = SignalWirePhoneNumber.query.filter_by(
-            phone_number=phone_number,
-            status='active'
-        ).first()
-        
-        if sw_phone:
-            return User.query.get(sw_phone.user_id)
-        return None
+        # Cached PhoneRoute - exposes id, username, first_name and ai_enabled like a User
+        return await asyncio.to_thread(resolve_phone_route, phone_number)
     
     async def _get_user_signalwire_number(self, user_id: int) -> Optional[Any]:
         db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
         
-        return SignalWirePhoneNumber.query.filter_by(
-            user_id=user_id,
-            status='active'
-        ).first()
+        return await asyncio.to_thread(
+            SignalWirePhoneNumber.query.filter_by(user_id=user_id, status='active').first
+        )
     
-    async def _get_conversation_history(self, user_id: int, from_number: str, limit: int = 10) -> List[Any]:
+    async def _get_conversation_history(self, user_id: int, from_number: str, limit: int = 10,
+                                        exclude_ids: Optional[List[int]] = None) -> List[Any]:
         db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
         
-        messages = Message.query.filter_by(user_id=user_id).filter(
+        query = Message.query.filter_by(user_id=user_id).filter(
             (Message.from_number == from_number) | 
             (Message.to_number == from_number)
-        ).order_by(Message.created_at.desc()).limit(limit).all()
+        )
+        if exclude_ids:
+            query = query.filter(~Message.id.in_(exclude_ids))
+        
+        messages = await asyncio.to_thread(query.order_by(Message.created_at.desc()).limit(limit).all)
         
         return list(reversed(messages))
     
-    def _build_llm_prompt(self, sms: SMSMessage, user: Any, conversation_history: List[Any]) -> str:
+    async def _get_conversation_summary(self, user_id: int, from_number: str) -> tuple:
+        """(rolling summary or None, number of messages it does not cover)"""
+        from app.models import Client
+        
+        row = await asyncio.to_thread(Client.query.with_entities(
+            Client.conversation_summary, Client.total_messages, Client.summary_message_count
+        ).filter_by(user_id=user_id, phone_number=from_number).first)
+        if not row or not row.conversation_summary:
+            return None, 0
+        return row.conversation_summary, (row.total_messages or 0) - (row.summary_message_count or 0)
+    
+    def _build_llm_prompt(self, sms: SMSMessage, user: Any, conversation_history: List[Any],
+                          summary: Optional[str] = None) -> str:
         user_name = user.first_name or user.username or "the user"
+        current_message = self.prompt_builder.fit_message(sms.body, self.prompt_builder.budget // 2)
+        summary = self.prompt_builder.fit_message(summary, self.prompt_builder.budget // 4) if summary else ''
         
-        context_messages = []
-        for msg in conversation_history[-5:]:
-            if msg.direction == 'inbound':
-                context_messages.append(f"Human: {msg.body}")
-            else:
-                context_messages.append(f"Assistant: {msg.body}")
+        # Instructions, summary and the current message are reserved first; history fills what is left, newest first
+        history = [('Human' if msg.direction == 'inbound' else 'Assistant', msg.body or '')
+                   for msg in conversation_history]
+        reserved = self._render_llm_prompt(user_name, summary, '', sms.from_number, current_message)
+        context_messages = [f"{role}: {text}" for role, text in self.prompt_builder.pack_history(reserved, history)]
         
         conversation_context = "\n".join(context_messages) if context_messages else ""
-        
+        return self._render_llm_prompt(user_name, summary, conversation_context, sms.from_number, current_message)
+    
+    def _render_llm_prompt(self, user_name: str, summary: str, conversation_context: str, from_number: str,
+                           current_message: str) -> str:
         prompt = f"""You are a helpful AI assistant responding to SMS text messages for {user_name}.
 
-{f"Previous conversation:{chr(10)}{conversation_context}{chr(10)}" if conversation_context else ""}Current message from {sms.from_number}: {sms.body}
+{f"Summary of the earlier conversation:{chr(10)}{summary}{chr(10)}{chr(10)}" if summary else ""}{f"Previous conversation:{chr(10)}{conversation_context}{chr(10)}" if conversation_context else ""}Current message from {from_number}: {current_message}
 
 Instructions:
 - Respond naturally and helpfully in a conversational tone
-- Keep responses under 160 characters when possible (this is SMS)
+- Keep responses under {segment_char_budget(self.target_segments)} characters when possible (this is SMS)
 - Be friendly but concise
 - Don't mention that this is SMS or text messaging
 - Don't use excessive punctuation or emojis
@@ -451,28 +1010,38 @@ Response:"""
         
         return prompt
     
+    def _build_followup_prompt(self, sms: SMSMessage) -> str:
+        # The instructions and earlier turns are already in the reused context
+        current_message = self.prompt_builder.fit_message(sms.body, self.prompt_builder.budget // 2)
+        return f"""Current message from {sms.from_number}: {current_message}
+
+Response:"""
+    
     async def health_check(self) -> Dict[str, Any]:
         checks = {}
         
         try:
-            response = await self.http_client.get(f"{self.ollama_base_url}/api/tags", timeout=5.0)
+            started = datetime.utcnow()
+            tags = await self.llm.atags(timeout=5.0)
             checks['ollama'] = {
-                'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-                'response_time': response.elapsed.total_seconds() if hasattr(response, 'elapsed') else 0,
-                'models_available': len(response.json().get('models', [])) if response.status_code == 200 else 0
+                'status': 'healthy',
+                'response_time': (datetime.utcnow() - started).total_seconds(),
+                'models_available': len(tags.get('models', []))
             }
         except Exception as e:
             checks['ollama'] = {'status': 'unhealthy', 'error': str(e)}
+        checks['ollama']['backends'] = self.llm.router.status()
+        checks['ollama']['circuit_breaker'] = self.llm.breaker.status()
         
         try:
-            self.signalwire_client.api.accounts.list(limit=1)
+            await asyncio.to_thread(self.signalwire_client.api.accounts.list, limit=1)
             checks['signalwire'] = {'status': 'healthy', 'account_connected': True}
         except Exception as e:
             checks['signalwire'] = {'status': 'unhealthy', 'error': str(e)}
         
         try:
             db, User, Message, SignalWireSubproject, SignalWirePhoneNumber = self._lazy_imports()
-            db.session.execute('SELECT 1')
+            await asyncio.to_thread(db.session.execute, 'SELECT 1')
             checks['database'] = {'status': 'healthy'}
         except Exception as e:
             checks['database'] = {'status': 'unhealthy', 'error': str(e)}
@@ -481,56 +1050,60 @@ Response:"""
         
         return {
             'overall_status': overall_status,
+            # Replies are answered from fallback templates or deferred until the breaker closes
+            'degraded': checks['ollama']['circuit_breaker']['state'] != 'closed',
             'checks': checks,
             'timestamp': datetime.utcnow().isoformat()
         }
     
     async def cleanup(self):
-        await self.http_client.aclose()
+        await self.llm.aclose()
 
 # Flask routes
 def register_sms_routes(app):
+    from app.utils.async_runner import run_async
+    
     sms_service = SMSConversationService()
     
     @app.route('/api/sms/webhook/user/<int:user_id>', methods=['POST'])
     def handle_sms_webhook(user_id):
         from flask import request
-        import asyncio
         
-        webhook_data = request.get_json() or request.form.to_dict()
+        webhook_data = request.get_json(silent=True) or request.form.to_dict()
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(sms_service.handle_incoming_sms_webhook(webhook_data))
-        finally:
-            loop.close()
+        if sms_service.webhook_mode == 'queued':
+            handler = sms_service.accept_incoming_sms_webhook(webhook_data)
+        else:
+            handler = sms_service.handle_incoming_sms_webhook(webhook_data)
+        
+        result = run_async(handler, app=app)
+        
+        if result.get('duplicate') or (sms_service.webhook_mode == 'queued' and result['success']):
+            # Empty TwiML acknowledges receipt so SignalWire does not retry
+            twiml_response = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+            return twiml_response, 200, {'Content-Type': 'text/xml'}
+        
+        return result, 200 if result['success'] else 400
+    
+    @app.route('/api/sms/status/user/<int:user_id>', methods=['POST'])
+    def handle_sms_status_callback(user_id):
+        from flask import request
         
+        webhook_data = request.get_json(silent=True) or request.form.to_dict()
+        result = run_async(sms_service.handle_status_callback(webhook_data), app=app)
         return result, 200 if result['success'] else 400
     
     @app.route('/api/sms/setup-user/<int:user_id>', methods=['POST'])
     def setup_user_sms(user_id):
-        import asyncio
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(sms_service.setup_user_signalwire(user_id))
-        finally:
-            loop.close()
-            
+        result = run_async(sms_service.setup_user_signalwire(user_id), app=app)
         return result, 200 if result['success'] else 400
     
     @app.route('/api/sms/health', methods=['GET'])
     def sms_health_check():
-        import asyncio
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            health_status = loop.run_until_complete(sms_service.health_check())
-        finally:
-            loop.close()
-            
+        health_status = run_async(sms_service.health_check(), app=app)
         status_code = 200 if health_status['overall_status'] == 'healthy' else 503
-        return health_status, status_code
\ No newline at end of file
+        return health_status, status_code
+    
+    @app.route('/api/sms/metrics', methods=['GET'])
+    def sms_metrics():
+        return render_prometheus(), 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
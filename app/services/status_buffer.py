@@ -0,0 +1,216 @@
+# app/services/status_buffer.py
+"""
+Buffered SignalWire delivery status callbacks
+Every outbound SMS produces several callbacks (queued, sent, delivered...).
+Callbacks are appended to a Redis list and applied periodically as one
+UPDATE ... FROM (VALUES ...) per batch instead of one transaction each.
+Callbacks can arrive out of order, so a status only replaces one of a lower
+rank and a late 'sent' never overwrites 'delivered'.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+
+from app.extensions import db, get_redis
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUE_KEY = 'sms:status:pending'
+
+# Lifecycle order of an outbound message; terminal states share the top rank
+STATUS_RANK = {
+    'accepted': 1,
+    'queued': 1,
+    'sending': 2,
+    'sent': 3,
+    'delivered': 4,
+    'undelivered': 4,
+    'failed': 4,
+}
+
+
+def status_rank(status: Optional[str]) -> int:
+    return STATUS_RANK.get((status or '').lower(), 0)
+
+
+class StatusCallbackBuffer:
+    """Collects status callbacks and applies them in bulk"""
+
+    def __init__(self):
+        self.batch_size = int(os.getenv('STATUS_FLUSH_BATCH_SIZE', '2000'))
+        self.chunk_size = int(os.getenv('STATUS_UPDATE_CHUNK_SIZE', '500'))
+        # Callbacks can beat the outbound row's commit; retry those a few flushes later
+        self.max_attempts = int(os.getenv('STATUS_MAX_ATTEMPTS', '3'))
+
+    def append(self, message_sid: str, status: str, error_code: str = None,
+               error_message: str = None) -> bool:
+        """
+        Buffer one callback
+        Without Redis the update is applied immediately (still rank-guarded)
+        """
+        entry = {
+            'sid': message_sid,
+            'status': status.lower(),
+            'error_code': error_code,
+            'error_message': error_message,
+            'at': datetime.utcnow().isoformat(),
+            'attempts': 0
+        }
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                redis_client.rpush(STATUS_QUEUE_KEY, json.dumps(entry))
+                return True
+            except Exception as e:
+                logger.warning(f"Failed to buffer status callback for {message_sid}: {e}")
+
+        self.apply([entry])
+        return False
+
+    def flush(self) -> Dict[str, int]:
+        """Apply up to batch_size buffered callbacks; called from the beat task"""
+        redis_client = get_redis()
+        if redis_client is None:
+            return {'received': 0, 'updated': 0, 'requeued': 0}
+
+        # LRANGE + LTRIM in one MULTI so concurrent flushers take disjoint batches
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.lrange(STATUS_QUEUE_KEY, 0, self.batch_size - 1)
+        pipe.ltrim(STATUS_QUEUE_KEY, self.batch_size, -1)
+        raw_entries = pipe.execute()[0]
+
+        entries, valid_raw = [], []
+        for raw in raw_entries:
+            try:
+                entries.append(json.loads(raw))
+                valid_raw.append(raw)
+            except (TypeError, ValueError):
+                logger.warning(f"Dropping malformed status callback: {raw!r}")
+
+        try:
+            result = self.apply(entries)
+        except Exception:
+            # The batch is already trimmed off the list; put it back for the next flush
+            # (order does not matter, updates are rank-guarded)
+            if valid_raw:
+                redis_client.rpush(STATUS_QUEUE_KEY, *valid_raw)
+                logger.warning(f"Requeued {len(valid_raw)} status callbacks after a failed flush")
+            raise
+
+        if result['missing']:
+            retry = [entry for entry in result['missing'] if entry['attempts'] + 1 < self.max_attempts]
+            if retry:
+                pipe = redis_client.pipeline()
+                for entry in retry:
+                    entry['attempts'] += 1
+                    pipe.rpush(STATUS_QUEUE_KEY, json.dumps(entry))
+                pipe.execute()
+            result['requeued'] = len(retry)
+
+        return {'received': len(entries), 'updated': result['updated'], 'requeued': result.get('requeued', 0)}
+
+    def apply(self, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Apply callbacks with bulk UPDATEs
+        Returns the number of rows updated and the entries whose message is not stored yet
+        """
+        latest = _collapse(entries)
+        if not latest:
+            return {'updated': 0, 'missing': []}
+
+        updated_sids = set()
+        try:
+            rows = list(latest.values())
+            for start in range(0, len(rows), self.chunk_size):
+                updated_sids.update(self._update_chunk(rows[start:start + self.chunk_size]))
+
+            pending = [sid for sid in latest if sid not in updated_sids]
+            existing = self._existing_sids(pending) if pending else set()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Bulk status update failed for {len(latest)} messages: {e}")
+            raise
+
+        # Rows that exist but were not updated already hold an equal or later status
+        missing = [latest[sid] for sid in pending if sid not in existing]
+        logger.info(f"Applied {len(updated_sids)} status updates "
+                    f"({len(entries)} callbacks, {len(missing)} for unknown messages)")
+        return {'updated': len(updated_sids), 'missing': missing}
+
+    def _update_chunk(self, rows: List[Dict[str, Any]]) -> List[str]:
+        values = []
+        params = {}
+        for i, row in enumerate(rows):
+            values.append(
+                f"(:sid_{i}, :status_{i}, CAST(:rank_{i} AS integer), CAST(:code_{i} AS varchar), "
+                f"CAST(:msg_{i} AS text), CAST(:delivered_{i} AS timestamp), CAST(:at_{i} AS timestamp))"
+            )
+            params.update({
+                f'sid_{i}': row['sid'],
+                f'status_{i}': row['status'],
+                f'rank_{i}': status_rank(row['status']),
+                f'code_{i}': row.get('error_code'),
+                f'msg_{i}': row.get('error_message'),
+                f'delivered_{i}': row['at'] if row['status'] == 'delivered' else None,
+                f'at_{i}': row['at'],
+            })
+
+        rank_case = ' '.join(
+            f"WHEN '{status}' THEN {rank}" for status, rank in STATUS_RANK.items()
+        )
+
+        statement = text(f"""
+            UPDATE messages AS m SET
+                signalwire_status = v.status,
+                signalwire_error_code = COALESCE(v.error_code, m.signalwire_error_code),
+                signalwire_error_message = COALESCE(v.error_message, m.signalwire_error_message),
+                delivered_at = COALESCE(m.delivered_at, v.delivered_at),
+                updated_at = v.updated_at
+            FROM (VALUES {', '.join(values)})
+                AS v(sid, status, rank, error_code, error_message, delivered_at, updated_at)
+            WHERE m.signalwire_message_sid = v.sid
+              AND (CASE lower(m.signalwire_status) {rank_case} ELSE 0 END) < v.rank
+            RETURNING m.signalwire_message_sid
+        """)
+
+        return list(db.session.execute(statement, params).scalars())
+
+    def _existing_sids(self, sids: List[str]) -> set:
+        statement = text(
+            "SELECT signalwire_message_sid FROM messages WHERE signalwire_message_sid IN :sids"
+        ).bindparams(bindparam('sids', expanding=True))
+        return set(db.session.execute(statement, {'sids': sids}).scalars())
+
+
+def _collapse(entries: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Keep the highest-ranked callback per message (the first one wins within a rank, as in SQL)"""
+    latest: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        sid = entry.get('sid')
+        if not sid or status_rank(entry.get('status')) == 0:
+            continue
+        current = latest.get(sid)
+        if current is None or status_rank(entry['status']) > status_rank(current['status']):
+            latest[sid] = entry
+    return latest
+
+
+# Per-process buffer
+_status_buffer = StatusCallbackBuffer()
+
+
+def get_status_buffer() -> StatusCallbackBuffer:
+    return _status_buffer
+
+
+def buffer_status_callback(message_sid: str, status: str, error_code: str = None,
+                           error_message: str = None) -> bool:
+    """Queue a delivery status callback; returns False if it was applied inline"""
+    return _status_buffer.append(message_sid, status, error_code, error_message)
@@ -10,6 +10,7 @@ from app.models.user import User
 from app.models.billing import Subscription, SubscriptionPlan, PaymentMethod
 from app.services.sms_conversation_service import SMSConversationService
 from app.services.payment_processor import PaymentProcessor
+from app.services.phone_routing import invalidate_phone_route
 
 logger = logging.getLogger(__name__)
 
@@ -268,6 +269,7 @@ class TrialMembershipService:
             user.trial_signalwire_setup = True
             
             db.session.commit()
+            invalidate_phone_route(selected_phone_number)
             
             # Create success notification
             cls.create_trial_notification(
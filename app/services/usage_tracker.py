@@ -8,6 +8,7 @@ from typing import Dict, List, Any, Optional
 from sqlalchemy import func, and_, or_
 from app.extensions import db
 from app.models.billing import Subscription, UsageRecord
+from app.utils.sms_segments import count_segments
 
 
 
@@ -418,10 +419,8 @@ class UsageTracker:
     @classmethod
     def _calculate_sms_credits(cls, message_content: str) -> int:
         """Calculate SMS credits needed based on message content"""
-        # Basic calculation: 1 credit per 160 characters (SMS segment)
-        message_length = len(message_content)
-        segments = (message_length // 160) + (1 if message_length % 160 > 0 else 0)
-        return max(1, segments)  # Minimum 1 credit
+        # 1 credit per billed segment: 160/153 GSM-7 characters, 70/67 when the text needs UCS-2
+        return max(1, count_segments(message_content or ''))  # Minimum 1 credit
     
     @classmethod
     def _calculate_ai_credits(cls, prompt_tokens: int, response_tokens: int) -> int:
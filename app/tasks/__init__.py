@@ -99,6 +99,40 @@ except ImportError as e:
     check_trial_status_daily = None
     TRIAL_CELERY_BEAT_SCHEDULE = {}
 
+# SMS Tasks Import
+try:
+    from .sms_tasks import (
+        process_sms_reply,
+        enqueue_sms_reply,
+        flush_status_callbacks,
+        summarize_conversation,
+        keep_llm_warm,
+        SMS_CELERY_BEAT_SCHEDULE
+    )
+    
+    # Add to exports
+    _all_tasks.extend([
+        'process_sms_reply',
+        'flush_status_callbacks',
+        'summarize_conversation',
+        'keep_llm_warm'
+    ])
+    
+    # Merge beat schedule
+    _beat_schedules.update(SMS_CELERY_BEAT_SCHEDULE)
+    _imported_modules.append('sms_tasks')
+    
+    logging.info("✅ SMS tasks imported successfully")
+    
+except ImportError as e:
+    logging.error(f"❌ Could not import SMS tasks: {e}")
+    process_sms_reply = None
+    enqueue_sms_reply = None
+    flush_status_callbacks = None
+    summarize_conversation = None
+    keep_llm_warm = None
+    SMS_CELERY_BEAT_SCHEDULE = {}
+
 # Background Tasks Import (optional)
 try:
     from .background_tasks import (
@@ -186,6 +220,17 @@ def check_task_availability() -> Dict[str, bool]:
     for task in trial_tasks:
         task_status[task] = globals().get(task) is not None
     
+    # Check SMS tasks
+    sms_tasks = [
+        'process_sms_reply',
+        'flush_status_callbacks',
+        'summarize_conversation',
+        'keep_llm_warm'
+    ]
+    
+    for task in sms_tasks:
+        task_status[task] = globals().get(task) is not None
+    
     # Check background tasks
     background_tasks = [
         'cleanup_old_messages',
@@ -278,7 +323,7 @@ def run_task_diagnostics() -> Dict[str, Any]:
         diagnostics['timestamp'] = datetime.utcnow().isoformat()
         
         # Check module imports
-        for module in ['email_tasks', 'trial_tasks', 'background_tasks']:
+        for module in ['email_tasks', 'trial_tasks', 'sms_tasks', 'background_tasks']:
             if module in _imported_modules:
                 diagnostics['modules'][module] = 'imported'
             else:
@@ -336,6 +381,7 @@ __all__ = _all_tasks + [
     'CONSOLIDATED_BEAT_SCHEDULE',
     'EMAIL_CELERY_BEAT_SCHEDULE',
     'TRIAL_CELERY_BEAT_SCHEDULE',
+    'SMS_CELERY_BEAT_SCHEDULE',
     'BACKGROUND_CELERY_BEAT_SCHEDULE',
 ]
 
@@ -2,6 +2,7 @@
 from app.models.user import User
 from app.models.billing import UsageRecord
 from app.services.signalwire_service import SignalWireService
+from app.services.phone_routing import invalidate_user_routes
 from app.extensions import db
 
 from celery import Celery
@@ -234,6 +235,7 @@ def check_usage_limits(user_id: int):
             if ai_usage >= ai_limit and user.ai_enabled:
                 user.ai_enabled = False
                 db.session.commit()
+                invalidate_user_routes(user)
                 send_usage_warning.delay(user_id, 'limit_exceeded', usage_percentage, ai_usage, ai_limit)
                 logger.warning(f"AI disabled for user {user_id} - limit exceeded")
             
@@ -324,6 +326,7 @@ def cleanup_expired_trials():
             ).all()
             
             cleanup_count = 0
+            disabled_users = []
             
             for user in expired_users:
                 # Check if user has upgraded to paid plan
@@ -335,6 +338,7 @@ def cleanup_expired_trials():
                     # Disable AI for expired trial users
                     if user.ai_enabled:
                         user.ai_enabled = False
+                        disabled_users.append(user)
                         
                     # Optionally disable phone number (or transfer to paid pool)
                     # This depends on your business logic
@@ -346,6 +350,8 @@ def cleanup_expired_trials():
                     continue
             
             db.session.commit()
+            for user in disabled_users:
+                invalidate_user_routes(user)
             
             logger.info(f"Cleaned up {cleanup_count} expired trial accounts")
             
@@ -0,0 +1,218 @@
+# app/tasks/sms_tasks.py
+"""
+SMS reply tasks for AssisText
+Generates and sends AI replies for inbound messages accepted by the SMS webhook
+"""
+
+import logging
+import os
+import zlib
+from typing import Dict, Any, List, Optional
+
+from app.celery_app import celery_app
+from app.utils.async_runner import run_async
+
+logger = logging.getLogger(__name__)
+
+SMS_REPLY_QUEUE = 'sms_replies'
+# Conversation summaries are background work; keep them off the reply partitions
+SMS_SUMMARY_QUEUE = 'sms_summaries'
+# Periodic beat work (status callback flushes, LLM keep-alive); nothing consumes plain sms_replies in production
+SMS_MAINTENANCE_QUEUE = 'sms_maintenance'
+
+# Replies are partitioned by conversation across sms_replies.0 .. sms_replies.N-1.
+# Run each partition queue on a single-concurrency worker, e.g.
+#   celery -A app.celery_app worker -Q sms_replies.3 -c 1
+# so messages within a conversation are processed in order while different
+# conversations proceed in parallel on other partitions. Summaries and beat
+# work run on their own worker:
+#   celery -A app.celery_app worker -Q sms_summaries,sms_maintenance
+SMS_REPLY_PARTITIONS = int(os.getenv('SMS_REPLY_PARTITIONS', '8'))
+
+# One Flask app and one SMS service per worker process, created on first use
+_flask_app = None
+_sms_service = None
+
+
+def _get_flask_app():
+    """Create the Flask app lazily so tasks run inside an application context"""
+    global _flask_app
+    if _flask_app is None:
+        from app import create_app
+        _flask_app = create_app()
+    return _flask_app
+
+
+def _get_sms_service():
+    global _sms_service
+    if _sms_service is None:
+        from app.services.sms_conversation_service import SMSConversationService
+        _sms_service = SMSConversationService()
+    return _sms_service
+
+
+def _jump_consistent_hash(key: int, num_buckets: int) -> int:
+    """Lamping & Veach jump hash - only ~1/N keys move when a partition is added"""
+    bucket, j = -1, 0
+    while j < num_buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def conversation_partition(user_id: int, from_number: str) -> int:
+    """Stable partition for a (user, sender) conversation - identical in every process"""
+    key = zlib.crc32(f"{user_id}:{from_number}".encode())
+    return _jump_consistent_hash(key, max(1, SMS_REPLY_PARTITIONS))
+
+
+def conversation_queue(user_id: int, from_number: str) -> str:
+    return f"{SMS_REPLY_QUEUE}.{conversation_partition(user_id, from_number)}"
+
+
+def sms_reply_queues() -> List[str]:
+    """All partition queue names, for worker -Q options"""
+    return [f"{SMS_REPLY_QUEUE}.{i}" for i in range(max(1, SMS_REPLY_PARTITIONS))]
+
+
+def enqueue_sms_reply(sms_payload: Dict[str, Any], incoming_message_id: int,
+                      burst_seq: Optional[int] = None, countdown: Optional[float] = None) -> Optional[str]:
+    """
+    Queue reply generation for a stored inbound message
+    With debouncing, countdown delays the task until the burst window closes
+    Returns the Celery task ID
+    """
+    queue = conversation_queue(sms_payload['user_id'], sms_payload['from_number'])
+    result = process_sms_reply.apply_async(
+        args=[sms_payload, incoming_message_id],
+        kwargs={'burst_seq': burst_seq},
+        queue=queue,
+        countdown=countdown
+    )
+    logger.info(f"Queued SMS reply for message {incoming_message_id} on {queue} (task {result.id})")
+    return result.id
+
+
+# =============================================================================
+# REPLY PROCESSING
+# =============================================================================
+
+@celery_app.task(bind=True, name='app.tasks.sms_tasks.process_sms_reply', max_retries=3)
+def process_sms_reply(self, sms_payload, incoming_message_id, burst_seq=None):
+    """
+    Generate the LLM reply for an inbound SMS and send it via SignalWire
+    The inbound message has already been stored by the webhook
+    """
+    try:
+        service = _get_sms_service()
+        result = run_async(
+            service.process_queued_sms_reply(sms_payload, incoming_message_id, burst_seq),
+            app=_get_flask_app()
+        )
+
+        if result.get('coalesced'):
+            logger.info(f"Message {incoming_message_id} answered by a later reply in its burst")
+        elif result.get('success'):
+            logger.info(f"✅ Replied to message {incoming_message_id} "
+                        f"(sent: {result.get('response_sent')})")
+        else:
+            logger.warning(f"⚠️ Reply for message {incoming_message_id} failed: {result.get('error')}")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ SMS reply task failed for message {incoming_message_id}: {e}")
+
+        # Errors raised here happen before anything is sent (the service catches
+        # generation and send failures itself), so retrying cannot double-send
+        if self.request.retries < self.max_retries:
+            retry_delay = 2 ** self.request.retries * 5  # 5, 10, 20 seconds
+            raise self.retry(countdown=retry_delay, exc=e)
+
+        return {'success': False, 'error': str(e)}
+
+
+# =============================================================================
+# STATUS CALLBACKS
+# =============================================================================
+
+@celery_app.task(name='app.tasks.sms_tasks.flush_status_callbacks')
+def flush_status_callbacks():
+    """Apply buffered delivery status callbacks with bulk UPDATEs"""
+    from app.services.status_buffer import get_status_buffer
+
+    try:
+        with _get_flask_app().app_context():
+            result = get_status_buffer().flush()
+
+        if result['received']:
+            logger.info(f"📬 Flushed {result['received']} status callbacks "
+                        f"({result['updated']} updated, {result['requeued']} requeued)")
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ Status callback flush failed: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+# =============================================================================
+# CONVERSATION SUMMARIES
+# =============================================================================
+
+@celery_app.task(name='app.tasks.sms_tasks.summarize_conversation')
+def summarize_conversation(client_id):
+    """Fold a client's older messages into its rolling conversation summary"""
+    from app.services.conversation_summary import (
+        ConversationSummaryService, SUMMARY_EVERY, clear_summary_pending, schedule_summary
+    )
+
+    try:
+        with _get_flask_app().app_context():
+            result = ConversationSummaryService().update_summary(client_id)
+
+    except Exception as e:
+        logger.error(f"❌ Conversation summary failed for client {client_id}: {e}")
+        return {'success': False, 'error': str(e)}
+
+    finally:
+        clear_summary_pending(client_id)
+
+    # A large backlog is worked off one bounded batch at a time
+    if result.get('remaining', 0) >= SUMMARY_EVERY:
+        schedule_summary(client_id)
+    return result
+
+
+# =============================================================================
+# LLM KEEP-ALIVE
+# =============================================================================
+
+@celery_app.task(name='app.tasks.sms_tasks.keep_llm_warm')
+def keep_llm_warm():
+    """Ping the LLM models with an explicit keep_alive so they stay loaded during business hours"""
+    from app.services.llm_warmup import LLMWarmupService
+
+    try:
+        return LLMWarmupService().keep_alive_tick()
+    except Exception as e:
+        logger.error(f"❌ LLM keep-alive failed: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+# =============================================================================
+# CELERY BEAT SCHEDULE
+# =============================================================================
+
+SMS_CELERY_BEAT_SCHEDULE = {
+    'flush-status-callbacks': {
+        'task': 'app.tasks.sms_tasks.flush_status_callbacks',
+        'schedule': float(os.getenv('STATUS_FLUSH_INTERVAL', '5')),  # seconds
+        'options': {'queue': SMS_MAINTENANCE_QUEUE}
+    },
+    'keep-llm-warm': {
+        'task': 'app.tasks.sms_tasks.keep_llm_warm',
+        'schedule': float(os.getenv('LLM_KEEPALIVE_INTERVAL', '240')),  # seconds
+        'options': {'queue': SMS_MAINTENANCE_QUEUE, 'expires': 60}
+    }
+}
@@ -0,0 +1,122 @@
+# app/utils/async_runner.py
+"""
+Long-lived asyncio event loop for sync callers
+Flask views and Celery tasks submit coroutines to one loop per worker process,
+so async clients (and their keep-alive connection pools) outlive a single request
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLoopRunner:
+    """Runs an asyncio event loop forever on a daemon thread"""
+
+    def __init__(self, name: str = 'assistext-async-loop'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def is_running(self) -> bool:
+        # A loop inherited through fork() has no thread behind it in the child
+        return (self._pid == os.getpid() and
+                self._thread is not None and
+                self._thread.is_alive())
+
+    def start(self) -> None:
+        """Start the loop thread if it is not already running in this process"""
+        if self.is_running():
+            return
+
+        with self._lock:
+            if self.is_running():
+                return
+
+            started = threading.Event()
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._run_loop,
+                args=(self._loop, started),
+                name=self.name,
+                daemon=True
+            )
+            self._thread.start()
+            started.wait()
+            self._pid = os.getpid()
+
+            logger.info(f"Started event loop thread {self.name} (pid {self._pid})")
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None, app: Any = None) -> Any:
+        """
+        Run a coroutine on the shared loop and block until it finishes
+        Pass the Flask app when the coroutine needs an application context
+        """
+        self.start()
+
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncLoopRunner.run() called from inside its own loop")
+
+        if app is not None:
+            coro = _with_app_context(app, coro)
+
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the loop and join the thread"""
+        if not self.is_running():
+            return
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"Stopped event loop thread {self.name}")
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, started: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+
+async def _with_app_context(app: Any, coro: Awaitable) -> Any:
+    # Each task gets its own context copy, so concurrent coroutines get their
+    # own app context and therefore their own SQLAlchemy session
+    with app.app_context():
+        return await coro
+
+
+# Per-process runner instance
+_runner = AsyncLoopRunner()
+atexit.register(_runner.stop)
+
+
+def get_async_runner() -> AsyncLoopRunner:
+    """Get the per-process async loop runner"""
+    return _runner
+
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None, app: Any = None) -> Any:
+    """Run a coroutine on the per-process loop from synchronous code"""
+    return _runner.run(coro, timeout=timeout, app=app)
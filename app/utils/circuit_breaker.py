@@ -0,0 +1,197 @@
+# app/utils/circuit_breaker.py
+"""
+Circuit breaker for calls to a flaky dependency (the LLM backend)
+
+  closed     calls go through; outcomes are recorded over a rolling window
+  open       calls are rejected immediately for open_seconds
+  half_open  one trial call goes through; success closes, failure re-opens
+
+A call counts as failed when it raises or takes longer than slow_call_seconds.
+The breaker opens after consecutive_failures failures in a row, or when at
+least failure_rate of the last `window` calls failed (once min_calls are in).
+
+State is per process, like the LLM router's host health: every worker finds
+out for itself, which for a dead backend takes a handful of fast failures.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from app.utils.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker with error-rate and latency thresholds"""
+
+    def __init__(self, name: str, consecutive_failures: int = 5, failure_rate: float = 0.5,
+                 window: int = 20, min_calls: int = 5, slow_call_seconds: float = 0,
+                 open_seconds: float = 30):
+        self.name = name
+        self.consecutive_failures = consecutive_failures
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds  # 0 disables the latency threshold
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a failed or slow call
+        self._failures_in_row = 0
+        self._opened_at = 0.0
+        self._trial_started: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._rejected = 0
+
+    # =========================================================================
+    # GATING
+    # =========================================================================
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; in half-open this claims the trial slot"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._trial_free():
+                self._trial_started = time.monotonic()
+                return True
+            self._rejected += 1
+        incr('circuit_breaker_rejected_total', labels={'breaker': self.name})
+        return False
+
+    def available(self) -> bool:
+        """Like allow() but claims nothing - for skipping work that would end in a call"""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._trial_free())
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a trial call through (0 when it already would)"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    # =========================================================================
+    # OUTCOMES
+    # =========================================================================
+
+    def record_success(self, latency: float = 0.0) -> None:
+        if self.slow_call_seconds and latency > self.slow_call_seconds:
+            self.record_failure(f"slow call ({latency:.1f}s)")
+            return
+
+        with self._lock:
+            self._failures_in_row = 0
+            self._outcomes.append(False)
+            if self._current_state() != CLOSED:
+                # The trial call, or a direct probe while open, got through
+                self._transition(CLOSED)
+
+    def record_failure(self, error: str = None) -> None:
+        with self._lock:
+            self._failures_in_row += 1
+            self._outcomes.append(True)
+            self._last_error = error
+
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._transition(OPEN)
+            elif state == CLOSED and self._should_open():
+                self._transition(OPEN)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._transition(CLOSED)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            failed = sum(self._outcomes)
+            return {
+                'name': self.name,
+                'state': state,
+                'failure_rate': round(failed / len(self._outcomes), 3) if self._outcomes else 0.0,
+                'calls_in_window': len(self._outcomes),
+                'consecutive_failures': self._failures_in_row,
+                'retry_after': round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+                if state == OPEN else 0.0,
+                'rejected': self._rejected,
+                'last_error': self._last_error,
+            }
+
+    # =========================================================================
+    # INTERNALS (caller holds the lock)
+    # =========================================================================
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() >= self._opened_at + self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _trial_free(self) -> bool:
+        # A trial whose outcome was never recorded (cancelled caller) frees up after open_seconds
+        return self._trial_started is None or time.monotonic() - self._trial_started >= self.open_seconds
+
+    def _should_open(self) -> bool:
+        if self._failures_in_row >= self.consecutive_failures:
+            return True
+        if len(self._outcomes) < self.min_calls:
+            return False
+        return sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        previous, self._state = self._state, state
+        self._trial_started = None
+
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            logger.warning(f"🔴 Circuit '{self.name}' opened for {self.open_seconds:.0f}s: {self._last_error}")
+        elif state == CLOSED:
+            self._outcomes.clear()
+            self._failures_in_row = 0
+            logger.info(f"🟢 Circuit '{self.name}' closed")
+        else:
+            logger.info(f"🟡 Circuit '{self.name}' half-open, allowing a trial call")
+
+        incr('circuit_breaker_transitions_total', labels={'breaker': self.name, 'from': previous, 'to': state})
+
+
+_llm_breaker: Optional[CircuitBreaker] = None
+_llm_breaker_lock = threading.Lock()
+
+
+def get_llm_breaker() -> CircuitBreaker:
+    """Process-wide breaker around LLM generation, configured from LLM_BREAKER_*"""
+    global _llm_breaker
+    if _llm_breaker is None:
+        with _llm_breaker_lock:
+            if _llm_breaker is None:
+                _llm_breaker = CircuitBreaker(
+                    'llm',
+                    consecutive_failures=int(os.getenv('LLM_BREAKER_CONSECUTIVE_FAILURES', '5')),
+                    failure_rate=float(os.getenv('LLM_BREAKER_FAILURE_RATE', '0.5')),
+                    window=int(os.getenv('LLM_BREAKER_WINDOW', '20')),
+                    min_calls=int(os.getenv('LLM_BREAKER_MIN_CALLS', '10')),
+                    slow_call_seconds=float(os.getenv('LLM_BREAKER_SLOW_SECONDS', '20')),
+                    open_seconds=float(os.getenv('LLM_BREAKER_OPEN_SECONDS', '30'))
+                )
+    return _llm_breaker
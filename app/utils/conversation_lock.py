@@ -0,0 +1,95 @@
+# app/utils/conversation_lock.py
+"""
+Per-conversation reply lock across processes
+Inline webhooks and the ASGI app run on several gunicorn/uvicorn workers, so
+two texts from the same sender can land on different processes. The reply
+path holds a Redis lock per (user, sender) - SET NX PX with a random token,
+released only by its owner - so the second reply is generated after the
+first is saved and sees it in its context. An asyncio.Lock in front of it
+keeps same-process waiters queued in order without polling Redis.
+
+Without Redis only the process-local lock applies.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from app.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY_PREFIX = 'sms:convlock:'
+
+# Longer than a reply takes (SLA plus send); a crashed holder frees the lock after this
+LOCK_TTL_SECONDS = float(os.getenv('SMS_CONVERSATION_LOCK_SECONDS', '60'))
+POLL_SECONDS = 0.05
+MAX_POLL_SECONDS = 0.5
+
+# Delete the key only if it still holds our token
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_local_locks: 'weakref.WeakValueDictionary' = weakref.WeakValueDictionary()
+
+
+def _local_lock(key: str) -> asyncio.Lock:
+    lock = _local_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _local_locks[key] = lock
+    return lock
+
+
+async def _acquire(redis_client, key: str, token: str) -> bool:
+    """Wait for the Redis lock; gives up (returns False) after one TTL, when any holder has expired"""
+    ttl_ms = int(LOCK_TTL_SECONDS * 1000)
+    loop = asyncio.get_running_loop()
+    gives_up = loop.time() + LOCK_TTL_SECONDS
+    delay = POLL_SECONDS
+
+    while True:
+        try:
+            if await asyncio.to_thread(redis_client.set, key, token, nx=True, px=ttl_ms):
+                return True
+        except Exception as e:
+            logger.warning(f"Conversation lock unavailable, continuing without it: {e}")
+            return False
+
+        if loop.time() >= gives_up:
+            logger.warning(f"Timed out waiting for conversation lock {key}")
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_POLL_SECONDS)
+
+
+async def _release(redis_client, key: str, token: str) -> None:
+    try:
+        await asyncio.to_thread(redis_client.eval, _RELEASE_SCRIPT, 1, key, token)
+    except Exception as e:
+        # The key expires on its own
+        logger.warning(f"Failed to release conversation lock {key}: {e}")
+
+
+@asynccontextmanager
+async def conversation_lock(user_id: int, from_number: str) -> AsyncIterator[None]:
+    """Serialize reply generation for one (user, sender) conversation across all processes"""
+    key = f"{LOCK_KEY_PREFIX}{user_id}:{from_number}"
+
+    async with _local_lock(key):
+        redis_client = get_redis()
+        token: Optional[str] = uuid.uuid4().hex if redis_client is not None else None
+        held = token is not None and await _acquire(redis_client, key, token)
+        try:
+            yield
+        finally:
+            if held:
+                await _release(redis_client, key, token)
@@ -0,0 +1,65 @@
+# app/utils/idempotency.py
+"""
+Webhook idempotency helpers
+SignalWire retries slow or failed webhooks with the same MessageSid. A Redis
+SET NX claim answers retries without touching the database; the unique
+messages.signalwire_message_sid column is the backstop when Redis is down.
+"""
+
+import logging
+import os
+from typing import Optional
+
+from app.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_KEY_PREFIX = 'sms:dedupe:'
+DEFAULT_DEDUPE_TTL = int(os.getenv('SMS_DEDUPE_TTL', '86400'))  # 24 hours
+
+
+def claim_message_sid(message_sid: Optional[str], ttl: int = None) -> bool:
+    """
+    Claim a MessageSid for processing
+    Returns False if another request already claimed it (a duplicate delivery)
+    """
+    if not message_sid:
+        return True
+
+    redis_client = get_redis()
+    if redis_client is not None:
+        try:
+            claimed = redis_client.set(
+                f"{DEDUPE_KEY_PREFIX}{message_sid}", '1',
+                nx=True, ex=ttl or DEFAULT_DEDUPE_TTL
+            )
+            return bool(claimed)
+        except Exception as e:
+            logger.warning(f"Redis dedupe check failed for {message_sid}: {e}")
+
+    # No Redis - fall back to the indexed unique column
+    return not message_sid_exists(message_sid)
+
+
+def release_message_sid(message_sid: Optional[str]) -> None:
+    """Drop a claim after a failed attempt so SignalWire's retry is processed"""
+    if not message_sid:
+        return
+
+    redis_client = get_redis()
+    if redis_client is None:
+        return
+
+    try:
+        redis_client.delete(f"{DEDUPE_KEY_PREFIX}{message_sid}")
+    except Exception as e:
+        logger.warning(f"Failed to release dedupe claim for {message_sid}: {e}")
+
+
+def message_sid_exists(message_sid: str) -> bool:
+    from app.extensions import db
+    from app.models import Message
+
+    return db.session.query(
+        Message.query.filter_by(signalwire_message_sid=message_sid).exists()
+    ).scalar()
@@ -1,119 +1,724 @@
+import os
+import asyncio
+import threading
+import time
+import weakref
 import requests
+import httpx
 import json
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional
 from datetime import datetime
 
+from requests.adapters import HTTPAdapter
+
+from app.services.response_cache import get_response_cache
+from app.utils.circuit_breaker import CircuitBreaker, get_llm_breaker
+from app.utils.llm_router import LLMRouter, NoBackendAvailable, get_llm_router
+from app.utils.metrics import incr, observe
+from app.utils.prompt_builder import get_prompt_builder
+
 logger = logging.getLogger(__name__)
 
+class LLMError(Exception):
+    """Raised when the LLM server cannot produce a response"""
+    pass
+
+class LLMDeadlineExceeded(LLMError):
+    """Raised when no tier finished within the request's latency budget"""
+    pass
+
+class LLMCircuitOpen(LLMError):
+    """Raised without calling the server while the LLM circuit breaker is open"""
+    pass
+
+# Ollama reports durations in nanoseconds
+NS_PER_SECOND = 1e9
+# Generation speed, tokens/second
+THROUGHPUT_BUCKETS = (1, 2.5, 5, 10, 20, 30, 50, 75, 100, 150)
+# A request whose model load took at least this long found the model unloaded
+COLD_LOAD_SECONDS = float(os.getenv('LLM_COLD_LOAD_SECONDS', '1'))
+
+def call_timings(result: Dict[str, Any], wall_seconds: float, host: str) -> Dict[str, Any]:
+    """Where one Ollama call's time went, from the durations in its final response"""
+    total = result.get('total_duration', 0) / NS_PER_SECOND
+    eval_seconds = result.get('eval_duration', 0) / NS_PER_SECOND
+    eval_tokens = result.get('eval_count', 0)
+    return {
+        'model': result.get('model'),
+        'host': host,
+        'wall_seconds': round(wall_seconds, 3),
+        # Time outside Ollama's own accounting: connection pool wait, network and the server's queue
+        'queue_wait_seconds': round(max(0.0, wall_seconds - total), 3) if total else None,
+        'load_seconds': round(result.get('load_duration', 0) / NS_PER_SECOND, 3),
+        'prompt_eval_seconds': round(result.get('prompt_eval_duration', 0) / NS_PER_SECOND, 3),
+        'eval_seconds': round(eval_seconds, 3),
+        'prompt_tokens': result.get('prompt_eval_count', 0),
+        'eval_tokens': eval_tokens,
+        'tokens_per_second': round(eval_tokens / eval_seconds, 1) if eval_seconds else None,
+    }
+
+def record_call(model: str, host: str, outcome: str, wall_seconds: float,
+                timings: Optional[Dict[str, Any]] = None) -> None:
+    """Counters and histograms for one request to one Ollama host"""
+    labels = {'model': model, 'host': host, 'outcome': outcome}
+    incr('llm_calls_total', labels=labels)
+    observe('llm_call_seconds', wall_seconds, labels)
+    if not timings:
+        return
+
+    labels = {'model': model, 'host': host}
+    if timings['load_seconds'] >= COLD_LOAD_SECONDS:
+        incr('llm_cold_loads_total', labels=dict(labels, trigger='request'))
+    if timings['queue_wait_seconds'] is not None:
+        observe('llm_queue_wait_seconds', timings['queue_wait_seconds'], labels)
+    observe('llm_load_seconds', timings['load_seconds'], labels)
+    observe('llm_prompt_eval_seconds', timings['prompt_eval_seconds'], labels)
+    observe('llm_eval_seconds', timings['eval_seconds'], labels)
+    if timings['tokens_per_second'] is not None:
+        observe('llm_tokens_per_second', timings['tokens_per_second'], labels, buckets=THROUGHPUT_BUCKETS)
+
 class LLMConfig:
     """LLM service configuration"""
-    
+
     def __init__(self):
-        import os
-        self.base_url = os.getenv('LLM_BASE_URL', 'http://localhost:11434')
-        self.model = os.getenv('LLM_MODEL', 'dolphin-mistral:latest')
-        self.timeout = int(os.getenv('LLM_TIMEOUT', '30'))
+        # OLLAMA_* is what the SMS service was deployed with; LLM_* is the older naming
+        self.base_url = (os.getenv('OLLAMA_SERVER_URL') or os.getenv('LLM_BASE_URL')
+                         or 'http://localhost:11434').rstrip('/')
+        self.model = os.getenv('OLLAMA_MODEL') or os.getenv('LLM_MODEL') or 'dolphin-mistral:7b'
+        self.timeout = float(os.getenv('OLLAMA_TIMEOUT') or os.getenv('LLM_TIMEOUT') or '30')
         self.max_tokens = int(os.getenv('LLM_MAX_TOKENS', '150'))
 
-def get_ai_response(messages: List[Dict[str, str]], personality: str = 'professional', 
-                  custom_prompt: str = None) -> Optional[Dict[str, Any]]:
+        # Connection pool shared by every AI reply in the process
+        self.pool_max_connections = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '20'))
+        self.pool_max_keepalive = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '10'))
+        self.keepalive_expiry = float(os.getenv('LLM_POOL_KEEPALIVE_EXPIRY', '60'))
+
+        # Hedging: if the primary has produced no token after LLM_HEDGE_AFTER_SECONDS, race a
+        # second request (the fallback model if set, on another host when the pool has one)
+        self.fallback_model = os.getenv('OLLAMA_FALLBACK_MODEL') or None
+        self.hedge_after = float(os.getenv('LLM_HEDGE_AFTER_SECONDS', '4'))
+
+_config: Optional[LLMConfig] = None
+
+def get_llm_config() -> LLMConfig:
+    """LLM configuration, read from the environment once per process"""
+    global _config
+    if _config is None:
+        _config = LLMConfig()
+    return _config
+
+class LLMClient:
+    """
+    Pooled Ollama client with sync and async interfaces
+    Sync calls share one requests.Session; async calls share one
+    httpx.AsyncClient per event loop (in practice the async_runner loop).
+    Each request is routed to a host from the LLMRouter pool and retried on
+    another host if the connection fails. Generation calls go through the
+    circuit breaker: while it is open they fail fast with LLMCircuitOpen.
+    """
+
+    def __init__(self, config: LLMConfig = None, router: LLMRouter = None, breaker: CircuitBreaker = None):
+        self.config = config or get_llm_config()
+        self.router = router or get_llm_router()
+        self.breaker = breaker or get_llm_breaker()
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = \
+            weakref.WeakKeyDictionary()
+
+    @property
+    def base_url(self) -> str:
+        # For logs and diagnostics - requests go to whichever pool host the router picks
+        return ', '.join(backend.url for backend in self.router.backends)
+
+    @property
+    def model(self) -> str:
+        return self.config.model
+
+    # =========================================================================
+    # SYNC INTERFACE
+    # =========================================================================
+
+    def generate(self, prompt: str, options: Dict[str, Any] = None, model: str = None,
+                 timeout: float = None, **extra) -> Dict[str, Any]:
+        """POST /api/generate (non-streaming)"""
+        payload = self._payload(model, options, extra, prompt=prompt)
+        return self._request('POST', '/api/generate', payload, timeout)
+
+    def chat(self, messages: List[Dict[str, str]], options: Dict[str, Any] = None, model: str = None,
+             timeout: float = None, **extra) -> Dict[str, Any]:
+        """POST /api/chat (non-streaming)"""
+        payload = self._payload(model, options, extra, messages=messages)
+        return self._request('POST', '/api/chat', payload, timeout)
+
+    def preload(self, model: str, host: str, keep_alive: str = None, timeout: float = None) -> Dict[str, Any]:
+        """
+        Load a model on one specific host - an empty prompt loads without generating
+        Bypasses the router and the circuit breaker, since warm-up has to reach every host
+        """
+        payload = {'model': model, 'prompt': '', 'stream': False}
+        if keep_alive:
+            payload['keep_alive'] = keep_alive
+        response = self._get_session().post(f"{host}/api/generate", json=payload,
+                                            timeout=timeout or self.config.timeout)
+        return self._check(response.status_code, response.text, response.json)
+
+    def tags(self, timeout: float = 5.0) -> Dict[str, Any]:
+        """GET /api/tags - the models the server has pulled (not gated by the breaker)"""
+        return self._request('GET', '/api/tags', None, timeout, guarded=False)
+
+    # =========================================================================
+    # ASYNC INTERFACE
+    # =========================================================================
+
+    async def agenerate(self, prompt: str, options: Dict[str, Any] = None, model: str = None,
+                        timeout: float = None, **extra) -> Dict[str, Any]:
+        payload = self._payload(model, options, extra, prompt=prompt)
+        return await self._arequest('POST', '/api/generate', payload, timeout)
+
+    async def achat(self, messages: List[Dict[str, str]], options: Dict[str, Any] = None,
+                    model: str = None, timeout: float = None, **extra) -> Dict[str, Any]:
+        payload = self._payload(model, options, extra, messages=messages)
+        return await self._arequest('POST', '/api/chat', payload, timeout)
+
+    async def astream_generate(self, prompt: str, options: Dict[str, Any] = None, model: str = None,
+                               timeout: float = None, exclude_hosts: List[str] = None,
+                               on_host: Callable[[str], None] = None, **extra) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield /api/generate NDJSON chunks; the last has done=True, the token counts
+        and 'timings' (see call_timings)
+        on_host is called with each host the request is sent to
+        """
+        payload = self._payload(model, options, extra, prompt=prompt, stream=True)
+        client = self._get_async_client()
+        tried: List[str] = list(exclude_hosts or [])
+
+        while True:
+            backend = self._acquire(payload['model'], tried)
+            if on_host:
+                on_host(backend.url)
+            started = False
+            finished = False
+            sent_at = time.monotonic()
+            try:
+                async with client.stream('POST', f"{backend.url}/api/generate", json=payload,
+                                         timeout=timeout or self.config.timeout) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode(errors='replace')
+                        self.router.release(backend, ok=response.status_code < 500,
+                                            error=f"HTTP {response.status_code}")
+                        self._record(payload, backend, 'error', sent_at)
+                        raise LLMError(f"Ollama API error: {response.status_code} - {body}")
+
+                    async for line in response.aiter_lines():
+                        if line.strip():
+                            started = True
+                            chunk = json.loads(line)
+                            if chunk.get('done'):
+                                finished = True
+                                self._record(payload, backend, 'ok', sent_at, chunk)
+                            yield chunk
+
+            except LLMError:
+                raise
+            except httpx.TimeoutException:
+                self.router.release(backend, ok=False, error='timeout')
+                self._record(payload, backend, 'timeout', sent_at)
+                logger.error(f"Ollama stream timeout after {timeout or self.config.timeout}s on {backend.url}")
+                raise LLMError("LLM server timeout")
+            except httpx.ConnectError as e:
+                self.router.release(backend, ok=False, error=str(e))
+                self._record(payload, backend, 'unavailable', sent_at)
+                logger.error(f"Cannot connect to Ollama server at {backend.url}")
+                tried.append(backend.url)
+                if not started and len(tried) < len(self.router.backends):
+                    continue
+                raise LLMError("LLM server unavailable")
+            except (GeneratorExit, asyncio.CancelledError):
+                # Consumer stopped early or was cancelled - not the host's fault
+                self.router.release(backend, ok=True)
+                if not finished:
+                    self._record(payload, backend, 'cancelled', sent_at)
+                raise
+            except Exception as e:
+                self.router.release(backend, ok=False, error=str(e))
+                self._record(payload, backend, 'error', sent_at)
+                raise
+
+            self.router.release(backend, ok=True)
+            return
+
+    async def astream_hedged(self, prompt: str, options: Dict[str, Any] = None, deadline: float = None,
+                             hedge_prompt: str = None, context: List[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Hedged streaming generation (_astream_hedged) counted as one breaker outcome; expired deadlines bypass the breaker"""
+        if deadline and deadline <= time.time():
+            # A stale queued message says nothing about the backend; keep it out of the breaker
+            incr('llm_deadline_exceeded_total')
+            raise LLMDeadlineExceeded("Reply deadline already passed")
+        self._admit()
+        started = time.monotonic()
+        try:
+            async for chunk in self._astream_hedged(prompt, options, deadline, hedge_prompt, context):
+                if chunk.get('done'):
+                    self.breaker.record_success(time.monotonic() - started)
+                yield chunk
+        except Exception as e:
+            self.breaker.record_failure(str(e))
+            raise
+
+    async def _astream_hedged(self, prompt: str, options: Dict[str, Any] = None, deadline: float = None,
+                              hedge_prompt: str = None, context: List[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a generation within a latency budget, hedging a slow primary
+        deadline is a time.time() timestamp. If the primary has produced no token
+        after hedge_after seconds (or fails first), a second request starts on the
+        fallback model and/or another host, and whichever yields a token first is
+        streamed. context only applies to the primary model; the hedge gets
+        hedge_prompt (the full prompt) when the models differ.
+        The final chunk carries 'tier', 'model' and 'host'.
+        """
+        config = self.config
+        remaining = (deadline - time.time()) if deadline else config.timeout
+        hedge_model = config.fallback_model or config.model
+        can_hedge = config.hedge_after > 0 and (hedge_model != config.model or len(self.router.backends) > 1)
+        started = time.monotonic()
+        ends = started + max(remaining, 0.0)
+
+        tiers = {'primary': {'model': config.model, 'host': None}}
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump(tier: str, stream) -> None:
+            try:
+                async for chunk in stream:
+                    await queue.put((tier, 'chunk', chunk))
+                await queue.put((tier, 'end', None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put((tier, 'error', e))
+
+        def start(tier: str, model: str, tier_prompt: str, tier_extra: Dict[str, Any], exclude: List[str]):
+            tiers.setdefault(tier, {'model': model, 'host': None})
+            stream = self.astream_generate(
+                tier_prompt, options=options, model=model, timeout=max(remaining, 1.0), exclude_hosts=exclude,
+                on_host=lambda url: tiers[tier].update(host=url), **tier_extra
+            )
+            return asyncio.ensure_future(pump(tier, stream))
+
+        if remaining <= 0:
+            # Only reachable when the deadline passed between astream_hedged's check and here
+            raise LLMDeadlineExceeded("Reply deadline already passed")
+
+        tasks = {'primary': start('primary', config.model, prompt, {'context': context} if context else {}, [])}
+        # Never wait for the first token longer than half the remaining budget before hedging
+        hedge_at = started + min(config.hedge_after, remaining / 2)
+        winner = None
+        errors: Dict[str, Exception] = {}
+
+        def hedge() -> None:
+            tier = 'fallback' if hedge_model != config.model else 'hedge'
+            same_model = hedge_model == config.model
+            exclude = [tiers['primary']['host']] if tiers['primary']['host'] and len(self.router.backends) > 1 else []
+            extra = {'context': context} if context and same_model else {}
+            tier_prompt = prompt if (same_model or not context) else (hedge_prompt or prompt)
+            incr('llm_hedged_total')
+            logger.info(f"No first token after {time.monotonic() - started:.1f}s - hedging to {hedge_model}")
+            tasks[tier] = start(tier, hedge_model, tier_prompt, extra, exclude)
+
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= ends:
+                    incr('llm_deadline_exceeded_total')
+                    raise LLMDeadlineExceeded(f"No reply within the {remaining:.1f}s budget")
+
+                wait_until = ends
+                if winner is None and can_hedge and len(tasks) == 1:
+                    wait_until = min(ends, hedge_at)
+                try:
+                    tier, kind, item = await asyncio.wait_for(queue.get(), timeout=max(0.0, wait_until - now))
+                except asyncio.TimeoutError:
+                    if winner is None and can_hedge and len(tasks) == 1 and time.monotonic() >= hedge_at:
+                        hedge()
+                    continue
+
+                if winner is not None and tier != winner:
+                    continue
+
+                if kind == 'error':
+                    errors[tier] = item
+                    incr('llm_requests_total', labels={'tier': tier, 'outcome': 'error'})
+                    if winner is None and can_hedge and len(tasks) == 1:
+                        # The primary failed before its first token - hedge now instead of waiting
+                        hedge()
+                        continue
+                    if winner is None and len(errors) < len(tasks):
+                        continue
+                    raise item
+
+                if winner is None:
+                    winner = tier
+                    for other, task in tasks.items():
+                        if other != tier:
+                            task.cancel()
+                            if other not in errors:
+                                incr('llm_requests_total', labels={'tier': other, 'outcome': 'lost'})
+
+                if kind == 'end':
+                    raise LLMError("LLM stream ended without a final chunk")
+
+                if item.get('done'):
+                    latency = time.monotonic() - started
+                    incr('llm_requests_total', labels={'tier': winner, 'outcome': 'won'})
+                    incr('llm_tier_latency_seconds_sum', round(latency, 3), labels={'tier': winner})
+                    incr('llm_tier_latency_seconds_count', labels={'tier': winner})
+                    item = dict(item, tier=winner, model=tiers[winner]['model'], host=tiers[winner]['host'])
+                    yield item
+                    return
+
+                yield item
+
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+
+    async def agenerate_hedged(self, prompt: str, options: Dict[str, Any] = None, deadline: float = None,
+                               hedge_prompt: str = None, context: List[int] = None) -> Dict[str, Any]:
+        """astream_hedged collected into one /api/generate-shaped response"""
+        text = ''
+        async for chunk in self.astream_hedged(prompt, options, deadline, hedge_prompt, context):
+            text += chunk.get('response', '')
+            if chunk.get('done'):
+                return dict(chunk, response=text)
+        raise LLMError("LLM stream ended without a final chunk")
+
+    async def atags(self, timeout: float = 5.0) -> Dict[str, Any]:
+        return await self._arequest('GET', '/api/tags', None, timeout, guarded=False)
+
+    async def aclose(self) -> None:
+        """Close the async pool bound to the running loop"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    # =========================================================================
+    # POOLS AND PLUMBING
+    # =========================================================================
+
+    def _get_session(self) -> requests.Session:
+        with self._lock:
+            # A forked worker must not share sockets with its parent
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=len(self.router.backends),
+                    pool_maxsize=self.config.pool_max_connections,
+                    pool_block=False
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.config.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.config.pool_max_connections,
+                    max_keepalive_connections=self.config.pool_max_keepalive,
+                    keepalive_expiry=self.config.keepalive_expiry
+                )
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _payload(self, model: Optional[str], options: Optional[Dict[str, Any]],
+                 extra: Dict[str, Any], stream: bool = False, **fields) -> Dict[str, Any]:
+        payload = {'model': model or self.config.model, 'stream': stream}
+        payload.update(fields)
+        if options:
+            payload['options'] = options
+        payload.update(extra)
+        return payload
+
+    def _record(self, payload: Optional[Dict[str, Any]], backend, outcome: str, sent_at: float,
+                result: Optional[Dict[str, Any]] = None) -> None:
+        """Metrics for one generation attempt; a final result gets its breakdown as result['timings']"""
+        if payload is None:
+            # /api/tags and other probes are not generation calls
+            return
+        wall_seconds = time.monotonic() - sent_at
+        timings = None
+        if result is not None:
+            timings = result['timings'] = call_timings(result, wall_seconds, backend.url)
+        record_call(payload['model'], backend.url, outcome, wall_seconds, timings)
+
+    def _admit(self) -> None:
+        if not self.breaker.allow():
+            raise LLMCircuitOpen(f"LLM circuit open, retry in {self.breaker.retry_after():.0f}s")
+
+    def _acquire(self, model: str, tried: List[str]):
+        try:
+            return self.router.acquire(model, exclude=tried)
+        except NoBackendAvailable as e:
+            logger.error(str(e))
+            raise LLMError("LLM server unavailable")
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]],
+                 timeout: Optional[float], guarded: bool = True) -> Dict[str, Any]:
+        """One request, gated by and counted towards the circuit breaker when guarded"""
+        if not guarded:
+            return self._send(method, path, payload, timeout)
+
+        self._admit()
+        started = time.monotonic()
+        try:
+            result = self._send(method, path, payload, timeout)
+        except Exception as e:
+            self.breaker.record_failure(str(e))
+            raise
+        self.breaker.record_success(time.monotonic() - started)
+        return result
+
+    async def _arequest(self, method: str, path: str, payload: Optional[Dict[str, Any]],
+                        timeout: Optional[float], guarded: bool = True) -> Dict[str, Any]:
+        if not guarded:
+            return await self._asend(method, path, payload, timeout)
+
+        self._admit()
+        started = time.monotonic()
+        try:
+            result = await self._asend(method, path, payload, timeout)
+        except Exception as e:
+            self.breaker.record_failure(str(e))
+            raise
+        self.breaker.record_success(time.monotonic() - started)
+        return result
+
+    def _send(self, method: str, path: str, payload: Optional[Dict[str, Any]],
+              timeout: Optional[float]) -> Dict[str, Any]:
+        model = payload['model'] if payload else self.config.model
+        tried: List[str] = []
+
+        while True:
+            backend = self._acquire(model, tried)
+            sent_at = time.monotonic()
+            try:
+                response = self._get_session().request(
+                    method, f"{backend.url}{path}", json=payload, timeout=timeout or self.config.timeout
+                )
+            except requests.Timeout:
+                self.router.release(backend, ok=False, error='timeout')
+                self._record(payload, backend, 'timeout', sent_at)
+                logger.error(f"Ollama request timeout after {timeout or self.config.timeout}s on {backend.url}")
+                raise LLMError("LLM server timeout")
+            except requests.ConnectionError as e:
+                self.router.release(backend, ok=False, error=str(e))
+                self._record(payload, backend, 'unavailable', sent_at)
+                logger.error(f"Cannot connect to Ollama server at {backend.url}")
+                # Nothing reached the host, so another one can take the request
+                tried.append(backend.url)
+                if len(tried) < len(self.router.backends):
+                    continue
+                raise LLMError("LLM server unavailable")
+            except Exception as e:
+                self.router.release(backend, ok=False, error=str(e))
+                self._record(payload, backend, 'error', sent_at)
+                raise
+
+            self.router.release(backend, ok=response.status_code < 500, error=f"HTTP {response.status_code}")
+            return self._checked(payload, backend, sent_at, response.status_code, response.text, response.json)
+
+    async def _asend(self, method: str, path: str, payload: Optional[Dict[str, Any]],
+                     timeout: Optional[float]) -> Dict[str, Any]:
+        model = payload['model'] if payload else self.config.model
+        tried: List[str] = []
+
+        while True:
+            backend = self._acquire(model, tried)
+            sent_at = time.monotonic()
+            try:
+                response = await self._get_async_client().request(
+                    method, f"{backend.url}{path}", json=payload, timeout=timeout or self.config.timeout
+                )
+            except httpx.TimeoutException:
+                self.router.release(backend, ok=False, error='timeout')
+                self._record(payload, backend, 'timeout', sent_at)
+                logger.error(f"Ollama request timeout after {timeout or self.config.timeout}s on {backend.url}")
+                raise LLMError("LLM server timeout")
+            except httpx.ConnectError as e:
+                self.router.release(backend, ok=False, error=str(e))
+                self._record(payload, backend, 'unavailable', sent_at)
+                logger.error(f"Cannot connect to Ollama server at {backend.url}")
+                tried.append(backend.url)
+                if len(tried) < len(self.router.backends):
+                    continue
+                raise LLMError("LLM server unavailable")
+            except asyncio.CancelledError:
+                self.router.release(backend, ok=True)
+                self._record(payload, backend, 'cancelled', sent_at)
+                raise
+            except Exception as e:
+                self.router.release(backend, ok=False, error=str(e))
+                self._record(payload, backend, 'error', sent_at)
+                raise
+
+            self.router.release(backend, ok=response.status_code < 500, error=f"HTTP {response.status_code}")
+            return self._checked(payload, backend, sent_at, response.status_code, response.text, response.json)
+
+    def _checked(self, payload: Optional[Dict[str, Any]], backend, sent_at: float,
+                 status_code: int, text: str, parse) -> Dict[str, Any]:
+        try:
+            result = self._check(status_code, text, parse)
+        except Exception:
+            self._record(payload, backend, 'error', sent_at)
+            raise
+        self._record(payload, backend, 'ok', sent_at, result)
+        return result
+
+    @staticmethod
+    def _check(status_code: int, text: str, parse) -> Dict[str, Any]:
+        if status_code != 200:
+            raise LLMError(f"Ollama API error: {status_code} - {text}")
+        return parse()
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """Process-wide LLM client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+def get_ai_response(messages: List[Dict[str, str]], personality: str = 'professional',
+                  custom_prompt: str = None, user_id: int = None,
+                  cache_enabled: bool = True, summary: str = None) -> Optional[Dict[str, Any]]:
     """
     Generate AI response for SMS conversation
+    With a user_id, replies to short repeated messages come from the response cache.
+    summary is the client's rolling summary of turns older than messages
     """
     try:
-        config = LLMConfig()
-        
+        client = get_llm_client()
+        config = client.config
+
+        cache = get_response_cache()
+        cache_key = None
+        if cache_enabled and messages and messages[-1].get('role') == 'user':
+            persona = f"chat|{config.model}|{personality}|{custom_prompt or ''}"
+            cache_key = cache.key_for(user_id, messages[-1].get('content', ''), persona)
+        cached = cache.get(cache_key)
+        if cached:
+            return {
+                'content': cached['response'],
+                'model': config.model,
+                'confidence': 0.8,
+                'generated_at': datetime.utcnow().isoformat(),
+                'cached': True
+            }
+        started = time.monotonic()
+
         # Build system prompt based on personality
         system_prompts = {
             'professional': "You are a professional assistant helping with business communications. Keep responses brief, helpful, and professional. Respond in 1-2 sentences maximum.",
             'friendly': "You are a friendly and warm assistant. Keep responses casual, helpful, and brief. Respond in 1-2 sentences maximum.",
             'formal': "You are a formal business assistant. Keep responses polite, concise, and professional. Respond in 1-2 sentences maximum."
         }
-        
+
         system_prompt = custom_prompt or system_prompts.get(personality, system_prompts['professional'])
-        
-        # Prepare messages for LLM
+        builder = get_prompt_builder()
+        if summary:
+            summary = builder.fit_message(summary, builder.budget // 4)
+            system_prompt = f"{system_prompt}\n\nSummary of the earlier conversation:\n{summary}"
+
+        # Prepare messages for LLM - the system prompt and current message are reserved,
+        # earlier turns fill the rest of the token budget newest first
+        current = messages[-1] if messages else None
+        reserved = system_prompt + ((current['content'] or '') if current else '')
+        history = builder.pack_history(reserved, [(m['role'], m['content'] or '') for m in messages[:-1]])
+
         llm_messages = [
             {"role": "system", "content": system_prompt}
         ]
-        llm_messages.extend(messages)
-        
-        # Make request to LLM service
-        payload = {
-            "model": config.model,
-            "messages": llm_messages,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,
-                "max_tokens": config.max_tokens,
-                "top_p": 0.9
+        llm_messages.extend({"role": role, "content": content} for role, content in history)
+        if current:
+            llm_messages.append({"role": current['role'],
+                                 "content": builder.fit_message(current['content'], builder.budget // 2)})
+
+        result = client.chat(llm_messages, options={
+            "temperature": 0.7,
+            "num_predict": config.max_tokens,
+            "top_p": 0.9
+        })
+
+        ai_content = result.get('message', {}).get('content', '').strip()
+        if ai_content:
+            cache.set(cache_key, ai_content, result.get('eval_count', 0) + result.get('prompt_eval_count', 0),
+                      time.monotonic() - started)
+            return {
+                'content': ai_content,
+                'model': config.model,
+                'confidence': 0.8,  # Default confidence
+                'generated_at': datetime.utcnow().isoformat()
             }
-        }
-        
-        response = requests.post(
-            f"{config.base_url}/api/chat",
-            json=payload,
-            timeout=config.timeout
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            ai_content = result.get('message', {}).get('content', '').strip()
-            
-            if ai_content:
-                return {
-                    'content': ai_content,
-                    'model': config.model,
-                    'confidence': 0.8,  # Default confidence
-                    'generated_at': datetime.utcnow().isoformat()
-                }
-        
-        logger.error(f"LLM request failed: {response.status_code} - {response.text}")
+
+        logger.error("LLM returned an empty response")
         return None
-        
-    except requests.RequestException as e:
-        logger.error(f"LLM connection error: {str(e)}")
+
+    except LLMError as e:
+        logger.error(f"LLM request failed: {str(e)}")
         return None
     except Exception as e:
         logger.error(f"AI response generation error: {str(e)}")
         return None
 
 def test_llm_connection() -> Dict[str, Any]:
-    """Test connection to LLM service"""
+    """
+    Test connection to LLM service
+    Runs even while the circuit breaker is open, and its outcome counts
+    towards it - a passing test closes an open breaker
+    """
+    client = get_llm_client()
+    started = time.monotonic()
     try:
-        config = LLMConfig()
-        
-        test_payload = {
-            "model": config.model,
-            "messages": [
-                {"role": "user", "content": "Hello, this is a test message."}
-            ],
-            "stream": False
+        payload = client._payload(None, None, {}, messages=[
+            {"role": "user", "content": "Hello, this is a test message."}
+        ])
+        client._request('POST', '/api/chat', payload, 10, guarded=False)
+        client.breaker.record_success(time.monotonic() - started)
+        return {
+            'success': True,
+            'message': 'LLM connection successful',
+            'model': client.model,
+            'base_url': client.base_url
+        }
+
+    except LLMError as e:
+        client.breaker.record_failure(str(e))
+        return {
+            'success': False,
+            'error': f'LLM responded with an error: {str(e)}'
         }
-        
-        response = requests.post(
-            f"{config.base_url}/api/chat",
-            json=test_payload,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            return {
-                'success': True,
-                'message': 'LLM connection successful',
-                'model': config.model,
-                'base_url': config.base_url
-            }
-        else:
-            return {
-                'success': False,
-                'error': f'LLM responded with status {response.status_code}',
-                'details': response.text
-            }
-            
     except Exception as e:
+        client.breaker.record_failure(str(e))
         return {
             'success': False,
             'error': f'LLM connection failed: {str(e)}'
-        }
\ No newline at end of file
+        }
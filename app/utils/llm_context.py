@@ -0,0 +1,92 @@
+# app/utils/llm_context.py
+"""
+Ollama context reuse per conversation
+/api/generate returns a `context` token array covering the prompt and reply;
+passing it back with the next turn lets Ollama skip re-encoding the shared
+prefix. Each (user, sender) conversation keeps its latest context in Redis.
+
+A stored context is only trusted when the conversation has not moved on
+without it: the model must match and the newest stored message must be the
+reply the context ended with. Anything else (a reply sent from the dashboard,
+a cached reply, a failed turn) makes it stale and the caller falls back to a
+full prompt.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import List, Optional
+
+from app.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_KEY_PREFIX = 'llm:ctx:'
+CONTEXT_TTL = int(os.getenv('LLM_CONTEXT_TTL', '1800'))
+# Contexts longer than this are dropped so the next turn starts from a fresh, windowed prompt
+CONTEXT_MAX_TOKENS = int(os.getenv('LLM_CONTEXT_MAX_TOKENS', '3072'))
+
+
+def context_reuse_enabled() -> bool:
+    return os.getenv('LLM_CONTEXT_REUSE', 'true').lower() == 'true'
+
+
+def _context_key(user_id: int, from_number: str) -> str:
+    return f"{CONTEXT_KEY_PREFIX}{user_id}:{from_number}"
+
+
+def _reply_hash(text: str) -> str:
+    return hashlib.sha1((text or '').strip().encode()).hexdigest()
+
+
+def load_context(user_id: int, from_number: str, model: str, last_reply: Optional[str]) -> Optional[List[int]]:
+    """
+    Stored context for a conversation, or None if missing or stale
+    last_reply is the body of the newest stored message when that message is
+    outbound, otherwise None
+    """
+    redis_client = get_redis()
+    if redis_client is None or not context_reuse_enabled() or last_reply is None:
+        return None
+
+    try:
+        raw = redis_client.get(_context_key(user_id, from_number))
+        if not raw:
+            return None
+        entry = json.loads(raw)
+    except Exception as e:
+        logger.warning(f"Failed to load LLM context for {from_number}: {e}")
+        return None
+
+    if entry.get('model') != model or entry.get('reply_hash') != _reply_hash(last_reply):
+        return None
+    return entry.get('context') or None
+
+
+def save_context(user_id: int, from_number: str, model: str, context: Optional[List[int]], reply: str) -> None:
+    """Store the context a generation returned, keyed to the reply it produced"""
+    redis_client = get_redis()
+    if redis_client is None or not context_reuse_enabled():
+        return
+
+    key = _context_key(user_id, from_number)
+    try:
+        if not context or len(context) > CONTEXT_MAX_TOKENS:
+            redis_client.delete(key)
+            return
+
+        entry = {'model': model, 'reply_hash': _reply_hash(reply), 'context': context}
+        redis_client.set(key, json.dumps(entry, separators=(',', ':')), ex=CONTEXT_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to save LLM context for {from_number}: {e}")
+
+
+def clear_context(user_id: int, from_number: str) -> None:
+    redis_client = get_redis()
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(_context_key(user_id, from_number))
+    except Exception as e:
+        logger.warning(f"Failed to clear LLM context for {from_number}: {e}")
@@ -0,0 +1,225 @@
+# app/utils/llm_router.py
+"""
+Ollama backend pool
+OLLAMA_SERVER_URLS lists the LLM hosts (comma-separated; OLLAMA_SERVER_URL
+alone is a pool of one). Each request goes to the healthy host with the
+fewest requests in flight from this process that has the model pulled.
+
+Health is tracked passively: a host that fails LLM_EJECT_AFTER_FAILURES
+requests in a row is ejected for LLM_EJECT_SECONDS (doubling on repeated
+ejections), then gets one trial request. A background probe of /api/tags
+every LLM_ROUTER_PROBE_SECONDS refreshes each host's model list and brings
+recovered hosts back early.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailable(Exception):
+    """No configured LLM host can serve the requested model"""
+    pass
+
+
+def _model_names(name: str) -> Set[str]:
+    # Ollama treats "mistral" and "mistral:latest" as the same model
+    return {name, f"{name}:latest"} if ':' not in name else {name}
+
+
+class LLMBackend:
+    """One Ollama host and what this process knows about it"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.in_flight = 0
+        self.models: Optional[Set[str]] = None  # None until the first probe
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+        self.total_requests = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def has_model(self, model: str) -> bool:
+        if self.models is None:
+            return True
+        return bool(_model_names(model) & self.models)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'models': sorted(self.models) if self.models is not None else None,
+            'consecutive_failures': self.consecutive_failures,
+            'ejected_for': max(0.0, round(self.ejected_until - time.monotonic(), 1)),
+            'last_error': self.last_error,
+            'total_requests': self.total_requests,
+        }
+
+
+class LLMRouter:
+    """Least-outstanding-requests balancing over a pool of Ollama hosts"""
+
+    def __init__(self, urls: List[str]):
+        if not urls:
+            raise ValueError("LLMRouter needs at least one backend URL")
+        self.backends = [LLMBackend(url) for url in urls]
+
+        self.eject_after_failures = int(os.getenv('LLM_EJECT_AFTER_FAILURES', '3'))
+        self.eject_seconds = float(os.getenv('LLM_EJECT_SECONDS', '30'))
+        self.max_eject_seconds = float(os.getenv('LLM_MAX_EJECT_SECONDS', '300'))
+        self.probe_interval = float(os.getenv('LLM_ROUTER_PROBE_SECONDS', '30'))
+
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probe_pid: Optional[int] = None
+
+    # =========================================================================
+    # SELECTION
+    # =========================================================================
+
+    def acquire(self, model: str, exclude: Iterable[str] = ()) -> LLMBackend:
+        """
+        Pick a host for one request and count it as in flight
+        Must be paired with release(); prefer the lease() context manager
+        """
+        self._ensure_probe_thread()
+        excluded = set(exclude)
+
+        with self._lock:
+            candidates = [b for b in self.backends if b.url not in excluded and b.has_model(model)]
+            if not candidates:
+                raise NoBackendAvailable(f"No LLM host serves model {model}")
+
+            healthy = [b for b in candidates if b.healthy]
+            if healthy:
+                backend = min(healthy, key=lambda b: b.in_flight)
+            else:
+                # Everything is ejected - try the host that is due back soonest rather than fail outright
+                backend = min(candidates, key=lambda b: b.ejected_until)
+
+            backend.in_flight += 1
+            backend.total_requests += 1
+            return backend
+
+    def release(self, backend: LLMBackend, ok: bool = True, error: str = None) -> None:
+        with self._lock:
+            backend.in_flight = max(0, backend.in_flight - 1)
+            if ok:
+                backend.consecutive_failures = 0
+                backend.ejections = 0
+                return
+
+            backend.consecutive_failures += 1
+            backend.last_error = error
+            if backend.consecutive_failures >= self.eject_after_failures or backend.ejections:
+                # A failed trial after an ejection goes straight back out, for longer
+                self._eject(backend)
+
+    @contextmanager
+    def lease(self, model: str, exclude: Iterable[str] = ()):
+        """with router.lease(model) as backend: ... - a raised exception counts as a failure"""
+        backend = self.acquire(model, exclude)
+        try:
+            yield backend
+        except Exception as e:
+            self.release(backend, ok=False, error=str(e))
+            raise
+        else:
+            self.release(backend, ok=True)
+
+    def _eject(self, backend: LLMBackend) -> None:
+        duration = min(self.max_eject_seconds, self.eject_seconds * (2 ** backend.ejections))
+        backend.ejections += 1
+        backend.consecutive_failures = 0
+        backend.ejected_until = time.monotonic() + duration
+        logger.warning(f"⚠️ Ejecting LLM host {backend.url} for {duration:.0f}s: {backend.last_error}")
+
+    # =========================================================================
+    # ACTIVE PROBES
+    # =========================================================================
+
+    def probe(self, backend: LLMBackend, timeout: float = 5.0) -> bool:
+        """Refresh a host's model list from /api/tags; a failure ejects it"""
+        try:
+            response = requests.get(f"{backend.url}/api/tags", timeout=timeout)
+            response.raise_for_status()
+            models = set()
+            for entry in response.json().get('models', []):
+                models.update(filter(None, (entry.get('name'), entry.get('model'))))
+        except Exception as e:
+            with self._lock:
+                backend.last_error = str(e)
+                if backend.healthy:
+                    self._eject(backend)
+            return False
+
+        with self._lock:
+            was_ejected = not backend.healthy
+            backend.models = models
+            backend.ejected_until = 0.0
+            backend.ejections = 0
+            backend.consecutive_failures = 0
+        if was_ejected:
+            logger.info(f"✅ LLM host {backend.url} is back")
+        return True
+
+    def probe_all(self) -> None:
+        for backend in self.backends:
+            self.probe(backend)
+
+    def _ensure_probe_thread(self) -> None:
+        if self.probe_interval <= 0 or len(self.backends) < 2:
+            return
+        # Threads do not survive fork, so each worker starts its own
+        if self._probe_thread is not None and self._probe_pid == os.getpid():
+            return
+        with self._lock:
+            if self._probe_thread is not None and self._probe_pid == os.getpid():
+                return
+            self._probe_pid = os.getpid()
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='llm-router-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while True:
+            self.probe_all()
+            time.sleep(self.probe_interval)
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.to_dict() for backend in self.backends]
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def backend_urls() -> List[str]:
+    """OLLAMA_SERVER_URLS, or the single OLLAMA_SERVER_URL / LLM_BASE_URL host"""
+    urls = [url.strip() for url in os.getenv('OLLAMA_SERVER_URLS', '').split(',') if url.strip()]
+    if not urls:
+        urls = [os.getenv('OLLAMA_SERVER_URL') or os.getenv('LLM_BASE_URL') or 'http://localhost:11434']
+    return [url.rstrip('/') for url in urls]
+
+
+def get_llm_router() -> LLMRouter:
+    """Process-wide backend pool"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LLMRouter(backend_urls())
+    return _router
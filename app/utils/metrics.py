@@ -0,0 +1,144 @@
+# app/utils/metrics.py
+"""
+Lightweight counters shared across processes
+Counters live in a Redis hash so every gunicorn and Celery worker adds to the
+same totals; without Redis they are kept per process. Histograms are stored
+as Prometheus-style bucket counters in the same hash, and render_prometheus()
+serves the lot as a scrape target.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_KEY = 'metrics:counters'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds - covers a warm first token through a cold model load
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+_local_counters: Dict[str, float] = defaultdict(float)
+_local_lock = threading.Lock()
+
+# Writes made from an event loop (ASGI handlers, async LLM calls) go through here
+# so the Redis round trip does not stall every other coroutine on the loop
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='metrics')
+
+
+def _field(name: str, labels: Optional[Dict[str, str]] = None) -> str:
+    if not labels:
+        return name
+    rendered = ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def _apply(increments: List[Tuple[str, float]]) -> None:
+    """Record increments now, or in the background when called on an event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _write(increments)
+        return
+    _writer.submit(_write, increments)
+
+
+def _write(increments: List[Tuple[str, float]]) -> None:
+    """Add each (field, amount) in one Redis round trip, or locally without Redis"""
+    redis_client = get_redis()
+    if redis_client is not None:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for field, amount in increments:
+                if float(amount).is_integer():
+                    pipe.hincrby(COUNTERS_KEY, field, int(amount))
+                else:
+                    pipe.hincrbyfloat(COUNTERS_KEY, field, amount)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.debug(f"Failed to record metrics {increments[0][0]}...: {e}")
+
+    with _local_lock:
+        for field, amount in increments:
+            _local_counters[field] += amount
+
+
+def incr(name: str, amount: float = 1, labels: Optional[Dict[str, str]] = None) -> None:
+    """Add to a counter; never raises"""
+    _apply([(_field(name, labels), amount)])
+
+
+def observe(name: str, value: float, labels: Optional[Dict[str, str]] = None,
+            buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+    """
+    Record one observation in a histogram; never raises
+    Stored as Prometheus-style cumulative name_bucket{le=...}, name_sum and
+    name_count counters. Every bucket is touched (by 0 if above the value) so
+    each one exists from the first observation.
+    """
+    labels = dict(labels or {})
+    increments = [(_field(f"{name}_bucket", dict(labels, le=_format(bound))), 1 if value <= bound else 0)
+                  for bound in buckets]
+    increments += [
+        (_field(f"{name}_bucket", dict(labels, le='+Inf')), 1),
+        (_field(f"{name}_count", labels), 1),
+        (_field(f"{name}_sum", labels), round(value, 6)),
+    ]
+    _apply(increments)
+
+
+def get_counters(prefix: str = '') -> Dict[str, float]:
+    """Current counter values, optionally filtered by name prefix"""
+    values: Dict[str, float] = {}
+
+    redis_client = get_redis()
+    if redis_client is not None:
+        try:
+            values = {field: float(value) for field, value in redis_client.hgetall(COUNTERS_KEY).items()}
+        except Exception as e:
+            logger.debug(f"Failed to read metrics: {e}")
+
+    with _local_lock:
+        for field, value in _local_counters.items():
+            values[field] = values.get(field, 0.0) + value
+
+    return {field: value for field, value in values.items() if field.startswith(prefix)}
+
+
+def render_prometheus() -> str:
+    """All counters and histograms in the Prometheus text exposition format"""
+    counters = get_counters()
+    names = {field: field.split('{', 1)[0] for field in counters}
+    histograms = {name[:-len('_bucket')] for name in names.values() if name.endswith('_bucket')}
+
+    families: Dict[str, List[str]] = defaultdict(list)
+    for field in sorted(counters):
+        name = names[field]
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in histograms:
+                family = name[:-len(suffix)]
+        families[family].append(f"{field} {_format(counters[field])}")
+
+    lines = []
+    for family, samples in sorted(families.items()):
+        kind = 'histogram' if family in histograms else 'counter' if family.endswith('_total') else 'untyped'
+        lines.append(f"# TYPE {family} {kind}")
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
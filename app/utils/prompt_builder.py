@@ -0,0 +1,202 @@
+# app/utils/prompt_builder.py
+"""
+Token-budgeted prompt assembly
+Conversation history is packed newest-first into what is left of
+LLM_PROMPT_TOKEN_BUDGET after the fixed part of the prompt (instructions,
+custom prompt, current message). Single messages longer than
+LLM_HISTORY_MESSAGE_MAX_TOKENS are truncated so one pasted essay cannot
+crowd out the rest of the conversation.
+
+Tokens are counted with the configured model's tokenizer: LLM_TOKENIZER_PATH
+(a tokenizer.json), else LLM_TOKENIZER (a Hugging Face repo), else the repo
+MODEL_TOKENIZERS lists for OLLAMA_MODEL's family. load_tokenizer() runs at
+startup; a tokenizer set explicitly that cannot be loaded stops it, one
+resolved from the model family falls back to the chars/4 estimate with a
+warning (no known family, no tokenizers package, Hub unreachable).
+LLM_TOKENIZER=estimate opts into the estimate outright.
+"""
+
+import logging
+import math
+import os
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    from tokenizers import Tokenizer
+    TOKENIZERS_AVAILABLE = True
+except ImportError:
+    Tokenizer = None
+    TOKENIZERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+ELLIPSIS = '...'
+ESTIMATE = 'estimate'
+
+# Ollama model family (matched as a substring of the model name, first match wins)
+# -> ungated Hugging Face repo with its tokenizer.json (Mixtral shares Mistral's tokenizer)
+MODEL_TOKENIZERS = [
+    ('llama3', 'NousResearch/Meta-Llama-3-8B'),
+    ('llama2', 'NousResearch/Llama-2-7b-hf'),
+    ('dolphin-mistral', 'cognitivecomputations/dolphin-2.8-mistral-7b-v02'),
+    ('mixtral', 'mistral-community/Mistral-7B-v0.2'),
+    ('mistral', 'mistral-community/Mistral-7B-v0.2'),
+    ('phi3', 'microsoft/Phi-3-mini-4k-instruct'),
+    ('qwen2', 'Qwen/Qwen2-7B-Instruct'),
+]
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+class TokenizerUnavailable(RuntimeError):
+    """The configured model's tokenizer cannot be loaded"""
+
+
+def tokenizer_source(model: str) -> str:
+    """Where the tokenizer for model comes from: a file path, a Hugging Face repo, or 'estimate'"""
+    source = os.getenv('LLM_TOKENIZER_PATH') or os.getenv('LLM_TOKENIZER')
+    if source:
+        return source
+
+    name = (model or '').split(':', 1)[0].lower()
+    for family, repo in MODEL_TOKENIZERS:
+        if family in name:
+            return repo
+    raise TokenizerUnavailable(
+        f"No tokenizer known for model {model!r}; set LLM_TOKENIZER to its Hugging Face repo, "
+        f"LLM_TOKENIZER_PATH to its tokenizer.json, or LLM_TOKENIZER=estimate"
+    )
+
+
+def _explicit() -> bool:
+    return bool(os.getenv('LLM_TOKENIZER_PATH') or os.getenv('LLM_TOKENIZER'))
+
+
+def _load(model: str):
+    source = tokenizer_source(model)
+    if source == ESTIMATE:
+        logger.warning("Counting prompt tokens with the chars/4 estimate (LLM_TOKENIZER=estimate)")
+        return None
+    if not TOKENIZERS_AVAILABLE:
+        raise TokenizerUnavailable(f"The tokenizers package is required to count tokens for {model}")
+
+    try:
+        if os.path.isfile(source):
+            tokenizer = Tokenizer.from_file(source)
+        else:
+            token = os.getenv('HF_TOKEN') or None
+            try:
+                tokenizer = Tokenizer.from_pretrained(source, token=token)
+            except TypeError:
+                # Older tokenizers releases name it auth_token
+                tokenizer = Tokenizer.from_pretrained(source, auth_token=token)
+    except Exception as e:
+        raise TokenizerUnavailable(f"Failed to load tokenizer {source} for {model}: {e}") from e
+
+    logger.info(f"Counting prompt tokens for {model} with {source}")
+    return tokenizer
+
+
+def load_tokenizer(model: str = None):
+    """Load the tokenizer once per process; raises TokenizerUnavailable only for an explicitly set one"""
+    global _tokenizer, _tokenizer_loaded
+    if _tokenizer_loaded:
+        return _tokenizer
+
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            if model is None:
+                from app.utils.llm_client import get_llm_config
+                model = get_llm_config().model
+            try:
+                _tokenizer = _load(model)
+            except TokenizerUnavailable as e:
+                if _explicit():
+                    raise
+                # Resolved from the model family - a stock deploy must still start
+                logger.warning(f"⚠️ {e}; counting prompt tokens with the chars/4 estimate")
+                _tokenizer = None
+            _tokenizer_loaded = True
+    return _tokenizer
+
+
+def _get_tokenizer():
+    """The loaded tokenizer, or None when counting with the estimate"""
+    return load_tokenizer()
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """text cut to at most max_tokens (ellipsis included), at a word break where possible"""
+    if max_tokens <= 0:
+        return ''
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    keep = max_tokens - count_tokens(ELLIPSIS)
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        cut = encoding.offsets[keep - 1][1] if keep > 0 else 0
+    else:
+        cut = max(0, keep) * CHARS_PER_TOKEN
+
+    head = text[:cut]
+    if ' ' in head[cut // 2:]:
+        head = head[:head.rfind(' ')]
+    return head.rstrip() + ELLIPSIS
+
+
+class PromptBuilder:
+    """Packs conversation history into a prompt token budget"""
+
+    def __init__(self, budget: int = None, message_max_tokens: int = None):
+        self.budget = budget or int(os.getenv('LLM_PROMPT_TOKEN_BUDGET', '1536'))
+        self.message_max_tokens = message_max_tokens or int(os.getenv('LLM_HISTORY_MESSAGE_MAX_TOKENS', '120'))
+
+    def fit_message(self, text: str, max_tokens: Optional[int] = None) -> str:
+        return truncate_to_tokens(text or '', max_tokens or self.message_max_tokens)
+
+    def pack_history(self, reserved: str, history: Sequence[Tuple[str, str]],
+                     line_overhead: int = 2) -> List[Tuple[str, str]]:
+        """
+        The newest (role, text) turns that fit next to the reserved text
+        history is oldest-first, as is the result; line_overhead covers the
+        role label each turn is rendered with
+        """
+        remaining = self.budget - count_tokens(reserved)
+        packed: List[Tuple[str, str]] = []
+
+        for role, text in reversed(history):
+            text = self.fit_message(text)
+            cost = count_tokens(text) + line_overhead
+            if cost > remaining:
+                break
+            packed.append((role, text))
+            remaining -= cost
+
+        if len(packed) < len(history):
+            logger.debug(f"Prompt budget kept {len(packed)} of {len(history)} history messages")
+        return list(reversed(packed))
+
+
+_builder: Optional[PromptBuilder] = None
+
+
+def get_prompt_builder() -> PromptBuilder:
+    global _builder
+    if _builder is None:
+        _builder = PromptBuilder()
+    return _builder
@@ -1,10 +1,107 @@
 
 import os
+import hashlib
 import logging
-from typing import Dict, Optional, List
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, List, Tuple
 from signalwire.rest import Client
 from flask import current_app
 
+from app.services.phone_routing import invalidate_phone_route
+from app.utils.metrics import incr
+
+try:
+    # signalwire.rest.Client is a Twilio client; its pooled HTTP client keeps one requests.Session
+    from twilio.http.http_client import TwilioHttpClient
+except ImportError:
+    TwilioHttpClient = None
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# SUBPROJECT CLIENT CACHE
+# =============================================================================
+
+def _token_fingerprint(auth_token: Optional[str]) -> str:
+    """Short digest so rotated credentials get a new client without keeping tokens as keys"""
+    return hashlib.sha256((auth_token or '').encode()).hexdigest()[:16]
+
+
+class SubprojectClientCache:
+    """
+    Bounded LRU of per-subproject REST clients
+    Every client, and the main project client, sends through one keep-alive HTTP
+    session, so an outbound SMS reuses a pooled connection instead of paying for
+    a new session and TLS handshake. Entries are keyed by subproject SID and a
+    fingerprint of the token; a lookup with a different token replaces the
+    subproject's old client.
+    """
+    
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.http_client = TwilioHttpClient(pool_connections=True) if TwilioHttpClient else None
+        self._clients: 'OrderedDict[Tuple[str, str], Client]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, subproject_sid: str, auth_token: str, space_url: str) -> Client:
+        key = (subproject_sid, _token_fingerprint(auth_token))
+        with self._lock:
+            client = self._clients.get(key)
+            hit = client is not None
+            if hit:
+                self._clients.move_to_end(key)
+            else:
+                # Credentials rotated - drop the clients built with the old token
+                for stale in [k for k in self._clients if k[0] == subproject_sid]:
+                    del self._clients[stale]
+                
+                client = Client(
+                    subproject_sid,
+                    auth_token,
+                    signalwire_space_url=space_url,
+                    http_client=self.http_client
+                )
+                self._clients[key] = client
+                while len(self._clients) > self.max_size:
+                    self._clients.popitem(last=False)
+        
+        # Recorded outside the lock - it is a Redis round trip
+        incr('signalwire_client_cache_total', labels={'result': 'hit' if hit else 'miss'})
+        return client
+    
+    def evict(self, subproject_sid: str) -> None:
+        with self._lock:
+            for key in [k for k in self._clients if k[0] == subproject_sid]:
+                del self._clients[key]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+
+_subproject_clients: Optional[SubprojectClientCache] = None
+_subproject_clients_lock = threading.Lock()
+
+
+def get_subproject_client_cache() -> SubprojectClientCache:
+    """Process-wide cache, sized by SIGNALWIRE_CLIENT_CACHE_SIZE"""
+    global _subproject_clients
+    if _subproject_clients is None:
+        with _subproject_clients_lock:
+            if _subproject_clients is None:
+                _subproject_clients = SubprojectClientCache(
+                    max_size=int(os.getenv('SIGNALWIRE_CLIENT_CACHE_SIZE', '256'))
+                )
+    return _subproject_clients
+
+
+def invalidate_subproject_client(subproject_sid: str) -> None:
+    """Forget a subproject's cached client, e.g. after suspending it or rotating its credentials"""
+    get_subproject_client_cache().evict(subproject_sid)
+    logger.debug(f"Evicted cached SignalWire client for subproject {subproject_sid}")
+
 
 class SignalWireClient:
     """SignalWire client wrapper with subproject management and error handling"""
@@ -18,14 +115,20 @@ class SignalWireClient:
         if not all([self.project_id, self.auth_token, self.space_url]):
             raise ValueError("SignalWire credentials not properly configured. Check SIGNALWIRE_PROJECT_ID, SIGNALWIRE_API_TOKEN, and SIGNALWIRE_SPACE_URL")
         
+        self.client_cache = get_subproject_client_cache()
         self.client = Client(
             self.project_id,
             self.auth_token,
-            signalwire_space_url=self.space_url
+            signalwire_space_url=self.space_url,
+            http_client=self.client_cache.http_client
         )
         
         self.logger = logging.getLogger(__name__)
     
+    def subproject_client(self, subproject_sid: str) -> Client:
+        """Cached client for a subproject - the parent auth token works for subprojects"""
+        return self.client_cache.get(subproject_sid, self.auth_token, self.space_url)
+    
     def create_subproject(self, friendly_name: str) -> Dict:
         """Create SignalWire subproject for user isolation"""
         try:
@@ -57,12 +160,7 @@ class SignalWireClient:
                                   to_number: str, body: str) -> Dict:
         """Send SMS message via specific subproject"""
         try:
-            # Create subproject client
-            subproject_client = Client(
-                subproject_sid,
-                self.auth_token,  # Parent auth token works for subprojects
-                signalwire_space_url=self.space_url
-            )
+            subproject_client = self.subproject_client(subproject_sid)
             
             message = subproject_client.messages.create(
                 from_=from_number,
@@ -189,6 +287,7 @@ class SignalWireClient:
                 purchase_data['voice_method'] = 'POST'
             
             number = self.client.incoming_phone_numbers.create(**purchase_data)
+            invalidate_phone_route(number.phone_number, number.sid)
             
             self.logger.info(f"Phone number purchased successfully: {number.sid}")
             
@@ -259,6 +358,7 @@ class SignalWireClient:
                 voice_url='',
                 status_callback=''
             )
+            invalidate_phone_route(number.phone_number, phone_number_sid)
             
             self.logger.info(f"Webhooks removed from: {number.phone_number}")
             
@@ -281,6 +381,7 @@ class SignalWireClient:
         """Release a phone number (permanently)"""
         try:
             self.client.incoming_phone_numbers(phone_number_sid).delete()
+            invalidate_phone_route(phone_number_sid=phone_number_sid)
             
             self.logger.info(f"Phone number released: {phone_number_sid}")
             
@@ -303,13 +404,7 @@ class SignalWireClient:
         """Get message delivery status"""
         try:
             if subproject_sid:
-                # Use subproject client
-                subproject_client = Client(
-                    subproject_sid,
-                    self.auth_token,
-                    signalwire_space_url=self.space_url
-                )
-                message = subproject_client.messages(message_sid).fetch()
+                message = self.subproject_client(subproject_sid).messages(message_sid).fetch()
             else:
                 message = self.client.messages(message_sid).fetch()
             
@@ -337,12 +432,7 @@ class SignalWireClient:
                            end_date: str = None) -> Dict:
         """Get usage statistics for a subproject"""
         try:
-            # Create subproject client
-            subproject_client = Client(
-                subproject_sid,
-                self.auth_token,
-                signalwire_space_url=self.space_url
-            )
+            subproject_client = self.subproject_client(subproject_sid)
             
             # Get usage records
             filter_params = {}
@@ -395,11 +485,7 @@ class SignalWireClient:
         """Suspend a subproject (disable all services)"""
         try:
             # Get all phone numbers for this subproject
-            subproject_client = Client(
-                subproject_sid,
-                self.auth_token,
-                signalwire_space_url=self.space_url
-            )
+            subproject_client = self.subproject_client(subproject_sid)
             
             phone_numbers = subproject_client.incoming_phone_numbers.list()
             
@@ -410,6 +496,8 @@ class SignalWireClient:
                 if result['success']:
                     suspended_numbers.append(number.phone_number)
             
+            # A suspended subproject sends nothing; don't keep its client around
+            invalidate_subproject_client(subproject_sid)
             self.logger.info(f"Subproject suspended: {subproject_sid}")
             
             return {
@@ -432,11 +520,7 @@ class SignalWireClient:
         """Reactivate a suspended subproject"""
         try:
             # Get all phone numbers for this subproject
-            subproject_client = Client(
-                subproject_sid,
-                self.auth_token,
-                signalwire_space_url=self.space_url
-            )
+            subproject_client = self.subproject_client(subproject_sid)
             
             phone_numbers = subproject_client.incoming_phone_numbers.list()
             
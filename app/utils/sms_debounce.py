@@ -0,0 +1,93 @@
+# app/utils/sms_debounce.py
+"""
+Inbound burst coalescing
+Senders often split one thought across several texts a few seconds apart.
+Each inbound message joins its conversation's burst; only the reply attempt
+for the newest message in the burst survives the debounce window, and it
+answers every message collected so far in a single LLM call.
+"""
+
+import logging
+import os
+from typing import List, Optional
+
+from app.extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+BURST_KEY_PREFIX = 'sms:burst:'
+DEFAULT_DEBOUNCE_SECONDS = float(os.getenv('SMS_DEBOUNCE_SECONDS', '0'))
+
+
+def debounce_window() -> float:
+    """Debounce window in seconds; 0 disables coalescing"""
+    return max(0.0, DEFAULT_DEBOUNCE_SECONDS)
+
+
+def _burst_keys(user_id: int, from_number: str):
+    base = f"{BURST_KEY_PREFIX}{user_id}:{from_number}"
+    return f"{base}:seq", f"{base}:ids"
+
+
+def join_burst(user_id: int, from_number: str, message_id: int) -> Optional[int]:
+    """
+    Add a stored inbound message to its conversation's burst
+    Returns the message's sequence number in the burst, or None when
+    coalescing is disabled or Redis is unavailable (reply immediately)
+    """
+    window = debounce_window()
+    redis_client = get_redis()
+    if not window or redis_client is None:
+        return None
+
+    seq_key, ids_key = _burst_keys(user_id, from_number)
+    ttl = int(window * 4) + 60
+
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incr(seq_key)
+        pipe.rpush(ids_key, message_id)
+        pipe.expire(seq_key, ttl)
+        pipe.expire(ids_key, ttl)
+        seq = pipe.execute()[0]
+        return int(seq)
+    except Exception as e:
+        logger.warning(f"Failed to join SMS burst for {from_number}: {e}")
+        return None
+
+
+def is_latest_in_burst(user_id: int, from_number: str, seq: int) -> bool:
+    """True if no newer message joined the burst since seq was issued"""
+    redis_client = get_redis()
+    if redis_client is None:
+        return True
+
+    seq_key, _ = _burst_keys(user_id, from_number)
+    try:
+        current = redis_client.get(seq_key)
+        return current is None or int(current) == seq
+    except Exception as e:
+        logger.warning(f"Failed to read SMS burst for {from_number}: {e}")
+        return True
+
+
+def drain_burst(user_id: int, from_number: str) -> Optional[List[int]]:
+    """
+    Take every message ID collected in the burst, oldest first
+    An empty list means an earlier attempt already answered them; None means
+    the burst could not be read and the caller should answer its own message
+    """
+    redis_client = get_redis()
+    if redis_client is None:
+        return None
+
+    _, ids_key = _burst_keys(user_id, from_number)
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.lrange(ids_key, 0, -1)
+        pipe.delete(ids_key)
+        message_ids = pipe.execute()[0]
+        return [int(message_id) for message_id in message_ids]
+    except Exception as e:
+        logger.warning(f"Failed to drain SMS burst for {from_number}: {e}")
+        return None
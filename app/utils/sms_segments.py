@@ -0,0 +1,154 @@
+# app/utils/sms_segments.py
+"""
+Encoding-aware SMS segmentation
+A message is sent as GSM-7 when every character is in the GSM 03.38 alphabet
+(160 septets, or 153 per segment once concatenated; the extension table
+characters such as € [ ] { } cost two septets), otherwise as UCS-2 (70 UTF-16
+code units, 67 per segment; emoji take two). A single smart quote from the
+LLM is enough to switch a reply to UCS-2 and more than double its segments.
+
+to_gsm() swaps the common offenders (curly quotes, dashes, ellipses, non-
+breaking spaces, accented letters outside the alphabet) for GSM equivalents;
+with drop_unencodable it also removes what has no equivalent, e.g. emoji.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict
+
+GSM7 = 'GSM-7'
+UCS2 = 'UCS-2'
+
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Sent as an escape plus the character, so two septets each
+GSM7_EXTENDED = frozenset("^{}\\[~]|€\f")
+
+# Segment capacity: (single message, per segment when concatenated)
+CAPACITY = {GSM7: (160, 153), UCS2: (70, 67)}
+
+_SPACES = re.compile(r' {2,}')
+
+SUBSTITUTIONS: Dict[str, str] = {
+    '‘': "'", '’': "'", '‚': "'", '‛': "'", '′': "'", '`': "'", '´': "'",
+    '“': '"', '”': '"', '„': '"', '‟': '"', '″': '"', '«': '"', '»': '"',
+    '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-', '―': '-', '−': '-',
+    '…': '...', '•': '-', '·': '-',
+    '\u00a0': ' ', '\u2002': ' ', '\u2003': ' ', '\u2009': ' ', '\u202f': ' ',
+    '\u200b': '', '\u200c': '', '\u200d': '', '\u2060': '', '\ufeff': '', '\ufe0f': '',
+    '\t': ' ', 'ç': 'Ç',  # lower-case c-cedilla is not in the alphabet; carriers send Ç
+    '™': '(TM)', '®': '(R)', '©': '(C)',
+}
+
+
+@dataclass
+class SegmentInfo:
+    encoding: str
+    units: int  # septets (GSM-7) or UTF-16 code units (UCS-2)
+    segments: int
+    remaining: int  # units left in the last segment
+
+    @property
+    def per_segment(self) -> int:
+        single, multi = CAPACITY[self.encoding]
+        return single if self.segments <= 1 else multi
+
+
+def _is_gsm(ch: str) -> bool:
+    return ch in GSM7_BASIC or ch in GSM7_EXTENDED
+
+
+def _gsm_units(ch: str) -> int:
+    return 2 if ch in GSM7_EXTENDED else 1
+
+
+def _ucs2_units(ch: str) -> int:
+    return 2 if ord(ch) > 0xFFFF else 1
+
+
+def _capacity(encoding: str, segments: int) -> int:
+    single, multi = CAPACITY[encoding]
+    return single if segments <= 1 else segments * multi
+
+
+def _substitute(ch: str) -> str:
+    if _is_gsm(ch):
+        return ch
+    if ch in SUBSTITUTIONS:
+        return SUBSTITUTIONS[ch]
+    # Accented letters outside the alphabet lose the accent (á -> a)
+    folded = ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c))
+    if folded and folded != ch and all(_is_gsm(c) for c in folded):
+        return folded
+    return ch
+
+
+def encoding_for(text: str) -> str:
+    return GSM7 if all(_is_gsm(ch) for ch in text) else UCS2
+
+
+def analyze(text: str) -> SegmentInfo:
+    """Encoding, length and billable segments of text exactly as given"""
+    if not text:
+        return SegmentInfo(GSM7, 0, 0, CAPACITY[GSM7][0])
+
+    encoding = encoding_for(text)
+    unit = _gsm_units if encoding == GSM7 else _ucs2_units
+    units = sum(unit(ch) for ch in text)
+
+    single, multi = CAPACITY[encoding]
+    segments = 1 if units <= single else -(-units // multi)
+    return SegmentInfo(encoding, units, segments, _capacity(encoding, segments) - units)
+
+
+def count_segments(text: str) -> int:
+    return analyze(text).segments
+
+
+def to_gsm(text: str, drop_unencodable: bool = False) -> str:
+    """text with common non-GSM characters replaced; optionally without the ones that have no equivalent"""
+    converted = ''.join(_substitute(ch) for ch in text or '')
+    if drop_unencodable:
+        converted = ''.join(ch for ch in converted if _is_gsm(ch))
+        # Dropped emoji leave doubled or trailing spaces behind
+        converted = _SPACES.sub(' ', converted).strip()
+    return converted
+
+
+def segment_char_budget(segments: int, encoding: str = GSM7) -> int:
+    """Characters (single-unit ones) that fit in this many segments"""
+    return _capacity(encoding, max(1, segments))
+
+
+def fit_prefix(text: str, max_segments: int = 1) -> int:
+    """
+    Length of the longest prefix of text that fits in max_segments once sent
+    The prefix's own encoding counts - it is GSM-7 until its first non-GSM character
+    """
+    gsm_capacity = _capacity(GSM7, max_segments)
+    ucs2_capacity = _capacity(UCS2, max_segments)
+    gsm_units = ucs2_units = 0
+    is_gsm = True
+
+    for i, ch in enumerate(text):
+        is_gsm = is_gsm and _is_gsm(ch)
+        gsm_units += _gsm_units(ch) if is_gsm else 0
+        ucs2_units += _ucs2_units(ch)
+        if (gsm_units > gsm_capacity) if is_gsm else (ucs2_units > ucs2_capacity):
+            return i
+    return len(text)
+
+
+def truncate_to_segments(text: str, max_segments: int, ellipsis: str = '...') -> str:
+    """text cut to fit max_segments, at a word break where possible"""
+    if count_segments(text) <= max_segments:
+        return text
+
+    cut = fit_prefix(text, max_segments) - len(ellipsis)
+    head = text[:max(0, cut)]
+    if ' ' in head[len(head) // 2:]:
+        head = head[:head.rfind(' ')]
+    return head.rstrip() + ellipsis
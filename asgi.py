@@ -0,0 +1,36 @@
+# asgi.py - ASGI entry point for uvicorn workers
+# gunicorn -c gunicorn_asgi.conf.py asgi:application
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the project directory to Python path
+project_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_dir)
+load_dotenv()
+
+# Set environment variables if not set
+if not os.getenv('FLASK_APP'):
+    os.environ['FLASK_APP'] = 'app'
+if not os.getenv('FLASK_ENV'):
+    os.environ['FLASK_ENV'] = 'production'
+
+try:
+    from app import create_app
+    from app.asgi import create_asgi_app
+    
+    # Flask keeps serving every route; the SMS webhook, status callback and
+    # SMS health endpoints are answered as coroutines by the ASGI wrapper
+    flask_app = create_app()
+    application = create_asgi_app(flask_app)
+    app = application
+    
+    if __name__ == "__main__":
+        import uvicorn
+        uvicorn.run(app, host='0.0.0.0', port=5000)
+        
+except Exception as e:
+    print(f"Failed to create ASGI application: {e}")
+    import traceback
+    traceback.print_exc()
+    raise
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+"""Load-testing tools for the SMS pipeline - not imported by the app"""
@@ -0,0 +1,222 @@
+# benchmarks/fakes.py
+"""
+In-process stand-ins for the Ollama and SignalWire REST APIs
+Both run on a local ThreadingHTTPServer with configurable latency so the
+inbound SMS path can be benchmarked without a GPU box or a carrier account.
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+import requests
+
+
+class FakeServer:
+    """Base class - a threaded HTTP server on an ephemeral localhost port"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeServer':
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fake._dispatch(self, 'GET')
+
+            def do_POST(self):
+                fake._dispatch(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def delay(self) -> float:
+        """Simulated service time for one request"""
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _dispatch(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        with self._lock:
+            self.requests += 1
+
+        length = int(handler.headers.get('Content-Length') or 0)
+        raw = handler.rfile.read(length) if length else b''
+        if 'json' in (handler.headers.get('Content-Type') or ''):
+            body = json.loads(raw or b'{}')
+        else:
+            body = dict(parse_qsl(raw.decode()))
+
+        self.handle(handler, method, handler.path, body)
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, path: str, body: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def send_json(handler: BaseHTTPRequestHandler, data: Dict[str, Any], status: int = 200) -> None:
+        payload = json.dumps(data).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+class FakeOllamaServer(FakeServer):
+    """Answers /api/generate, /api/chat and /api/tags like a single-model Ollama"""
+
+    def __init__(self, latency: float = 0.8, jitter: float = 0.2, model: str = 'dolphin-mistral:7b',
+                 response_text: str = "Thanks for reaching out! I'll get back to you shortly with the details."):
+        super().__init__(latency, jitter)
+        self.model = model
+        self.response_text = response_text
+        self.generations = 0
+
+    def handle(self, handler, method, path, body):
+        if method == 'GET' and path.startswith('/api/tags'):
+            self.send_json(handler, {'models': [{'name': self.model, 'model': self.model}]})
+            return
+
+        if method != 'POST' or not path.startswith(('/api/generate', '/api/chat')):
+            self.send_json(handler, {'error': 'not found'}, 404)
+            return
+
+        with self._lock:
+            self.generations += 1
+
+        prompt = body.get('prompt') or ''.join(m.get('content', '') for m in body.get('messages', []))
+        prompt_tokens = max(1, len(prompt) // 4)
+        words = self.response_text.split(' ')
+        total = self.delay()
+        is_chat = path.startswith('/api/chat')
+
+        def chunk(text: str, done: bool) -> Dict[str, Any]:
+            data = {'model': self.model, 'done': done}
+            if is_chat:
+                data['message'] = {'role': 'assistant', 'content': text}
+            else:
+                data['response'] = text
+            if done and not is_chat:
+                # Stand-in token IDs: the passed-in context plus this turn's prompt and reply
+                data['context'] = list(body.get('context') or []) + [0] * (prompt_tokens + len(words))
+            if done:
+                data.update({
+                    'prompt_eval_count': prompt_tokens,
+                    'eval_count': len(words),
+                    'total_duration': int(total * 1e9),
+                    'eval_duration': int(total * 0.8 * 1e9),
+                    'prompt_eval_duration': int(total * 0.2 * 1e9),
+                    'load_duration': 0,
+                })
+            return data
+
+        if not body.get('stream', True):
+            time.sleep(total)
+            self.send_json(handler, chunk(self.response_text, True))
+            return
+
+        # NDJSON stream: a fifth of the time to first token, the rest spread over the words
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/x-ndjson')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def write(data: Dict[str, Any]) -> None:
+            line = json.dumps(data).encode() + b'\n'
+            handler.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            handler.wfile.flush()
+
+        time.sleep(total * 0.2)
+        per_word = total * 0.8 / max(1, len(words))
+        for i, word in enumerate(words):
+            time.sleep(per_word)
+            write(chunk(word if i == 0 else ' ' + word, False))
+        write(chunk('', True))
+        handler.wfile.write(b"0\r\n\r\n")
+
+
+class FakeSignalWireServer(FakeServer):
+    """Accepts LaML-style Messages.json posts and records each outbound SMS"""
+
+    def __init__(self, latency: float = 0.15, jitter: float = 0.05):
+        super().__init__(latency, jitter)
+        self.sent: List[Dict[str, Any]] = []
+
+    def handle(self, handler, method, path, body):
+        if method != 'POST' or not path.rstrip('/').endswith('Messages.json'):
+            self.send_json(handler, {'message': 'not found'}, 404)
+            return
+
+        time.sleep(self.delay())
+        message = {
+            'sid': f"SMFAKE{uuid.uuid4().hex}",
+            'status': 'queued',
+            'from': body.get('From'),
+            'to': body.get('To'),
+            'body': body.get('Body'),
+        }
+        with self._lock:
+            self.sent.append(dict(message, received_at=time.monotonic()))
+        self.send_json(handler, message, 201)
+
+    def sent_messages(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.sent)
+
+
+class FakeSignalWireClient:
+    """Drop-in for the REST client's messages.create(), talking to FakeSignalWireServer"""
+
+    def __init__(self, server_url: str, account_sid: str = 'PNFAKE'):
+        self.endpoint = f"{server_url}/api/laml/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.session = requests.Session()
+        self.messages = SimpleNamespace(create=self._create_message)
+
+    def _create_message(self, from_: str, to: str, body: str, **kwargs) -> SimpleNamespace:
+        response = self.session.post(self.endpoint, data={'From': from_, 'To': to, 'Body': body})
+        response.raise_for_status()
+        data = response.json()
+        return SimpleNamespace(sid=data['sid'], status=data['status'], to=data['to'],
+                               from_=data['from'], body=data['body'])
+
+
+class FakeSignalWireService:
+    """Stands in for MessagingService.signalwire_service (send_sms returns a result dict)"""
+
+    def __init__(self, server_url: str):
+        self.client = FakeSignalWireClient(server_url)
+
+    def send_sms(self, from_number: str, to_number: str, body: str) -> Dict[str, Any]:
+        try:
+            message = self.client.messages.create(from_=from_number, to=to_number, body=body)
+            return {'success': True, 'message_sid': message.sid, 'status': message.status}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
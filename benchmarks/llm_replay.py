@@ -0,0 +1,369 @@
+# benchmarks/llm_replay.py
+"""
+Replay recorded conversations through the reply prompt and the LLM
+
+    python -m benchmarks.llm_replay --mock
+    python -m benchmarks.llm_replay --from-db --limit 200 --export corpus.jsonl
+    python -m benchmarks.llm_replay --fixture corpus.jsonl --backend http://gpu-1:11434 --save-baseline base.json
+    python -m benchmarks.llm_replay --fixture corpus.jsonl --model llama3:8b --num-predict 100 --baseline base.json
+
+Each case (an inbound message plus the conversation before it) is rendered
+with SMSConversationService._build_llm_prompt - or a --prompt-file template -
+and streamed through LLMClient against --backend, or a fake Ollama with
+--mock. Cases come from the messages table (--from-db, anonymized), a JSONL
+fixture (--fixture, one case per line as written by --export), or a small
+built-in set.
+
+Reported: prompt tokens, time to first token and generation latency at
+p50/p95/p99, tokens per second, and SMS segments per reply. --save-baseline
+stores the run; --baseline compares against a stored run and exits 1 when a
+metric regressed beyond its tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fakes import FakeOllamaServer
+from benchmarks.webhook_replay import percentiles
+
+SAMPLE_CASES = [
+    {'id': 'sample-1', 'history': [], 'message': "Hi, are you open tomorrow?"},
+    {'id': 'sample-2', 'history': [], 'message': "What are your prices for a consultation?"},
+    {'id': 'sample-3', 'history': [
+        {'direction': 'inbound', 'body': "Do you have anything Friday afternoon?"},
+        {'direction': 'outbound', 'body': "We have 2pm and 4pm open on Friday. Would either work for you?"},
+    ], 'message': "Can I book for 4pm?"},
+    {'id': 'sample-4', 'history': [
+        {'direction': 'inbound', 'body': "I need to move my appointment"},
+        {'direction': 'outbound', 'body': "No problem! What day works better for you?"},
+    ], 'message': "Next Tuesday morning if possible, anything before 11 is fine"},
+    {'id': 'sample-5', 'history': [], 'message': "Do you take walk-ins or is it appointment only?"},
+]
+
+# Metric -> (allowed relative increase, allowed absolute increase); a regression
+# must exceed both, so tiny values do not flap on noise
+REGRESSION_TOLERANCES = {
+    'prompt_tokens.mean': (0.10, 20),
+    'ttft_ms.p50': (0.15, 50),
+    'ttft_ms.p95': (0.20, 100),
+    'latency_ms.p50': (0.15, 100),
+    'latency_ms.p95': (0.20, 200),
+    'segments.mean': (0.10, 0.1),
+    'multi_segment_rate': (0.0, 0.05),
+    'error_rate': (0.0, 0.02),
+    'empty_rate': (0.0, 0.02),
+}
+
+PHONE = re.compile(r'\+?\d[\d\-\s().]{7,}\d')
+EMAIL = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+
+
+# =============================================================================
+# CORPUS
+# =============================================================================
+
+def anonymize(text: Optional[str]) -> str:
+    text = EMAIL.sub('[email]', text or '')
+    return PHONE.sub('[phone]', text)
+
+
+def load_fixture(path: str) -> List[Dict[str, Any]]:
+    cases = []
+    with open(path) as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if line:
+                case = json.loads(line)
+                case.setdefault('id', f"case-{i + 1}")
+                case.setdefault('history', [])
+                cases.append(case)
+    return cases
+
+
+def load_from_db(app, limit: int, history: int, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """The newest inbound messages with the turns before them, numbers and addresses scrubbed"""
+    from app.models import Client, Message
+
+    cases = []
+    with app.app_context():
+        query = Message.query.filter(Message.direction == 'inbound')
+        if user_id:
+            query = query.filter(Message.user_id == user_id)
+        inbound = query.order_by(Message.created_at.desc()).limit(limit).all()
+
+        senders: Dict[str, str] = {}
+        for message in inbound:
+            earlier = Message.query.filter(
+                Message.client_id == message.client_id,
+                Message.created_at < message.created_at
+            ).order_by(Message.created_at.desc()).limit(history).all()
+            client = Client.query.get(message.client_id)
+
+            sender = senders.setdefault(message.from_number, f"+1555000{len(senders):04d}")
+            cases.append({
+                'id': f"msg-{message.id}",
+                'from_number': sender,
+                'summary': anonymize(client.conversation_summary) if client and client.conversation_summary else None,
+                'history': [{'direction': m.direction, 'body': anonymize(m.body)} for m in reversed(earlier)],
+                'message': anonymize(message.body),
+            })
+    return cases
+
+
+def export_cases(cases: List[Dict[str, Any]], path: str) -> None:
+    with open(path, 'w') as f:
+        for case in cases:
+            f.write(json.dumps(case) + '\n')
+
+
+# =============================================================================
+# REPLAY
+# =============================================================================
+
+def build_prompt(service, case: Dict[str, Any], template: Optional[str]) -> str:
+    from app.services.sms_conversation_service import SMSMessage
+
+    from_number = case.get('from_number') or '+15550000000'
+    sms = SMSMessage(from_number=from_number, to_number='+15559999999', body=case['message'],
+                     message_id=case['id'], timestamp=None)
+    user = SimpleNamespace(first_name=case.get('user_name'), username='the business')
+    history = [SimpleNamespace(direction=turn['direction'], body=turn['body']) for turn in case['history']]
+
+    if template:
+        # The service's history packing and truncation, rendered with the candidate wording
+        service._render_llm_prompt = lambda user_name, summary, conversation, number, message: template.format(
+            user_name=user_name, summary=summary, conversation=conversation, from_number=number, message=message
+        )
+    return service._build_llm_prompt(sms, user, history, case.get('summary'))
+
+
+async def replay_case(client, service, case: Dict[str, Any], prompt: str, options: Dict[str, Any],
+                      model: str) -> Dict[str, Any]:
+    from app.utils.prompt_builder import count_tokens
+    from app.utils.sms_segments import count_segments
+
+    estimate = count_tokens(prompt)
+    result = {'id': case['id'], 'prompt_tokens_estimate': estimate, 'prompt_tokens': estimate}
+    started = time.monotonic()
+    text = ''
+    try:
+        async for chunk in client.astream_generate(prompt, options=options, model=model):
+            if 'ttft' not in result and chunk.get('response'):
+                result['ttft'] = time.monotonic() - started
+            text += chunk.get('response', '')
+            if chunk.get('done'):
+                timings = chunk.get('timings') or {}
+                result.update(
+                    prompt_tokens=chunk.get('prompt_eval_count') or estimate,
+                    eval_tokens=chunk.get('eval_count', 0),
+                    tokens_per_second=timings.get('tokens_per_second'),
+                    load_seconds=timings.get('load_seconds'),
+                )
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    reply = service._clean_response_for_sms(text)
+    result.update(latency=time.monotonic() - started, reply=reply, chars=len(reply),
+                  segments=count_segments(reply))
+    return result
+
+
+def run_cases(cases: List[Dict[str, Any]], args) -> List[Dict[str, Any]]:
+    from app.services.sms_conversation_service import SMSConversationService
+    from app.utils.circuit_breaker import CircuitBreaker
+    from app.utils.llm_client import LLMClient
+    from app.utils.llm_router import LLMRouter
+
+    service = SMSConversationService()
+    template = open(args.prompt_file).read() if args.prompt_file else None
+    options = dict(service.ollama_options)
+    if args.num_predict:
+        options['num_predict'] = args.num_predict
+    if args.temperature is not None:
+        options['temperature'] = args.temperature
+
+    # A private client: the benchmark's failures should not trip the app's breaker
+    client = LLMClient(router=LLMRouter([args.backend]),
+                       breaker=CircuitBreaker('benchmark', consecutive_failures=len(cases) + 1,
+                                              failure_rate=1.1))
+    model = args.model or client.model
+    prompts = [build_prompt(service, case, template) for case in cases]
+
+    async def main():
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(case, prompt):
+            async with semaphore:
+                return await replay_case(client, service, case, prompt, options, model)
+
+        results = await asyncio.gather(*(one(case, prompt) for case, prompt in zip(cases, prompts)))
+        await client.aclose()
+        return results
+
+    return asyncio.run(main())
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in results if 'error' not in r]
+    segments = [r['segments'] for r in ok]
+    prompt_tokens = [r['prompt_tokens'] for r in ok]
+    speeds = [r['tokens_per_second'] for r in ok if r.get('tokens_per_second')]
+    distribution = Counter(min(count, 3) for count in segments)
+
+    return {
+        'cases': len(results),
+        'errors': len(results) - len(ok),
+        'error_rate': round((len(results) - len(ok)) / len(results), 3) if results else 0.0,
+        'prompt_tokens': {
+            'mean': round(statistics.mean(prompt_tokens), 1) if prompt_tokens else None,
+            'max': max(prompt_tokens) if prompt_tokens else None,
+        },
+        'ttft_ms': percentiles([r['ttft'] for r in ok if 'ttft' in r]),
+        'latency_ms': percentiles([r['latency'] for r in ok]),
+        'tokens_per_second': round(statistics.mean(speeds), 1) if speeds else None,
+        'segments': {
+            'mean': round(statistics.mean(segments), 2) if segments else None,
+            'distribution': {'1': distribution.get(1, 0), '2': distribution.get(2, 0),
+                             '3+': distribution.get(3, 0)},
+        },
+        'multi_segment_rate': round(sum(1 for s in segments if s > 1) / len(ok), 3) if ok else 0.0,
+        'empty_rate': round(sum(1 for s in segments if s == 0) / len(ok), 3) if ok else 0.0,
+    }
+
+
+def _lookup(summary: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = summary
+    for part in path.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Metrics that got worse than the baseline by more than their tolerance"""
+    regressions = []
+    for path, (relative, absolute) in REGRESSION_TOLERANCES.items():
+        current, previous = _lookup(summary, path), _lookup(baseline, path)
+        if current is None or previous is None:
+            continue
+        increase = current - previous
+        if increase > absolute and increase > previous * relative:
+            regressions.append({'metric': path, 'baseline': previous, 'current': current})
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Replay conversations through the reply prompt and the LLM')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--fixture', help='JSONL corpus, one case per line')
+    source.add_argument('--from-db', action='store_true', help='build the corpus from the messages table')
+    parser.add_argument('--limit', type=int, default=100, help='cases to read from the database')
+    parser.add_argument('--history', type=int, default=20, help='earlier messages per case (database)')
+    parser.add_argument('--user-id', type=int, help='only this tenant\'s conversations (database)')
+    parser.add_argument('--export', help='write the loaded corpus to this JSONL file')
+    parser.add_argument('--backend', help='Ollama URL (default: the first OLLAMA_SERVER_URLS host)')
+    parser.add_argument('--mock', action='store_true', help='use a fake Ollama instead of --backend')
+    parser.add_argument('--mock-latency', type=float, default=0.8)
+    parser.add_argument('--model', help='model to benchmark (default: OLLAMA_MODEL)')
+    parser.add_argument('--num-predict', type=int, help='override num_predict')
+    parser.add_argument('--temperature', type=float, help='override temperature')
+    parser.add_argument('--prompt-file', help='prompt template with {user_name} {summary} {conversation} '
+                                              '{from_number} {message} placeholders')
+    parser.add_argument('--concurrency', type=int, default=1, help='cases in flight at once')
+    parser.add_argument('--save-baseline', help='store this run as a baseline JSON file')
+    parser.add_argument('--baseline', help='compare against a stored baseline; exit 1 on regressions')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict[str, Any]:
+    args = parse_args(argv)
+
+    ollama = None
+    if args.mock:
+        ollama = FakeOllamaServer(latency=args.mock_latency, jitter=args.mock_latency / 4).start()
+        args.backend = ollama.url
+        os.environ.setdefault('OLLAMA_MODEL', ollama.model)
+        os.environ.setdefault('LLM_TOKENIZER', 'estimate')
+    if not args.backend:
+        from app.utils.llm_router import backend_urls
+        args.backend = backend_urls()[0]
+
+    if args.from_db:
+        from app import create_app
+        cases = load_from_db(create_app(), args.limit, args.history, args.user_id)
+    elif args.fixture:
+        cases = load_fixture(args.fixture)
+    else:
+        cases = SAMPLE_CASES
+    if args.export:
+        export_cases(cases, args.export)
+    if not cases:
+        raise SystemExit('No cases to replay')
+
+    started = time.monotonic()
+    results = run_cases(cases, args)
+    summary = summarize(results)
+    report = {
+        'backend': 'mock' if args.mock else args.backend,
+        'model': args.model or os.getenv('OLLAMA_MODEL') or os.getenv('LLM_MODEL'),
+        'num_predict': args.num_predict,
+        'prompt_file': args.prompt_file,
+        'duration_s': round(time.monotonic() - started, 2),
+        'summary': summary,
+    }
+
+    if ollama:
+        ollama.stop()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(dict(report, cases={r['id']: r for r in results}), f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f)['summary'])
+        report['regressions'] = regressions
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"\nReplayed {summary['cases']} cases against {report['backend']} ({report['model']}) "
+              f"in {report['duration_s']}s - {summary['errors']} errors")
+        print(f"  prompt tokens            mean {summary['prompt_tokens']['mean']}  "
+              f"max {summary['prompt_tokens']['max']}")
+        for name in ('ttft_ms', 'latency_ms'):
+            stats = summary[name]
+            print(f"  {name:<24} p50 {stats['p50']}  p95 {stats['p95']}  p99 {stats['p99']}")
+        print(f"  tokens/s                 {summary['tokens_per_second']}")
+        print(f"  SMS segments             mean {summary['segments']['mean']}  "
+              f"{summary['segments']['distribution']}  (multi-segment {summary['multi_segment_rate']:.0%})")
+        if args.baseline:
+            if regressions:
+                print(f"\n  REGRESSIONS vs {args.baseline}:")
+                for item in regressions:
+                    print(f"    {item['metric']:<22} {item['baseline']} -> {item['current']}")
+            else:
+                print(f"\n  No regressions vs {args.baseline}")
+
+    if regressions:
+        sys.exit(1)
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,291 @@
+# benchmarks/webhook_replay.py
+"""
+Replay SignalWire SMS webhooks against the app and report throughput
+
+    python -m benchmarks.webhook_replay --to +15551230000 --count 500 --rate 50
+    python -m benchmarks.webhook_replay --input webhooks.jsonl --target messaging
+
+Requests are driven in-process (no network hop for the webhook itself) against
+fake Ollama and SignalWire servers from benchmarks.fakes, using the app's real
+database. Targets:
+
+  sms        POST /api/sms/webhook/user/<id> through the ASGI front end
+             (SMSConversationService; honours SMS_WEBHOOK_MODE)
+  messaging  MessagingService.process_incoming_sms
+
+Reported: webhook ack latency and end-to-end latency (webhook received ->
+reply posted to SignalWire) at p50/p95/p99, messages per second, and DB
+queries per message. In queued mode replies are sent by the Celery workers,
+so end-to-end figures only cover replies that reach the fake SignalWire
+server from this process.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fakes import FakeOllamaServer, FakeSignalWireServer, FakeSignalWireClient, FakeSignalWireService
+
+
+class QueryCounter:
+    """Counts statements sent to the database through SQLAlchemy"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if len(samples) < 2:
+        value = round(samples[0] * 1000, 1) if samples else None
+        return {'p50': value, 'p95': value, 'p99': value}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50': round(cuts[49] * 1000, 1), 'p95': round(cuts[94] * 1000, 1), 'p99': round(cuts[98] * 1000, 1)}
+
+
+# =============================================================================
+# PAYLOADS
+# =============================================================================
+
+def load_payloads(args) -> List[Dict[str, Any]]:
+    """Recorded webhooks (JSONL, one form dict per line) or a synthetic stream"""
+    if args.input:
+        payloads = []
+        with open(args.input) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    payload = json.loads(line)
+                    # Fresh SIDs so a replay is not swallowed by webhook dedupe
+                    payload['MessageSid'] = f"SMBENCH{uuid.uuid4().hex}"
+                    payloads.append(payload)
+        return payloads[:args.count] if args.count else payloads
+
+    if not args.to:
+        raise SystemExit('--to (the tenant number to text) is required without --input')
+
+    bodies = [
+        "Hi, are you open tomorrow?",
+        "What are your prices for a consultation?",
+        "Can I book for 3pm on Friday?",
+        "Thanks!",
+        "Do you take walk-ins or is it appointment only?",
+    ]
+    return [
+        {
+            'MessageSid': f"SMBENCH{uuid.uuid4().hex}",
+            'AccountSid': 'ACBENCH',
+            'From': f"+1555{9000000 + i % args.senders}",
+            'To': args.to,
+            'Body': bodies[i % len(bodies)],
+            'NumMedia': '0',
+        }
+        for i in range(args.count)
+    ]
+
+
+# =============================================================================
+# REPLAY
+# =============================================================================
+
+class ReplayRun:
+    def __init__(self, signalwire: FakeSignalWireServer):
+        self.signalwire = signalwire
+        self.ack_latencies: List[float] = []
+        self.errors = 0
+        self.sent_at: Dict[str, deque] = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def record_sent(self, payload: Dict[str, Any]) -> float:
+        started = time.monotonic()
+        with self._lock:
+            self.sent_at[payload.get('From')].append(started)
+        return started
+
+    def record_ack(self, started: float, ok: bool) -> None:
+        with self._lock:
+            self.ack_latencies.append(time.monotonic() - started)
+            if not ok:
+                self.errors += 1
+
+    def reply_latencies(self) -> List[float]:
+        """Match each outbound reply to the oldest unanswered inbound from that number"""
+        pending = {number: deque(times) for number, times in self.sent_at.items()}
+        latencies = []
+        for message in sorted(self.signalwire.sent_messages(), key=lambda m: m['received_at']):
+            queue = pending.get(message['to'])
+            if queue:
+                latencies.append(message['received_at'] - queue.popleft())
+        return latencies
+
+
+async def _paced(payloads, rate: float, concurrency: int, send):
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.monotonic()
+
+    async def one(i, payload):
+        if rate:
+            await asyncio.sleep(max(0.0, start + i / rate - time.monotonic()))
+        async with semaphore:
+            await send(payload)
+
+    await asyncio.gather(*(one(i, payload) for i, payload in enumerate(payloads)))
+
+
+def replay_sms(app, payloads, args, run: ReplayRun, signalwire: FakeSignalWireServer) -> None:
+    import httpx
+    from app.asgi import AssisTextASGI
+    from app.services.sms_conversation_service import SMSConversationService
+
+    service = SMSConversationService()
+    service.signalwire_client = FakeSignalWireClient(signalwire.url)
+    asgi_app = AssisTextASGI(app, sms_service=service)
+
+    async def main():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            async def send(payload):
+                started = run.record_sent(payload)
+                try:
+                    response = await client.post(f"/api/sms/webhook/user/{args.user_id}", data=payload)
+                    run.record_ack(started, response.status_code < 400)
+                except Exception:
+                    run.record_ack(started, False)
+
+            await _paced(payloads, args.rate, args.concurrency, send)
+        await service.cleanup()
+
+    asyncio.run(main())
+
+
+def replay_messaging(app, payloads, args, run: ReplayRun, signalwire: FakeSignalWireServer) -> None:
+    from app.services.messaging_service import MessagingService
+
+    service = MessagingService()
+    service.signalwire_service = FakeSignalWireService(signalwire.url)
+
+    def process(payload):
+        started = run.record_sent(payload)
+        try:
+            with app.app_context():
+                result = service.process_incoming_sms(payload)
+            run.record_ack(started, result.get('success', False))
+        except Exception:
+            run.record_ack(started, False)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        start = time.monotonic()
+        futures = []
+        for i, payload in enumerate(payloads):
+            if args.rate:
+                time.sleep(max(0.0, start + i / args.rate - time.monotonic()))
+            futures.append(pool.submit(process, payload))
+        for future in futures:
+            future.result()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Replay SMS webhooks against AssisText')
+    parser.add_argument('--target', choices=['sms', 'messaging'], default='sms')
+    parser.add_argument('--input', help='JSONL file of recorded webhook payloads')
+    parser.add_argument('--count', type=int, default=200, help='messages to send (synthetic) or cap (--input)')
+    parser.add_argument('--senders', type=int, default=50, help='distinct sender numbers (synthetic)')
+    parser.add_argument('--to', help='tenant phone number the synthetic stream texts')
+    parser.add_argument('--user-id', type=int, default=1, help='user ID in the webhook URL (sms target)')
+    parser.add_argument('--rate', type=float, default=20.0, help='messages per second, 0 = as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=32, help='max in-flight webhooks')
+    parser.add_argument('--llm-latency', type=float, default=0.8, help='fake Ollama generation time (s)')
+    parser.add_argument('--llm-jitter', type=float, default=0.2)
+    parser.add_argument('--signalwire-latency', type=float, default=0.15, help='fake SignalWire API time (s)')
+    parser.add_argument('--drain-seconds', type=float, default=5.0,
+                        help='wait for trailing replies after the last webhook is acknowledged')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict[str, Any]:
+    args = parse_args(argv)
+
+    ollama = FakeOllamaServer(latency=args.llm_latency, jitter=args.llm_jitter).start()
+    signalwire = FakeSignalWireServer(latency=args.signalwire_latency).start()
+
+    # Services read these when constructed; OLLAMA_SERVER_URLS wins over OLLAMA_SERVER_URL,
+    # so set both or an inherited host list would send the benchmark to the real LLMs
+    os.environ['OLLAMA_SERVER_URL'] = ollama.url
+    os.environ['OLLAMA_SERVER_URLS'] = ollama.url
+    os.environ.setdefault('OLLAMA_MODEL', ollama.model)
+    # The fake model's replies are canned; no need to fetch its tokenizer at startup
+    os.environ.setdefault('LLM_TOKENIZER', 'estimate')
+
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+
+    payloads = load_payloads(args)
+    run = ReplayRun(signalwire)
+
+    started = time.monotonic()
+    replay = replay_sms if args.target == 'sms' else replay_messaging
+    replay(app, payloads, args, run, signalwire)
+    acked = time.monotonic()
+
+    # Let replies that were handed off (queued mode, write-behind) finish
+    deadline = acked + args.drain_seconds
+    while time.monotonic() < deadline and len(signalwire.sent_messages()) < len(payloads):
+        time.sleep(0.05)
+
+    elapsed = acked - started
+    replies = run.reply_latencies()
+    report = {
+        'target': args.target,
+        'webhook_mode': os.getenv('SMS_WEBHOOK_MODE', 'inline'),
+        'messages': len(payloads),
+        'errors': run.errors,
+        'duration_s': round(elapsed, 2),
+        'messages_per_second': round(len(payloads) / elapsed, 1) if elapsed else None,
+        'ack_latency_ms': percentiles(run.ack_latencies),
+        'end_to_end_latency_ms': percentiles(replies),
+        'replies_sent': len(replies),
+        'llm_requests': ollama.generations,
+        'db_queries': counter.count,
+        'db_queries_per_message': round(counter.count / len(payloads), 2) if payloads else None,
+    }
+
+    ollama.stop()
+    signalwire.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"\nReplayed {report['messages']} webhooks ({report['target']}, {report['webhook_mode']}) "
+              f"in {report['duration_s']}s - {report['messages_per_second']} msg/s, {report['errors']} errors")
+        for name in ('ack_latency_ms', 'end_to_end_latency_ms'):
+            stats = report[name]
+            print(f"  {name:<24} p50 {stats['p50']}  p95 {stats['p95']}  p99 {stats['p99']}")
+        print(f"  replies sent             {report['replies_sent']} ({report['llm_requests']} LLM requests)")
+        print(f"  DB queries               {report['db_queries']} ({report['db_queries_per_message']} per message)")
+
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
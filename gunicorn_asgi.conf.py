@@ -0,0 +1,12 @@
+# ASGI serving mode: gunicorn -c gunicorn_asgi.conf.py asgi:application
+bind = "127.0.0.1:5000"
+workers = 2
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+keepalive = 5
+max_requests = 1000
+max_requests_jitter = 100
+user = "admin"
+group = "admin"
+chdir = "/opt/assistext_backend"
+pythonpath = "/opt/assistext_backend"